@@ -16,6 +16,7 @@ from market_agents.memory.vector_search import MemoryRetriever
 from market_agents.memory.embedding import MemoryEmbedder
 from market_agents.memory.config import MarketMemoryConfig, load_config_from_yaml
 from market_agents.memory.setup_db import DatabaseConnection
+from market_agents.inference.http_client import PooledHTTPClient
 
 from market_agents.orchestrators.config import load_config
 from market_agents.orchestrators.meta_orchestrator import MetaOrchestrator
@@ -30,13 +31,13 @@ from pydantic import BaseModel
 def create_kb_agent(
     memory_config: MarketMemoryConfig,
     db_conn: DatabaseConnection,
-    kb_name: str
+    kb_name: str,
+    embedding_service: MemoryEmbedder
 ) -> Optional[KnowledgeBaseAgent]:
     
     if not kb_name:
         return None
 
-    embedding_service = MemoryEmbedder(config=memory_config)
     market_kb = MarketKnowledgeBase(
         config=memory_config,
         db_conn=db_conn,
@@ -64,7 +65,8 @@ def create_kb_agent(
 def create_agents(
     config,
     memory_config: MarketMemoryConfig,
-    db_conn: DatabaseConnection
+    db_conn: DatabaseConnection,
+    embedder: MemoryEmbedder
 ) -> List[MarketAgent]:
     
     agents = []
@@ -73,7 +75,7 @@ def create_agents(
 
     # setup knowledge base
     kb_name = config.agent_config.knowledge_base
-    kb_agent = create_kb_agent(memory_config, db_conn, kb_name)
+    kb_agent = create_kb_agent(memory_config, db_conn, kb_name, embedder)
 
     # randomly choose from config.llm_configs for each agent
     llm_confs = config.llm_configs
@@ -100,13 +102,20 @@ def create_agents(
                 model=llm_c.model,
                 temperature=llm_c.temperature,
                 max_tokens=llm_c.max_tokens,
-                use_cache=llm_c.use_cache
+                use_cache=llm_c.use_cache,
+                history_policy=llm_c.history_policy,
+                max_history_turns=llm_c.max_history_turns,
+                max_history_tokens=llm_c.max_history_tokens,
+                history_retain_ratio=llm_c.history_retain_ratio,
+                summary_model=llm_c.summary_model,
+                summary_max_tokens=llm_c.summary_max_tokens
             ),
             environments={},
             protocol=ACLMessage,
             persona=persona,
             econ_agent=None,
-            knowledge_agent=knowledge_agent
+            knowledge_agent=knowledge_agent,
+            embedder=embedder
         )
 
         agent.index = i
@@ -126,8 +135,12 @@ async def main():
     db_conn = DatabaseConnection(memory_config)
     db_conn._ensure_database_exists()
 
+    # One connection pool shared by every agent's memory, inference and group chat
+    http_client = PooledHTTPClient()
+    embedder = MemoryEmbedder(config=memory_config, http_client=http_client)
+
     # Create Agents
-    agents = create_agents(config, memory_config, db_conn)
+    agents = create_agents(config, memory_config, db_conn, embedder)
 
     orchestrator_registry = {}
     orchestrator_map = {
@@ -150,7 +163,8 @@ async def main():
         config=config,
         agents=agents,
         orchestrator_registry=orchestrator_registry,
-        logger=logging.getLogger("meta_orchestrator")
+        logger=logging.getLogger("meta_orchestrator"),
+        http_client=http_client
     )
 
     await meta_orch.start()
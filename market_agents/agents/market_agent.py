@@ -15,8 +15,10 @@ from market_agents.economics.econ_agent import EconomicAgent
 from market_agents.environments.environment import MultiAgentEnvironment, LocalObservation
 from market_agents.inference.message_models import LLMConfig, LLMPromptContext
 from market_agents.memory.config import MarketMemoryConfig
+from market_agents.memory.embedding import MemoryEmbedder
 from market_agents.memory.knowledge_base_agent import KnowledgeBaseAgent
 from market_agents.memory.memory import MemoryObject, ShortTermMemory, LongTermMemory
+from market_agents.memory.phase_retrieval import AgentMemoryContext, AgentRetrievalRequest
 
 class MarketAgent(LLMAgent):
     short_term_memory: ShortTermMemory = None
@@ -44,12 +46,13 @@ class MarketAgent(LLMAgent):
         protocol: Optional[Type[Protocol]] = None,
         persona: Optional[Persona] = None,
         econ_agent: Optional[EconomicAgent] = None,
-        knowledge_agent: Optional[KnowledgeBaseAgent] = None
+        knowledge_agent: Optional[KnowledgeBaseAgent] = None,
+        embedder: Optional[MemoryEmbedder] = None
     ) -> 'MarketAgent':
         agent = cls(
             id=agent_id,
-            short_term_memory=ShortTermMemory(memory_config, db_conn, agent_id),
-            long_term_memory=LongTermMemory(memory_config, db_conn, agent_id),
+            short_term_memory=ShortTermMemory(memory_config, db_conn, agent_id, embedder=embedder),
+            long_term_memory=LongTermMemory(memory_config, db_conn, agent_id, embedder=embedder),
             role=persona.role if persona else "agent",
             persona=persona.persona if persona else None,
             objectives=persona.objectives if persona else None,
@@ -63,17 +66,37 @@ class MarketAgent(LLMAgent):
         )
         return agent
 
+    def _perception_query(self, environment_info) -> str:
+        task_str = f"Task: {self.task}" if self.task else ""
+        env_state_str = f"Environment state: {str(environment_info)}" if environment_info else ""
+        return (task_str + "\n" + env_state_str).strip()
+
+    def retrieval_request(self, environment_name: str) -> AgentRetrievalRequest:
+        """The memory lookup `perceive` makes, for batching across agents with PhaseMemoryRetriever."""
+        if environment_name not in self.environments:
+            raise ValueError(f"Environment {environment_name} not found")
+        environment_info = self.environments[environment_name].get_global_state()
+        return AgentRetrievalRequest(
+            agent_id=self.id,
+            query=self._perception_query(environment_info),
+            knowledge_base=self.knowledge_agent.market_kb.table_prefix if self.knowledge_agent else None
+        )
+
     async def perceive(
         self,
         environment_name: str,
         return_prompt: bool = False,
-        structured_tool: bool = False
+        structured_tool: bool = False,
+        memory_context: Optional[AgentMemoryContext] = None
     ) -> Union[str, LLMPromptContext]:
         if environment_name not in self.environments:
             raise ValueError(f"Environment {environment_name} not found")
 
         environment_info = self.environments[environment_name].get_global_state()
-        stm_cognitive = await self.short_term_memory.retrieve_recent_memories(limit=5)
+        if memory_context is not None:
+            stm_cognitive = memory_context.short_term_memories
+        else:
+            stm_cognitive = await self.short_term_memory.retrieve_recent_memories(limit=5)
         short_term_memories = []
         for mem in stm_cognitive:
             short_term_memories.append({
@@ -85,21 +108,23 @@ class MarketAgent(LLMAgent):
         memory_strings = [f"Memory {i+1}:\n{mem}" for i, mem in enumerate(short_term_memories)]
         print("\033[94m" + "\n\n".join(memory_strings) + "\033[0m")
 
-        task_str = f"Task: {self.task}" if self.task else ""
-        env_state_str = f"Environment state: {str(environment_info)}" if environment_info else ""
-        query_str = (task_str + "\n" + env_state_str).strip()
+        query_str = self._perception_query(environment_info)
 
-        ltm_episodes = await self.long_term_memory.retrieve_episodic_memories(
-             agent_id=self.id,
-             query=query_str,
-             top_k=2
-        )
-        retrieved_documents = []
-        if self.knowledge_agent:
-            kb_table_prefix = self.knowledge_agent.market_kb.table_prefix
-            retrieved_documents = self.knowledge_agent.retrieve(
-                query_str, 
-                kb_table_prefix)
+        if memory_context is not None:
+            ltm_episodes = memory_context.episodic_memories
+            retrieved_documents = memory_context.documents
+        else:
+            ltm_episodes = await self.long_term_memory.retrieve_episodic_memories(
+                 agent_id=self.id,
+                 query=query_str,
+                 top_k=2
+            )
+            retrieved_documents = []
+            if self.knowledge_agent:
+                kb_table_prefix = self.knowledge_agent.market_kb.table_prefix
+                retrieved_documents = self.knowledge_agent.retrieve(
+                    query_str, 
+                    kb_table_prefix)
 
         print("\nEpisodic Memory Results:")
         memory_strings = [f"Memory {i+1}:\n{mem.model_dump()}" for i, mem in enumerate(ltm_episodes)]
@@ -1,6 +1,6 @@
-from pydantic import BaseModel, Field, computed_field, model_validator
+from pydantic import BaseModel, Field, PrivateAttr, computed_field, model_validator
 from functools import cached_property
-from typing import List, Dict, Self
+from typing import List, Dict, Optional, Self
 import random
 from copy import deepcopy
 from datetime import datetime
@@ -95,55 +95,91 @@ class Good(BaseModel):
 class Basket(BaseModel):
     cash: float
     goods: List[Good]
+    _goods_index: Dict[str, int] = PrivateAttr(default_factory=dict)
 
     @computed_field
-    @cached_property
+    @property
     def goods_dict(self) -> Dict[str, int]:
         return {good.name: int(good.quantity) for good in self.goods}
 
+    def _get_goods_index(self) -> Dict[str, int]:
+        # positions rather than Good references so the index survives copies of the basket
+        if len(self._goods_index) != len(self.goods):
+            self._goods_index = {good.name: i for i, good in enumerate(self.goods)}
+        return self._goods_index
+
     def update_good(self, name: str, quantity: float):
-        for good in self.goods:
-            if good.name == name:
-                good.quantity = quantity
-                return
-        self.goods.append(Good(name=name, quantity=quantity))
+        index = self._get_goods_index()
+        if name in index:
+            self.goods[index[name]].quantity = quantity
+        else:
+            index[name] = len(self.goods)
+            self.goods.append(Good(name=name, quantity=quantity))
 
     def get_good_quantity(self, name: str) -> int:
-        return int(next((good.quantity for good in self.goods if good.name == name), 0))
+        index = self._get_goods_index().get(name)
+        return int(self.goods[index].quantity) if index is not None else 0
 
 class Endowment(BaseModel):
+    """
+    An agent's initial basket and the trades it has made since.
+
+    `current_basket` is maintained incrementally as trades are added with `add_trade`
+    instead of being replayed from the initial basket on every access. The returned
+    basket is shared, so callers that want to modify it should copy it first (as
+    `simulate_trade` does). `replay_basket` rebuilds it from scratch for auditing.
+    """
     initial_basket: Basket
     trades: List[Trade] = Field(default_factory=list)
     agent_id: str
+    _current_basket: Optional[Basket] = PrivateAttr(default=None)
+    _basket_source: Optional[Basket] = PrivateAttr(default=None)
+    _applied_trades: int = PrivateAttr(default=0)
 
     @computed_field
     @property
     def current_basket(self) -> Basket:
-        temp_basket = deepcopy(self.initial_basket)
+        if (
+            self._current_basket is None
+            or self._basket_source is not self.initial_basket
+            or self._applied_trades > len(self.trades)
+        ):
+            # first access, or initial_basket / trades were replaced (e.g. by model_copy(update=...))
+            self._current_basket = self.replay_basket()
+            self._basket_source = self.initial_basket
+            self._applied_trades = len(self.trades)
+        else:
+            # trades appended directly to the list instead of through add_trade
+            for trade in self.trades[self._applied_trades:]:
+                self._apply_trade(self._current_basket, trade)
+            self._applied_trades = len(self.trades)
+        return self._current_basket
 
-        for trade in self.trades:
-            # print(f"trade: {trade} updating basket")
-            if trade.buyer_id == self.agent_id:
-                # print(f"buyer {trade.buyer_id} == {self.agent_id}")
-                temp_basket.cash -= trade.price * trade.quantity
-                temp_basket.update_good(trade.good_name, temp_basket.get_good_quantity(trade.good_name) + trade.quantity)
-            elif trade.seller_id == self.agent_id:
-                # print(f"seller {trade.seller_id} == {self.agent_id}")
-                temp_basket.cash += trade.price * trade.quantity
-                temp_basket.update_good(trade.good_name, temp_basket.get_good_quantity(trade.good_name) - trade.quantity)
-            else:
-                raise ValueError(f"Trade {trade} not for agent {self.agent_id}")
-        # Create a new Basket instance with the calculated values
-        return Basket(
-            cash=temp_basket.cash,
-            goods=[Good(name=good.name, quantity=good.quantity) for good in temp_basket.goods]
+    def replay_basket(self) -> Basket:
+        """Recompute the current basket from the initial basket and the full trade list."""
+        temp_basket = Basket(
+            cash=self.initial_basket.cash,
+            goods=[Good(name=good.name, quantity=good.quantity) for good in self.initial_basket.goods]
         )
+        for trade in self.trades:
+            self._apply_trade(temp_basket, trade)
+        return temp_basket
+
+    def _apply_trade(self, basket: Basket, trade: Trade):
+        if trade.buyer_id == self.agent_id:
+            basket.cash -= trade.price * trade.quantity
+            basket.update_good(trade.good_name, basket.get_good_quantity(trade.good_name) + trade.quantity)
+        elif trade.seller_id == self.agent_id:
+            basket.cash += trade.price * trade.quantity
+            basket.update_good(trade.good_name, basket.get_good_quantity(trade.good_name) - trade.quantity)
+        else:
+            raise ValueError(f"Trade {trade} not for agent {self.agent_id}")
 
     def add_trade(self, trade: Trade):
+        current_basket = self.current_basket
+        self._apply_trade(current_basket, trade)
         self.trades.append(trade)
-        # Clear the cached property to ensure it's recalculated
-        if 'current_basket' in self.__dict__:
-            del self.__dict__['current_basket']
+        self._applied_trades += 1
 
     def simulate_trade(self, trade: Trade) -> Basket:
         temp_basket = deepcopy(self.current_basket)
@@ -1,6 +1,7 @@
-from typing import List, Dict, Tuple
+from typing import List, Dict, Optional, Sequence, Tuple
 from pydantic import BaseModel,computed_field
 import matplotlib.pyplot as plt
+import numpy as np
 import logging
 import random
 from market_agents.economics.econ_agent import EconomicAgent, ZiFactory, ZiParams
@@ -18,6 +19,106 @@ class EquilibriumResults(BaseModel):
     total_surplus: float
     good_name: str
 
+
+def pad_curves(curves: Sequence[np.ndarray]) -> np.ndarray:
+    """Stack 1-d price arrays of different lengths into one 2-d array, padded with NaN."""
+    width = max((len(curve) for curve in curves), default=0)
+    stacked = np.full((len(curves), width), np.nan)
+    for i, curve in enumerate(curves):
+        stacked[i, :len(curve)] = curve
+    return stacked
+
+
+def batch_equilibria(demand: np.ndarray, supply: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Competitive equilibrium of many markets at once.
+
+    `demand` and `supply` hold one market per row: the marginal values of every unit
+    buyers want and the marginal costs of every unit sellers offer, in any order and
+    padded with NaN (see `pad_curves`). Rows are sorted, demand descending and supply
+    ascending, and the equilibrium quantity is the number of leading units whose value
+    covers their cost. The price is the midpoint of the last traded unit's value and cost,
+    and 0 with quantity 0 when nothing trades.
+
+    Returns arrays of length `n_markets` under price, quantity, buyer_surplus,
+    seller_surplus and total_surplus.
+    """
+    demand = np.atleast_2d(np.asarray(demand, dtype=float))
+    supply = np.atleast_2d(np.asarray(supply, dtype=float))
+    markets = demand.shape[0]
+    # padding sorts last and never trades: -inf never covers a cost, +inf is never covered
+    demand = -np.sort(-np.where(np.isnan(demand), -np.inf, demand), axis=1)
+    supply = np.sort(np.where(np.isnan(supply), np.inf, supply), axis=1)
+    units = min(demand.shape[1], supply.shape[1])
+    if units == 0:
+        zeros = np.zeros(markets)
+        return {"price": zeros, "quantity": zeros.astype(int), "buyer_surplus": zeros,
+                "seller_surplus": zeros, "total_surplus": zeros}
+    demand, supply = demand[:, :units], supply[:, :units]
+
+    # demand is non-increasing and supply non-decreasing, so the units that trade are a prefix
+    quantity = np.count_nonzero(demand >= supply, axis=1)
+    last = np.maximum(quantity - 1, 0)[:, None]
+    marginal_value = np.take_along_axis(demand, last, axis=1)[:, 0]
+    marginal_cost = np.take_along_axis(supply, last, axis=1)[:, 0]
+    price = np.where(quantity > 0, (marginal_value + marginal_cost) / 2, 0.0)
+
+    traded = np.arange(units) < quantity[:, None]
+    buyer_surplus = np.where(traded, demand - price[:, None], 0.0).sum(axis=1)
+    seller_surplus = np.where(traded, price[:, None] - supply, 0.0).sum(axis=1)
+    return {
+        "price": price,
+        "quantity": quantity,
+        "buyer_surplus": buyer_surplus,
+        "seller_surplus": seller_surplus,
+        "total_surplus": buyer_surplus + seller_surplus,
+    }
+
+
+def zi_schedule_values(base_values: np.ndarray, num_units: int, noise_factor: float, is_buyer: bool,
+                       rng: Optional[np.random.Generator] = None) -> np.ndarray:
+    """
+    Marginal values (buyers) or costs (sellers) of zero-intelligence preference schedules,
+    drawn like `BuyerPreferenceSchedule` / `SellerPreferenceSchedule` but for many agents at
+    once: each unit moves 2% to `noise_factor` away from the previous one. Returns an array
+    of shape `base_values.shape + (num_units,)`.
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    base_values = np.asarray(base_values, dtype=float)
+    steps = rng.uniform(0.02, noise_factor, size=base_values.shape + (num_units,))
+    factors = 1 - steps if is_buyer else 1 + steps
+    return base_values[..., None] * np.cumprod(factors, axis=-1)
+
+
+def sweep_zi_markets(
+    buyer_base_values: Sequence[float],
+    seller_base_values: Sequence[float],
+    num_buyers: Sequence[int],
+    num_sellers: Sequence[int],
+    num_units: int,
+    noise_factor: float,
+    seed: Optional[int] = None
+) -> Dict[str, np.ndarray]:
+    """
+    Equilibria of many single-good ZI markets, one per entry of the parameter arrays,
+    without building agents. Schedules are drawn with `zi_schedule_values` and evaluated
+    with one `batch_equilibria` call.
+    """
+    rng = np.random.default_rng(seed)
+    num_buyers = np.asarray(num_buyers)
+    num_sellers = np.asarray(num_sellers)
+    max_buyers, max_sellers = int(num_buyers.max(initial=0)), int(num_sellers.max(initial=0))
+
+    demand = zi_schedule_values(np.repeat(np.asarray(buyer_base_values, dtype=float)[:, None], max_buyers, axis=1),
+                                num_units, noise_factor, is_buyer=True, rng=rng)
+    supply = zi_schedule_values(np.repeat(np.asarray(seller_base_values, dtype=float)[:, None], max_sellers, axis=1),
+                                num_units, noise_factor, is_buyer=False, rng=rng)
+    # markets with fewer agents than the largest one have the extra agents blanked out
+    demand[np.arange(max_buyers)[None, :] >= num_buyers[:, None]] = np.nan
+    supply[np.arange(max_sellers)[None, :] >= num_sellers[:, None]] = np.nan
+    return batch_equilibria(demand.reshape(len(num_buyers), -1), supply.reshape(len(num_sellers), -1))
+
+
 class Equilibrium(BaseModel):
     agents: List[EconomicAgent]
     goods: List[str]
@@ -26,80 +127,46 @@ class Equilibrium(BaseModel):
         equilibria = {}
         for good in self.goods:
             logger.info(f"Calculating equilibrium for {good}")
-            demand_prices, supply_prices = self._aggregate_curves(good)
-            equilibrium_price, equilibrium_quantity = self._find_intersection(demand_prices, supply_prices)
-            equilibria[good]=EquilibriumResults(
-                price=equilibrium_price,
-                quantity=equilibrium_quantity,
-                buyer_surplus=self._calculate_surplus(demand_prices, equilibrium_price, equilibrium_quantity, is_buyer=True),
-                seller_surplus=self._calculate_surplus(supply_prices, equilibrium_price, equilibrium_quantity, is_buyer=False),
-                total_surplus=self._calculate_surplus(demand_prices, equilibrium_price, equilibrium_quantity, is_buyer=True) + self._calculate_surplus(supply_prices, equilibrium_price, equilibrium_quantity, is_buyer=False),
+            demand_prices, supply_prices = self.aggregate_arrays(good)
+            result = batch_equilibria(demand_prices[None, :], supply_prices[None, :])
+            equilibria[good] = EquilibriumResults(
+                price=float(result["price"][0]),
+                quantity=int(result["quantity"][0]),
+                buyer_surplus=float(result["buyer_surplus"][0]),
+                seller_surplus=float(result["seller_surplus"][0]),
+                total_surplus=float(result["total_surplus"][0]),
                 good_name=good
-            )  
+            )
+            if equilibria[good].quantity == 0:
+                logger.info("No equilibrium found")
+            else:
+                logger.info(f"Equilibrium found at price {equilibria[good].price} with quantity {equilibria[good].quantity}")
         return equilibria
     
     @computed_field
     @cached_property
     def equilibrium(self) -> Dict[str, EquilibriumResults]:
         return self.calculate_equilibrium()
-    
 
+    def aggregate_arrays(self, good: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Marginal values of all buyers' units sorted descending, and costs of all sellers' units sorted ascending."""
+        demand = [
+            np.fromiter(agent.value_schedules[good].values.values(), dtype=float)
+            for agent in self.agents if agent.is_buyer(good)
+        ]
+        supply = [
+            np.fromiter(agent.cost_schedules[good].values.values(), dtype=float)
+            for agent in self.agents if agent.is_seller(good)
+        ]
+        demand_prices = -np.sort(-np.concatenate(demand)) if demand else np.empty(0)
+        supply_prices = np.sort(np.concatenate(supply)) if supply else np.empty(0)
+        return demand_prices, supply_prices
 
     def _aggregate_curves(self, good: str) -> Tuple[List[float], List[float]]:
-        demand_prices = []
-        supply_prices = []
-
-        # Aggregate demand
-        for agent in self.agents:
-            if agent.is_buyer(good):
-                schedule = agent.value_schedules[good]
-                for quantity in range(1, schedule.num_units + 1):
-                    value = schedule.get_value(quantity)
-                    demand_prices.append(value)
-
-        # Aggregate supply
-        for agent in self.agents:
-            if agent.is_seller(good):
-                schedule = agent.cost_schedules[good]
-                for quantity in range(1, schedule.num_units + 1):
-                    cost = schedule.get_value(quantity)
-                    supply_prices.append(cost)
-
-        # Sort the marginal values and costs
-        demand_prices.sort(reverse=True)
-        supply_prices.sort()
+        demand_prices, supply_prices = self.aggregate_arrays(good)
         logger.debug(f"Aggregated demand prices for {good}: {demand_prices}")
         logger.debug(f"Aggregated supply prices for {good}: {supply_prices}")
-        return demand_prices, supply_prices
-
-    def _find_intersection(self, demand_prices: List[float], supply_prices: List[float]) -> Tuple[float, int]:
-        # Find the quantity where demand price >= supply price
-        quantity = 0
-        max_quantity = min(len(demand_prices), len(supply_prices))
-        for i in range(max_quantity):
-            demand_price = demand_prices[i]
-            supply_price = supply_prices[i]
-            logger.debug(f"At quantity {i+1}: demand_price={demand_price}, supply_price={supply_price}")
-            if demand_price >= supply_price:
-                quantity += 1
-            else:
-                break
-        if quantity == 0:
-            logger.info("No equilibrium found")
-            return 0, 0
-        equilibrium_price = (demand_prices[quantity - 1] + supply_prices[quantity - 1]) / 2
-        logger.info(f"Equilibrium found at price {equilibrium_price} with quantity {quantity}")
-        return equilibrium_price, quantity
-
-    def _calculate_surplus(self, prices: List[float], price: float, quantity: int, is_buyer: bool) -> float:
-        surplus = 0.0
-        for i in range(quantity):
-            value = prices[i]
-            if is_buyer:
-                surplus += value - price
-            else:
-                surplus += price - value
-        return surplus
+        return demand_prices.tolist(), supply_prices.tolist()
 
     def plot_supply_demand(self, good: str):
         demand_prices, supply_prices = self._aggregate_curves(good)
@@ -3,7 +3,7 @@ from pydantic import BaseModel, Field, computed_field
 from functools import cached_property
 from market_agents.economics.econ_models import SavableBaseModel
 from market_agents.economics.econ_agent import ZiFactory, ZiParams, EconomicAgent
-from market_agents.economics.equilibrium import Equilibrium, EquilibriumResults
+from market_agents.economics.equilibrium import Equilibrium, EquilibriumResults, batch_equilibria, pad_curves
 import logging
 import matplotlib.pyplot as plt
 
@@ -46,11 +46,39 @@ class Scenario(SavableBaseModel):
     def ce(self) -> Equilibrium:
         return self.equilibriums[self._current_episode]
 
+    @cached_property
+    def results(self) -> List[Dict[str, EquilibriumResults]]:
+        """
+        Equilibrium of every episode, solved for all episodes of a good in one
+        `batch_equilibria` call and cached on each episode's `Equilibrium.equilibrium`.
+        """
+        results = [{} for _ in self.equilibriums]
+        # schedules draw their values on first access, so curves are built episode by episode
+        # to consume random numbers in the same order as solving each episode on its own
+        curves = [{good: eq.aggregate_arrays(good) for good in self.goods} for eq in self.equilibriums]
+        for good in self.goods:
+            batch = batch_equilibria(
+                pad_curves([episode_curves[good][0] for episode_curves in curves]),
+                pad_curves([episode_curves[good][1] for episode_curves in curves])
+            )
+            for episode, episode_results in enumerate(results):
+                episode_results[good] = EquilibriumResults(
+                    price=float(batch["price"][episode]),
+                    quantity=int(batch["quantity"][episode]),
+                    buyer_surplus=float(batch["buyer_surplus"][episode]),
+                    seller_surplus=float(batch["seller_surplus"][episode]),
+                    total_surplus=float(batch["total_surplus"][episode]),
+                    good_name=good
+                )
+        for eq, episode_results in zip(self.equilibriums, results):
+            eq.__dict__.setdefault("equilibrium", episode_results)
+        return results
+
     @computed_field
     @cached_property
     def prices(self) -> Dict[str, List[float]]:
         return {
-            good: [eq.calculate_equilibrium()[good].price for eq in self.equilibriums]
+            good: [episode_results[good].price for episode_results in self.results]
             for good in self.goods
         }
 
@@ -58,12 +86,12 @@ class Scenario(SavableBaseModel):
     @cached_property
     def quantities(self) -> Dict[str, List[int]]:
         return {
-            good: [eq.calculate_equilibrium()[good].quantity for eq in self.equilibriums]
+            good: [episode_results[good].quantity for episode_results in self.results]
             for good in self.goods
         }
 
     def run(self) -> List[Dict[str, EquilibriumResults]]:
-        return [eq.calculate_equilibrium() for eq in self.equilibriums]
+        return self.results
     
     def plot_dynamic_equilibrium(self, good: str, include_supply_demand: bool = False):
         fig, ax = plt.subplots(figsize=(12, 8))
@@ -72,7 +100,7 @@ class Scenario(SavableBaseModel):
         equilibrium_quantities = []
         
         for episode, equilibrium in enumerate(self.equilibriums):
-            eq_data = equilibrium.calculate_equilibrium()[good]
+            eq_data = self.results[episode][good]
             eq_price = eq_data.price
             eq_quantity = eq_data.quantity
             equilibrium_prices.append(eq_price)
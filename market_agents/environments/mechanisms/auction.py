@@ -1,15 +1,17 @@
 # double_auction.py
 
+from collections import defaultdict
 from datetime import datetime
 import json
 import logging
 from typing import Any, List, Dict, Union, Type, Optional, Tuple
-from pydantic import BaseModel, Field, field_validator
+from pydantic import BaseModel, Field, PrivateAttr, field_validator
 from market_agents.environments.environment import (
     Mechanism, LocalAction, GlobalAction, LocalObservation, GlobalObservation,
     EnvironmentStep, ActionSpace, ObservationSpace, MultiAgentEnvironment
 )
 from market_agents.economics.econ_models import Bid, Ask, MarketAction, Trade
+from market_agents.environments.mechanisms.order_book import LimitOrderBook
 import random
 logger = logging.getLogger(__name__)
 
@@ -93,17 +95,34 @@ class DoubleAuction(Mechanism):
     max_rounds: int = Field(default=10, description="Maximum number of auction rounds")
     current_round: int = Field(default=0, description="Current round number")
     trades: List[Trade] = Field(default_factory=list, description="List of executed trades")
-    waiting_bids: List[AuctionAction] = Field(default_factory=list, description="List of waiting bids")
-    waiting_asks: List[AuctionAction] = Field(default_factory=list, description="List of waiting asks")
     good_name: str = Field(default="apple", description="Name of the good being traded")
 
     sequential: bool = Field(default=False, description="Whether the mechanism is sequential")
+    state_window: int = Field(default=20, description="Number of most recent trades and best resting orders per side included in the global state")
+    _order_book: LimitOrderBook = PrivateAttr(default_factory=LimitOrderBook)
+    _total_volume: int = PrivateAttr(default=0)
+    _total_value: float = PrivateAttr(default=0.0)
+    _state_snapshot: Optional[Dict[str, Any]] = PrivateAttr(default=None)
+
+    @property
+    def waiting_bids(self) -> List[AuctionAction]:
+        """Resting bids in price-time priority."""
+        return [order.payload for order in self._order_book.bids()]
+
+    @property
+    def waiting_asks(self) -> List[AuctionAction]:
+        """Resting asks in price-time priority."""
+        return [order.payload for order in self._order_book.asks()]
 
     def step(self, action: GlobalAuctionAction) -> EnvironmentStep:
         self.current_round += 1
+        self._state_snapshot = None
         self._update_waiting_orders(action.actions)
         new_trades = self._match_orders()
         self.trades.extend(new_trades)
+        for trade in new_trades:
+            self._total_volume += trade.quantity
+            self._total_value += trade.price * trade.quantity
 
         market_summary = self._create_market_summary(new_trades)
         observations = self._create_observations(new_trades, market_summary)
@@ -122,12 +141,14 @@ class DoubleAuction(Mechanism):
     def _update_waiting_orders(self, actions: Dict[str, AuctionAction]):
         for agent_id, auction_action in actions.items():
             action = auction_action.action
-            if isinstance(action, Bid):
-                # print(f"Bid from agent {agent_id}: {action}")
-                self.waiting_bids.append(auction_action)
-            elif isinstance(action, Ask):
-                # print(f"Ask from agent {agent_id}: {action}")
-                self.waiting_asks.append(auction_action)
+            if isinstance(action, (Bid, Ask)):
+                self._order_book.add(
+                    agent_id=auction_action.agent_id,
+                    is_buy=isinstance(action, Bid),
+                    price=action.price,
+                    quantity=action.quantity,
+                    payload=auction_action
+                )
             else:
                 logger.error(f"Invalid action type from agent {agent_id}: {type(action)}")
 
@@ -135,63 +156,44 @@ class DoubleAuction(Mechanism):
         trades = []
         trade_id = len(self.trades)
 
-        # Sort bids and asks
-        self.waiting_bids.sort(key=lambda x: x.action.price, reverse=True)
-        self.waiting_asks.sort(key=lambda x: x.action.price)
-
-        while self.waiting_bids and self.waiting_asks:
-            bid = self.waiting_bids[0]
-            ask = self.waiting_asks[0]
-
-            if bid.action.price >= ask.action.price:
-                trade_price = (bid.action.price + ask.action.price) / 2
-
-                trade = Trade(
-                    trade_id=trade_id,
-                    buyer_id=bid.agent_id,
-                    seller_id=ask.agent_id,
-                    price=trade_price,
-                    quantity=1,
-                    good_name=self.good_name,
-                    bid_price=bid.action.price,
-                    ask_price=ask.action.price
-                )
-                trades.append(trade)
-                trade_id += 1
-
-                # Remove matched bid and ask
-                self.waiting_bids.pop(0)
-                self.waiting_asks.pop(0)
-            else:
-                # No more matches possible
-                break
+        for bid, ask, quantity in self._order_book.match():
+            trade = Trade(
+                trade_id=trade_id,
+                buyer_id=bid.agent_id,
+                seller_id=ask.agent_id,
+                price=(bid.price + ask.price) / 2,
+                quantity=quantity,
+                good_name=self.good_name,
+                bid_price=bid.price,
+                ask_price=ask.price
+            )
+            trades.append(trade)
+            trade_id += 1
 
         return trades
 
     def _create_observations(self, new_trades: List[Trade], market_summary: MarketSummary) -> Dict[str, AuctionLocalObservation]:
+        # bucket trades and resting orders by agent in one pass over each
+        agent_trades: Dict[str, List[Trade]] = defaultdict(list)
+        for trade in new_trades:
+            agent_trades[trade.buyer_id].append(trade)
+            if trade.seller_id != trade.buyer_id:
+                agent_trades[trade.seller_id].append(trade)
+
+        # bids before asks for each agent, each in priority order
+        agent_waiting_orders: Dict[str, List[Union[Bid, Ask]]] = defaultdict(list)
+        for order in self._order_book.bids() + self._order_book.asks():
+            agent_waiting_orders[order.agent_id].append(order.payload.action)
+
+        # the inputs are already validated, and every observation shares the same market_summary
         observations = {}
-
-        # Agents with trades in this round
-        participant_ids = set([trade.buyer_id for trade in new_trades] + [trade.seller_id for trade in new_trades])
-
-        # Agents with waiting orders
-        waiting_order_agents = set([bid.agent_id for bid in self.waiting_bids] + [ask.agent_id for ask in self.waiting_asks])
-
-        all_agent_ids = participant_ids.union(waiting_order_agents)
-
-        for agent_id in all_agent_ids:
-            agent_trades = [trade for trade in new_trades if trade.buyer_id == agent_id or trade.seller_id == agent_id]
-            agent_waiting_bids = [bid.action for bid in self.waiting_bids if bid.agent_id == agent_id]
-            agent_waiting_asks = [ask.action for ask in self.waiting_asks if ask.agent_id == agent_id]
-            agent_waiting_orders = agent_waiting_bids + agent_waiting_asks
-
-            observation = AuctionObservation(
-                trades=agent_trades,
+        for agent_id in agent_trades.keys() | agent_waiting_orders.keys():
+            observation = AuctionObservation.model_construct(
+                trades=agent_trades.get(agent_id, []),
                 market_summary=market_summary,
-                waiting_orders=agent_waiting_orders
+                waiting_orders=agent_waiting_orders.get(agent_id, [])
             )
-
-            observations[agent_id] = AuctionLocalObservation(
+            observations[agent_id] = AuctionLocalObservation.model_construct(
                 agent_id=agent_id,
                 observation=observation
             )
@@ -199,18 +201,35 @@ class DoubleAuction(Mechanism):
         return observations
 
     def get_global_state(self) -> Dict[str, Any]:
-        return {
-            "current_round": self.current_round,
-            "trades": [trade.model_dump() for trade in self.trades],
-            "waiting_bids": [{ "agent_id": bid.agent_id, **bid.action.model_dump() } for bid in self.waiting_bids],
-            "waiting_asks": [{ "agent_id": ask.agent_id, **ask.action.model_dump() } for ask in self.waiting_asks]
-        }
+        """
+        Snapshot of the auction for agent prompts: the last `state_window` trades and the best
+        `state_window` resting orders per side, plus running aggregates over the whole run.
+
+        The snapshot is built once per step and shared by every caller until the next `step()`
+        or `reset()`, so it must be treated as read-only.
+        """
+        if self._state_snapshot is None:
+            recent_trades = self.trades[-self.state_window:] if self.state_window > 0 else []
+            self._state_snapshot = {
+                "current_round": self.current_round,
+                "trades": [trade.model_dump() for trade in recent_trades],
+                "trades_count": len(self.trades),
+                "total_volume": self._total_volume,
+                "average_price": self._total_value / self._total_volume if self._total_volume else 0.0,
+                "waiting_bids": [{"agent_id": order.agent_id, **order.payload.action.model_dump()} for order in self._order_book.bids(self.state_window)],
+                "waiting_asks": [{"agent_id": order.agent_id, **order.payload.action.model_dump()} for order in self._order_book.asks(self.state_window)],
+                "waiting_bids_count": self._order_book.num_bids,
+                "waiting_asks_count": self._order_book.num_asks
+            }
+        return self._state_snapshot
 
     def reset(self) -> None:
         self.current_round = 0
         self.trades = []
-        self.waiting_bids = []
-        self.waiting_asks = []
+        self._order_book.clear()
+        self._total_volume = 0
+        self._total_value = 0.0
+        self._state_snapshot = None
 
     def _create_market_summary(self, trades: List[Trade]) -> MarketSummary:
         if not trades:
@@ -0,0 +1,155 @@
+# order_book.py
+
+import heapq
+from dataclasses import dataclass, field
+from itertools import count
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+
+@dataclass
+class BookOrder:
+    order_id: int
+    agent_id: str
+    is_buy: bool
+    price: float
+    quantity: int
+    payload: Any = field(default=None, repr=False)
+
+
+class LimitOrderBook:
+    """
+    A price-time priority limit order book shared by the auction and stock market mechanisms.
+
+    Each side is a heap keyed on (price, arrival sequence), so inserting, cancelling and
+    matching an order are O(log n) instead of re-sorting every resting order each round.
+    Cancelled and filled orders are dropped lazily when they reach the top of their heap.
+    Resting quantity is aggregated per price level as orders come and go, and the level
+    summary is rebuilt from those aggregates only when the book has changed.
+    """
+
+    def __init__(self):
+        self._bids: List[Tuple[float, int]] = []
+        self._asks: List[Tuple[float, int]] = []
+        self._orders: Dict[int, BookOrder] = {}
+        self._levels: Dict[bool, Dict[float, int]] = {True: {}, False: {}}
+        self._counts: Dict[bool, int] = {True: 0, False: 0}
+        self._ids = count()
+        self._summary: Optional[Dict[str, List[Tuple[float, int]]]] = None
+
+    def __len__(self) -> int:
+        return len(self._orders)
+
+    def __contains__(self, order_id: int) -> bool:
+        return order_id in self._orders
+
+    @property
+    def num_bids(self) -> int:
+        return self._counts[True]
+
+    @property
+    def num_asks(self) -> int:
+        return self._counts[False]
+
+    def add(self, agent_id: str, is_buy: bool, price: float, quantity: int, payload: Any = None) -> BookOrder:
+        order_id = next(self._ids)
+        order = BookOrder(order_id=order_id, agent_id=agent_id, is_buy=is_buy, price=price, quantity=quantity, payload=payload)
+        self._orders[order_id] = order
+        self._counts[is_buy] += 1
+        if is_buy:
+            heapq.heappush(self._bids, (-price, order_id))
+        else:
+            heapq.heappush(self._asks, (price, order_id))
+        self._change_level(is_buy, price, quantity)
+        return order
+
+    def cancel(self, order_id: int) -> Optional[BookOrder]:
+        order = self._orders.pop(order_id, None)
+        if order is not None:
+            self._counts[order.is_buy] -= 1
+            self._change_level(order.is_buy, order.price, -order.quantity)
+            self._compact()
+        return order
+
+    def fill(self, order: BookOrder, quantity: int) -> None:
+        order.quantity -= quantity
+        self._change_level(order.is_buy, order.price, -quantity)
+        if order.quantity <= 0 and self._orders.pop(order.order_id, None) is not None:
+            self._counts[order.is_buy] -= 1
+
+    def best_bid(self) -> Optional[BookOrder]:
+        return self._peek(self._bids)
+
+    def best_ask(self) -> Optional[BookOrder]:
+        return self._peek(self._asks)
+
+    def match(self) -> List[Tuple[BookOrder, BookOrder, int]]:
+        """Cross the book while the best bid meets the best ask, returning (bid, ask, quantity) fills."""
+        fills = []
+        while True:
+            bid, ask = self.best_bid(), self.best_ask()
+            if bid is None or ask is None or bid.price < ask.price:
+                break
+            quantity = min(bid.quantity, ask.quantity)
+            self.fill(bid, quantity)
+            self.fill(ask, quantity)
+            fills.append((bid, ask, quantity))
+        return fills
+
+    def bids(self, limit: Optional[int] = None) -> List[BookOrder]:
+        """Resting bids in priority order, only the best `limit` if given."""
+        return self._sorted_side(self._bids, limit)
+
+    def asks(self, limit: Optional[int] = None) -> List[BookOrder]:
+        """Resting asks in priority order, only the best `limit` if given."""
+        return self._sorted_side(self._asks, limit)
+
+    def orders(self) -> Iterator[BookOrder]:
+        """Resting orders on both sides in arrival order."""
+        return iter(self._orders.values())
+
+    def summary(self) -> Dict[str, List[Tuple[float, int]]]:
+        """Resting quantity per price level, best prices first."""
+        if self._summary is None:
+            self._summary = {
+                'buy': sorted(self._levels[True].items(), key=lambda x: -x[0]),
+                'sell': sorted(self._levels[False].items(), key=lambda x: x[0])
+            }
+        return self._summary
+
+    def clear(self) -> None:
+        self._bids.clear()
+        self._asks.clear()
+        self._orders.clear()
+        self._levels = {True: {}, False: {}}
+        self._counts = {True: 0, False: 0}
+        self._summary = None
+
+    def _peek(self, heap: List[Tuple[float, int]]) -> Optional[BookOrder]:
+        while heap:
+            order = self._orders.get(heap[0][1])
+            if order is not None:
+                return order
+            heapq.heappop(heap)
+        return None
+
+    def _compact(self) -> None:
+        # drop lazily cancelled entries once they make up most of the heaps
+        if len(self._bids) + len(self._asks) > 2 * len(self._orders) + 64:
+            self._bids = [entry for entry in self._bids if entry[1] in self._orders]
+            self._asks = [entry for entry in self._asks if entry[1] in self._orders]
+            heapq.heapify(self._bids)
+            heapq.heapify(self._asks)
+
+    def _sorted_side(self, heap: List[Tuple[float, int]], limit: Optional[int] = None) -> List[BookOrder]:
+        live = (entry for entry in heap if entry[1] in self._orders)
+        entries = sorted(live) if limit is None else heapq.nsmallest(limit, live)
+        return [self._orders[entry[1]] for entry in entries]
+
+    def _change_level(self, is_buy: bool, price: float, quantity: int) -> None:
+        levels = self._levels[is_buy]
+        remaining = levels.get(price, 0) + quantity
+        if remaining > 0:
+            levels[price] = remaining
+        else:
+            levels.pop(price, None)
+        self._summary = None
@@ -4,7 +4,7 @@ from datetime import datetime
 import json
 import random
 from typing import Any, Dict, List, Optional, Type, Union
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, PrivateAttr
 
 from market_agents.environments.environment import (
     EnvironmentHistory,
@@ -124,10 +124,12 @@ class ResearchMechanism(Mechanism):
     
     round_summaries: List[Dict[str, Any]] = Field(default_factory=list)
     last_step: Optional[EnvironmentStep] = Field(default=None, description="Last environment step")
+    _state_snapshot: Optional[Dict[str, Any]] = PrivateAttr(default=None)
 
     def step(self, action: Union[ResearchAction, ResearchGlobalAction, Dict[str, Any]]) -> Union[LocalEnvironmentStep, EnvironmentStep]:
         logger.debug(f"ResearchMechanism step: {action}")
         self.current_round += 1
+        self._state_snapshot = None
         done = (self.current_round >= self.max_rounds)
 
         if self.sequential:
@@ -233,13 +235,18 @@ class ResearchMechanism(Mechanism):
         """
         Return the mechanism's overall state, e.g. how many rounds have been done,
         or any other state you'd like to expose to agents or orchestrators.
+
+        The last step is serialized once per step and the snapshot is shared until the
+        next `step()` or `reset()`, so callers must treat it as read-only.
         """
-        return {
-            "current_round": self.current_round,
-            "max_rounds": self.max_rounds,
-            "round_summaries_count": len(self.round_summaries),
-            "last_step": self.last_step.dict() if self.last_step else None
-        }
+        if self._state_snapshot is None:
+            self._state_snapshot = {
+                "current_round": self.current_round,
+                "max_rounds": self.max_rounds,
+                "round_summaries_count": len(self.round_summaries),
+                "last_step": self.last_step.dict() if self.last_step else None
+            }
+        return self._state_snapshot
 
     def reset(self) -> None:
         """
@@ -248,6 +255,7 @@ class ResearchMechanism(Mechanism):
         self.current_round = 0
         self.round_summaries.clear()
         self.last_step = None  # Reset last step
+        self._state_snapshot = None
         logger.info("ResearchMechanism reset complete.")
 
 
@@ -2,13 +2,15 @@
 
 import logging
 import random
+from collections import defaultdict
 from typing import Any, List, Dict, Union, Type, Optional, Tuple
 from market_agents.stock_market.stock_agent import StockEconomicAgent
-from pydantic import BaseModel, Field, field_validator
+from pydantic import BaseModel, Field, PrivateAttr, field_validator
 from market_agents.environments.environment import (
     EnvironmentHistory, Mechanism, LocalAction, GlobalAction, LocalObservation, GlobalObservation,
     EnvironmentStep, ActionSpace, ObservationSpace, MultiAgentEnvironment
 )
+from market_agents.environments.mechanisms.order_book import LimitOrderBook
 from market_agents.stock_market.stock_models import OrderType, MarketAction, StockOrder, Trade
 logger = logging.getLogger(__name__)
 
@@ -85,19 +87,33 @@ class StockMarketMechanism(Mechanism):
     max_rounds: int = Field(default=100, description="Maximum number of trading rounds")
     current_round: int = Field(default=0, description="Current round number")
     trades: List[Trade] = Field(default_factory=list, description="List of executed trades")
-    order_book_buy: List[StockOrder] = Field(default_factory=list, description="List of buy orders")
-    order_book_sell: List[StockOrder] = Field(default_factory=list, description="List of sell orders")
     stock_symbol: str = Field(default="AAPL", description="Stock symbol being traded")
     current_price: float = Field(default=100.0, description="Current market price")
     price_history: List[float] = Field(default_factory=lambda: [100.0])
     sequential: bool = Field(default=False, description="Whether the mechanism is sequential")
     agent_registry: Dict[str, Any] = Field(default_factory=dict, description="Registry of agents")
+    state_window: int = Field(default=20, description="Number of most recent trades, prices and best price levels per side included in the global state")
+    _order_book: LimitOrderBook = PrivateAttr(default_factory=LimitOrderBook)
+    _total_volume: int = PrivateAttr(default=0)
+    _state_snapshot: Optional[Dict[str, Any]] = PrivateAttr(default=None)
+
+    @property
+    def order_book_buy(self) -> List[StockOrder]:
+        """Resting buy orders in price-time priority."""
+        return [order.payload for order in self._order_book.bids()]
+
+    @property
+    def order_book_sell(self) -> List[StockOrder]:
+        """Resting sell orders in price-time priority."""
+        return [order.payload for order in self._order_book.asks()]
 
     def step(self, action: GlobalStockMarketAction) -> EnvironmentStep:
         self.current_round += 1
+        self._state_snapshot = None
         self._update_order_book(action.actions)
         new_trades = self._match_orders()
         self.trades.extend(new_trades)
+        self._total_volume += sum(trade.quantity for trade in new_trades)
         self._update_price(new_trades)
 
         market_summary = self._create_market_summary(new_trades)
@@ -125,68 +141,41 @@ class StockMarketMechanism(Mechanism):
                 price=action.action.price,
                 quantity=action.action.quantity
             )
-            if order.is_buy_order:
-                self.order_book_buy.append(order)
-            elif order.order_type == OrderType.SELL:
-                self.order_book_sell.append(order)
+            if order.is_buy_order or order.order_type == OrderType.SELL:
+                self._order_book.add(
+                    agent_id=agent_id,
+                    is_buy=order.is_buy_order,
+                    price=order.price,
+                    quantity=order.quantity,
+                    payload=order
+                )
 
     def _match_orders(self) -> List[Trade]:
         trades = []
         trade_id = len(self.trades)
 
-        # Sort buy and sell orders
-        self.order_book_buy.sort(key=lambda x: (-x.price, x.agent_id))
-        self.order_book_sell.sort(key=lambda x: (x.price, x.agent_id))
-
-        while self.order_book_buy and self.order_book_sell:
-            best_buy = self.order_book_buy[0]
-            best_sell = self.order_book_sell[0]
-
-            if best_buy.price >= best_sell.price:
-                trade_price = (best_buy.price + best_sell.price) / 2
-                trade_quantity = min(best_buy.quantity, best_sell.quantity)
-
-                trade = Trade(
-                    trade_id=trade_id,
-                    buyer_id=best_buy.agent_id,
-                    seller_id=best_sell.agent_id,
-                    price=trade_price,
-                    bid_price=best_buy.price,
-                    ask_price=best_sell.price,
-                    quantity=trade_quantity,
-                    stock_symbol=self.stock_symbol
-                )
-                trades.append(trade)
-                trade_id += 1
-
-                # Update order quantities
-                best_buy.quantity -= trade_quantity
-                best_sell.quantity -= trade_quantity
+        for best_buy, best_sell, trade_quantity in self._order_book.match():
+            trade = Trade(
+                trade_id=trade_id,
+                buyer_id=best_buy.agent_id,
+                seller_id=best_sell.agent_id,
+                price=(best_buy.price + best_sell.price) / 2,
+                bid_price=best_buy.price,
+                ask_price=best_sell.price,
+                quantity=trade_quantity,
+                stock_symbol=self.stock_symbol
+            )
+            trades.append(trade)
+            trade_id += 1
 
-                if best_buy.quantity == 0:
-                    self.order_book_buy.pop(0)
-                if best_sell.quantity == 0:
-                    self.order_book_sell.pop(0)
-            else:
-                break
+            # keep the resting StockOrder quantities in sync with the book
+            best_buy.payload.quantity = best_buy.quantity
+            best_sell.payload.quantity = best_sell.quantity
 
         return trades
 
     def _get_order_book_summary(self) -> Dict[str, List[Tuple[float, int]]]:
-        buy_orders = {}
-        for order in self.order_book_buy:
-            price = order.price
-            quantity = order.quantity
-            buy_orders[price] = buy_orders.get(price, 0) + quantity
-        sell_orders = {}
-        for order in self.order_book_sell:
-            price = order.price
-            quantity = order.quantity
-            sell_orders[price] = sell_orders.get(price, 0) + quantity
-        return {
-            'buy': sorted(buy_orders.items(), key=lambda x: -x[0]),
-            'sell': sorted(sell_orders.items(), key=lambda x: x[0])
-        }
+        return self._order_book.summary()
 
     def _update_price(self, trades: List[Trade]):
         if trades:
@@ -195,26 +184,31 @@ class StockMarketMechanism(Mechanism):
             self.price_history.append(self.current_price)
 
     def _create_observations(self, new_trades: List[Trade], market_summary: MarketSummary, order_book_summary: Dict[str, List[Tuple[float, int]]]) -> Dict[str, StockMarketLocalObservation]:
+        # bucket trades by agent in one pass instead of rescanning them for every agent
+        agent_trades: Dict[str, List[Trade]] = defaultdict(list)
+        for trade in new_trades:
+            agent_trades[trade.buyer_id].append(trade)
+            if trade.seller_id != trade.buyer_id:
+                agent_trades[trade.seller_id].append(trade)
+
+        # the inputs are already validated, and every observation shares the same summaries
         observations = {}
-        agent_ids = set([trade.buyer_id for trade in new_trades] + [trade.seller_id for trade in new_trades])
-
-        for agent_id in agent_ids:
-            agent_trades = [trade for trade in new_trades if trade.buyer_id == agent_id or trade.seller_id == agent_id]
+        for agent_id, trades in agent_trades.items():
             agent = self.agent_registry.get(agent_id)
             if agent:
                 portfolio_value = agent.calculate_portfolio_value(self.current_price)
             else:
                 portfolio_value = 0.0
 
-            observation = StockMarketObservation(
-                trades=agent_trades,
+            observation = StockMarketObservation.model_construct(
+                trades=trades,
                 market_summary=market_summary,
                 order_book_summary=order_book_summary,
                 current_price=self.current_price,
                 portfolio_value=portfolio_value
             )
 
-            observations[agent_id] = StockMarketLocalObservation(
+            observations[agent_id] = StockMarketLocalObservation.model_construct(
                 agent_id=agent_id,
                 observation=observation
             )
@@ -235,21 +229,36 @@ class StockMarketMechanism(Mechanism):
         )
 
     def get_global_state(self) -> Dict[str, Any]:
-        return {
-            "current_round": self.current_round,
-            "current_price": self.current_price,
-            "price_history": self.price_history,
-            "trades": [trade.model_dump() for trade in self.trades],
-            "order_book_summary": self._get_order_book_summary()
-        }
+        """
+        Snapshot of the market for agent prompts: the last `state_window` trades and prices and
+        the best `state_window` price levels per side, plus running aggregates over the whole run.
+
+        The snapshot is built once per step and shared by every caller until the next `step()`
+        or `reset()`, so it must be treated as read-only.
+        """
+        if self._state_snapshot is None:
+            window = max(self.state_window, 0)
+            recent_trades = self.trades[-window:] if window else []
+            order_book_summary = self._get_order_book_summary()
+            self._state_snapshot = {
+                "current_round": self.current_round,
+                "current_price": self.current_price,
+                "price_history": self.price_history[-window:] if window else [],
+                "trades": [trade.model_dump() for trade in recent_trades],
+                "trades_count": len(self.trades),
+                "total_volume": self._total_volume,
+                "order_book_summary": {side: levels[:window] for side, levels in order_book_summary.items()}
+            }
+        return self._state_snapshot
 
     def reset(self) -> None:
         self.current_round = 0
         self.trades = []
-        self.order_book_buy = []
-        self.order_book_sell = []
+        self._order_book.clear()
         self.current_price = 100.0
         self.price_history = [self.current_price]
+        self._total_volume = 0
+        self._state_snapshot = None
 
 
 class StockMarket(MultiAgentEnvironment):
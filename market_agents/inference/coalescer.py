@@ -0,0 +1,110 @@
+import asyncio
+import logging
+import weakref
+from collections import defaultdict, deque
+from typing import Deque, Dict, List, Optional, Set, Tuple
+
+from .message_models import LLMPromptContext, LLMOutput
+from .parallel_inference import ParallelAIUtilities
+
+
+class RequestCoalescer:
+    """
+    Collects prompts submitted by concurrent tasks within a short window and sends them
+    through `ParallelAIUtilities` as a single batch.
+
+    Orchestrators that run one task per cohort otherwise start one dispatcher per cohort
+    and step, all competing for the same provider quota. The coalescer exposes the same
+    `run_parallel_ai_completion` / `get_all_requests` interface as `ParallelAIUtilities`,
+    so it can be handed to `AgentCognitiveProcessor` in its place. Each caller gets back
+    only the outputs for its own prompts, in the order it submitted them, and
+    `get_all_requests` returns only the requests of the calling task.
+    """
+
+    def __init__(self, ai_utils: ParallelAIUtilities, window_seconds: float = 0.05, max_batch_size: Optional[int] = None):
+        self.ai_utils = ai_utils
+        self.window_seconds = window_seconds
+        self.max_batch_size = max_batch_size
+        self._pending: List[Tuple[List[LLMPromptContext], bool, asyncio.Future]] = []
+        self._pending_count = 0
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._requests: "weakref.WeakKeyDictionary[asyncio.Task, List[LLMOutput]]" = weakref.WeakKeyDictionary()
+        # the loop only keeps weak references to tasks, dispatches in flight are held here
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def run_parallel_ai_completion(self, prompts: List[LLMPromptContext], update_history: bool = True) -> List[LLMOutput]:
+        if not prompts:
+            return []
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((prompts, update_history, future))
+        self._pending_count += len(prompts)
+        if self.max_batch_size and self._pending_count >= self.max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.window_seconds, self._flush)
+        outputs = await future
+        self._requests.setdefault(asyncio.current_task(), []).extend(outputs)
+        return outputs
+
+    def get_all_requests(self):
+        """Requests made by the calling task since its last call, like `ParallelAIUtilities.get_all_requests`."""
+        return self._requests.pop(asyncio.current_task(), [])
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending, self._pending_count = self._pending, [], 0
+        if batch:
+            task = asyncio.ensure_future(self._dispatch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def close(self) -> None:
+        """Dispatch prompts still waiting for the window and wait for every dispatch in flight."""
+        self._flush()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def _dispatch(self, batch: List[Tuple[List[LLMPromptContext], bool, asyncio.Future]]):
+        all_prompts = [prompt for prompts, _, _ in batch for prompt in prompts]
+        logging.debug(f"Dispatching {len(all_prompts)} coalesced prompts from {len(batch)} callers")
+        try:
+            # requests are handed back to each caller, not left in the shared log
+            outputs = await self.ai_utils.run_parallel_ai_completion(all_prompts, update_history=False, record_requests=False)
+        except Exception as e:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        outputs_by_source: Dict[str, Deque[LLMOutput]] = defaultdict(deque)
+        for output in outputs:
+            outputs_by_source[output.source_id].append(output)
+
+        results = []
+        history_prompts, history_outputs = [], []
+        for prompts, update_history, future in batch:
+            caller_outputs = [
+                outputs_by_source[prompt.id].popleft()
+                for prompt in prompts
+                if outputs_by_source[prompt.id]
+            ]
+            results.append((future, caller_outputs))
+            if update_history:
+                history_prompts.extend(prompts)
+                history_outputs.extend(caller_outputs)
+
+        try:
+            if history_prompts:
+                # one call so history summaries for the whole batch are also dispatched together
+                await self.ai_utils.update_prompt_history(history_prompts, history_outputs)
+        except Exception as e:
+            for future, _ in results:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for future, caller_outputs in results:
+            if not future.done():
+                future.set_result(caller_outputs)
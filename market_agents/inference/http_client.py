@@ -0,0 +1,64 @@
+import asyncio
+import logging
+from typing import Optional
+
+import aiohttp
+from pydantic import BaseModel, Field
+
+
+class HTTPClientConfig(BaseModel):
+    max_connections: int = Field(default=200, description="The maximum number of open connections across all hosts")
+    max_connections_per_host: int = Field(default=100, description="The maximum number of open connections to a single host")
+    keepalive_timeout: float = Field(default=60.0, description="Seconds an idle connection is kept open for reuse")
+    dns_cache_ttl: int = Field(default=300, description="Seconds resolved host names are cached")
+    total_timeout: Optional[float] = Field(default=None, description="Total timeout in seconds for a single request, None for no limit")
+
+
+class PooledHTTPClient:
+    """
+    A long-lived aiohttp session shared by every HTTP client in a simulation.
+
+    Creating a new `aiohttp.ClientSession` per batch throws away its connection pool,
+    so every batch pays a fresh TCP and TLS handshake. This class creates the session
+    lazily on first use, keeps connections alive between batches and limits how many
+    are opened per host. The inference, embedding and group chat clients all take the
+    same instance so they reuse the same pool.
+
+    The session is bound to the event loop it was created in; if it is used from a new
+    loop (e.g. a second `asyncio.run`) it is transparently recreated.
+    """
+
+    def __init__(self, config: Optional[HTTPClientConfig] = None):
+        self.config = config or HTTPClientConfig()
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def get_session(self) -> aiohttp.ClientSession:
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._loop is not loop:
+            logging.debug("Creating pooled HTTP session")
+            self._session = self._create_session()
+            self._loop = loop
+        return self._session
+
+    def _create_session(self) -> aiohttp.ClientSession:
+        connector = aiohttp.TCPConnector(
+            limit=self.config.max_connections,
+            limit_per_host=self.config.max_connections_per_host,
+            keepalive_timeout=self.config.keepalive_timeout,
+            ttl_dns_cache=self.config.dns_cache_ttl,
+        )
+        timeout = aiohttp.ClientTimeout(total=self.config.total_timeout)
+        return aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self._loop = None
+
+    async def __aenter__(self) -> "PooledHTTPClient":
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.close()
@@ -1,6 +1,6 @@
 from market_agents.agents.tool_caller.utils import function_to_json
-from pydantic import BaseModel, Field, computed_field, ValidationError, model_validator
-from typing import Callable, Literal, Optional, Union, Dict, Any, List, Iterable, Tuple
+from pydantic import BaseModel, Field, PrivateAttr, computed_field, ValidationError, model_validator
+from typing import Callable, Literal, NamedTuple, Optional, Union, Dict, Any, List, Iterable, Tuple
 import json
 import time
 from typing_extensions import Self
@@ -41,7 +41,7 @@ from anthropic.types.beta.prompt_caching import (
 from anthropic.types.beta.prompt_caching.prompt_caching_beta_cache_control_ephemeral_param import PromptCachingBetaCacheControlEphemeralParam
 from anthropic.types.model_param import ModelParam
 
-from market_agents.inference.utils import msg_dict_to_oai, msg_dict_to_anthropic, parse_json_string
+from market_agents.inference.utils import msg_dict_to_oai, msg_dict_to_anthropic, parse_json_string, count_tokens
 
 
 
@@ -103,6 +103,12 @@ class LLMConfig(BaseModel):
     temperature: float = 0
     response_format: Literal["json_beg", "text","json_object","structured_output","tool"] = "text"
     use_cache: bool = True
+    history_policy: Literal["unbounded", "sliding_window", "token_budget", "summary"] = Field(default="unbounded", description="How the prompt history is bounded")
+    max_history_turns: int = Field(default=10, description="Maximum user/assistant turns kept by the sliding_window policy")
+    max_history_tokens: int = Field(default=4000, description="Maximum history tokens kept by the token_budget and summary policies")
+    history_retain_ratio: float = Field(default=0.5, description="Fraction of the limit kept after trimming, trimming in blocks keeps the prompt prefix stable between trims")
+    summary_model: Optional[str] = Field(default=None, description="Cheaper model used to summarize evicted turns, defaults to model")
+    summary_max_tokens: int = Field(default=300, description="Maximum tokens of the rolling history summary")
 
     @model_validator(mode="after")
     def validate_response_format(self) -> Self:
@@ -127,6 +133,10 @@ class LLMPromptContext(BaseModel):
     tools: Optional[List[Callable]] = None
     llm_config: LLMConfig
     use_history: bool = Field(default=True, description="Whether to use the history")
+    history_summary: Optional[str] = Field(default=None, description="Rolling summary of turns evicted from the history")
+    _history_token_count: int = PrivateAttr(default=0)
+    _history_messages_counted: int = PrivateAttr(default=0)
+    _last_counted_message: Optional[Dict[str, Any]] = PrivateAttr(default=None)
     
     @computed_field
     @property
@@ -166,6 +176,8 @@ class LLMPromptContext(BaseModel):
         content= self.system_string if self.system_string  else ""
         if self.use_schema_instruction and self.structured_output:
             content = "\n".join([content,self.structured_output.schema_instruction])
+        if self.use_history and self.history_summary:
+            content = "\n".join([content, f"Summary of the earlier conversation: {self.history_summary}"])
         return {"role":"system","content":content} if len(content)>0 else None
     
     @computed_field
@@ -197,6 +209,38 @@ class LLMPromptContext(BaseModel):
     def vllm_messages(self) -> List[ChatCompletionMessageParam]:
         return msg_dict_to_oai(self.messages)
         
+    @staticmethod
+    def _count_message_tokens(message: Dict[str, Any]) -> int:
+        content = message.get("content") or ""
+        # every message follows <im_start>{role/name}\n{content}<im_end>\n
+        return 4 + count_tokens(content if isinstance(content, str) else json.dumps(content))
+
+    @property
+    def history_token_count(self) -> int:
+        """ tokens in the history, only messages appended since the last call are encoded """
+        history = self.history if self.use_history and self.history else []
+        counted = self._history_messages_counted
+        if counted > len(history) or (counted and history[counted - 1] is not self._last_counted_message):
+            # history was replaced or truncated, count it again from scratch
+            self._history_token_count, counted = 0, 0
+        for message in history[counted:]:
+            self._history_token_count += self._count_message_tokens(message)
+        self._history_messages_counted = len(history)
+        self._last_counted_message = history[-1] if history else None
+        return self._history_token_count
+
+    @property
+    def prompt_token_estimate(self) -> int:
+        """ estimated prompt tokens for rate limiting, the cost of computing it depends only on the new turn """
+        num_tokens = self.history_token_count + 2  # every reply is primed with <im_start>assistant
+        if self.system_message is not None:
+            num_tokens += self._count_message_tokens(self.system_message)
+        new_message = self.new_message + self.postfill if self.use_postfill else self.new_message
+        num_tokens += self._count_message_tokens({"content": new_message})
+        if self.use_prefill:
+            num_tokens += self._count_message_tokens({"content": self.prefill})
+        return num_tokens
+
     def update_llm_config(self,llm_config:LLMConfig) -> 'LLMPromptContext':
         
         return self.model_copy(update={"llm_config":llm_config})
@@ -213,6 +257,32 @@ class LLMPromptContext(BaseModel):
         self.history.append({"role": "user", "content": self.new_message})
         self.history.append({"role": "assistant", "content": llm_output.str_content or json.dumps(llm_output.json_object.object) if llm_output.json_object else "{}"})
     
+    def trim_history(self) -> List[Dict[str, Any]]:
+        """ apply the llm_config history policy and return the evicted messages, oldest first.
+        Once the limit is exceeded whole turns are dropped until history_retain_ratio of it remains,
+        so the prompt prefix (and the provider prompt cache) stays unchanged until the next trim """
+        config = self.llm_config
+        if config.history_policy == "unbounded" or not self.history:
+            return []
+        if config.history_policy == "sliding_window":
+            if len(self.history) // 2 <= config.max_history_turns:
+                return []
+            keep_turns = int(config.max_history_turns * config.history_retain_ratio)
+            evict_count = len(self.history) - 2 * keep_turns
+        else:
+            history_tokens = self.history_token_count
+            if history_tokens <= config.max_history_tokens:
+                return []
+            target_tokens = config.max_history_tokens * config.history_retain_ratio
+            evict_count = 0
+            while evict_count < len(self.history) and history_tokens > target_tokens:
+                for message in self.history[evict_count:evict_count + 2]:
+                    history_tokens -= self._count_message_tokens(message)
+                evict_count += 2
+        evicted = self.history[:evict_count]
+        del self.history[:evict_count]
+        return evicted
+
     def get_tool(self) -> Union[ChatCompletionToolParam, PromptCachingBetaToolParam, None]:
         if not self.structured_output:
             return None
@@ -240,6 +310,14 @@ class GeneratedJsonObject(BaseModel):
     name: str
     object: Dict[str, Any]
 
+class ParsedLLMResult(NamedTuple):
+    """ immutable view of an LLMOutput's raw_result, computed once per output """
+    str_content: Optional[str]
+    json_object: Optional[GeneratedJsonObject]
+    usage: Optional[Usage]
+    error: Optional[str]
+    tool_calls: Optional[List[GeneratedJsonObject]]
+
 class LLMOutput(BaseModel):
     raw_result: Union[str, dict, ChatCompletion, AnthropicMessage, PromptCachingBetaMessage]
     completion_kwargs: Optional[Dict[str, Any]] = None
@@ -247,6 +325,15 @@ class LLMOutput(BaseModel):
     end_time: float
     source_id: str
     client: Optional[Literal["openai", "anthropic","vllm","litellm"]] = Field(default=None)
+    _parsed: Optional[ParsedLLMResult] = PrivateAttr(default=None)
+    _searched_provider: Optional[Tuple[Optional[str]]] = PrivateAttr(default=None)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        super().__setattr__(name, value)
+        if name in ("raw_result", "completion_kwargs", "client"):
+            # the cached views depend on these fields
+            self._parsed = None
+            self._searched_provider = None
 
     @property
     def time_taken(self) -> float:
@@ -255,37 +342,42 @@ class LLMOutput(BaseModel):
     @computed_field
     @property
     def str_content(self) -> Optional[str]:
-        return self._parse_result()[0]
+        return self._parse_result().str_content
 
     @computed_field
     @property
     def json_object(self) -> Optional[GeneratedJsonObject]:
-        return self._parse_result()[1]
+        return self._parse_result().json_object
     
     @computed_field
     @property
     def tool_calls(self) -> Optional[List[GeneratedJsonObject]]:
-        return self._parse_result()[4]
+        return self._parse_result().tool_calls
     
     @computed_field
     @property
     def error(self) -> Optional[str]:
-        return self._parse_result()[3]
+        return self._parse_result().error
 
     @computed_field
     @property
     def contains_object(self) -> bool:
-        return self._parse_result()[1] is not None
+        return self._parse_result().json_object is not None
     
     @computed_field
     @property
     def usage(self) -> Optional[Usage]:
-        return self._parse_result()[2]
+        return self._parse_result().usage
 
     @computed_field
     @property
     def result_provider(self) -> Optional[Literal["openai", "anthropic","vllm","litellm"]]:
-        return self.search_result_provider() if self.client is None else self.client
+        if self.client is not None:
+            return self.client
+        # provider detection costs up to three validations, so only run it once
+        if self._searched_provider is None:
+            self._searched_provider = (self.search_result_provider(),)
+        return self._searched_provider[0]
     
     @model_validator(mode="after")
     def validate_provider_and_client(self) -> Self:
@@ -355,9 +447,10 @@ class LLMOutput(BaseModel):
 
         return content, json_object, usage, None, tool_calls
 
-    def _parse_anthropic_message(self, message: Union[AnthropicMessage, PromptCachingBetaMessage]) -> Tuple[Optional[str], Optional[GeneratedJsonObject], Optional[Usage],None]:
+    def _parse_anthropic_message(self, message: Union[AnthropicMessage, PromptCachingBetaMessage]) -> Tuple[Optional[str], Optional[GeneratedJsonObject], Optional[Usage], None, Optional[List[GeneratedJsonObject]]]:
         content = None
         json_object = None
+        tool_calls = []
         usage = None
 
         if message.content:
@@ -372,6 +465,7 @@ class LLMOutput(BaseModel):
                 name = first_content.name
                 input_dict : Dict[str,Any] = first_content.input # type: ignore  # had to ignore due to .input being of object class
                 json_object = GeneratedJsonObject(name=name, object=input_dict)
+                tool_calls = [json_object]
 
         if hasattr(message, 'usage'):
             usage = Usage(
@@ -382,13 +476,18 @@ class LLMOutput(BaseModel):
                 cache_read_input_tokens=getattr(message.usage, 'cache_read_input_tokens', None)
             )
 
-        return content, json_object, usage, None
+        return content, json_object, usage, None, tool_calls
     
 
-    def _parse_result(self) -> Tuple[Optional[str], Optional[GeneratedJsonObject], Optional[Usage],Optional[str]]:
+    def _parse_result(self) -> ParsedLLMResult:
+        if self._parsed is None:
+            self._parsed = ParsedLLMResult(*self._parse_raw_result())
+        return self._parsed
+
+    def _parse_raw_result(self) -> Tuple[Optional[str], Optional[GeneratedJsonObject], Optional[Usage], Optional[str], Optional[List[GeneratedJsonObject]]]:
         provider = self.result_provider
         if getattr(self.raw_result, "error", None):
-            return None, None, None,  getattr(self.raw_result, "error", None)
+            return None, None, None,  getattr(self.raw_result, "error", None), None
         if provider == "openai":
             return self._parse_oai_completion(ChatCompletion.model_validate(self.raw_result))
         elif provider == "anthropic":
@@ -31,22 +31,21 @@ SOFTWARE.
 import aiohttp  # for making API calls concurrently
 import argparse  # for running script from command line
 import asyncio  # for running API calls concurrently
+import contextlib  # for reusing a caller-owned session
 import json  # for saving results to a jsonl file
 import logging  # for logging rate limit warnings and other messages
 import os  # for reading API key
 import re  # for matching endpoint from request URL
-import tiktoken  # for counting tokens
-import time  # for sleeping after rate limit is hit
+import time  # for refilling rate limit buckets
 from dataclasses import (
     dataclass,
     field,
 )  # for storing API inputs, outputs, and metadata
-from typing import List  # for type hints in functions
+from typing import Callable, Iterator, List, Optional  # for type hints in functions
 from pydantic import BaseModel, Field
+from market_agents.inference.utils import count_tokens  # for counting tokens with cached encoders
 
-class OAIApiFromFileConfig(BaseModel):
- requests_filepath: str
- save_filepath: str
+class OAIApiConfig(BaseModel):
  api_key: str
  request_url:str =  Field("https://api.openai.com/v1/embeddings",description="The url to use for generating embeddings")
  max_requests_per_minute: float = Field(100,description="The maximum number of requests per minute")
@@ -55,6 +54,41 @@ class OAIApiFromFileConfig(BaseModel):
  logging_level:int = Field(20,description="The logging level to use for the request")
  token_encoding_name: str = Field("cl100k_base",description="The token encoding scheme to use for calculating request sizes")
 
+class OAIApiFromFileConfig(OAIApiConfig):
+ requests_filepath: str
+ save_filepath: str
+
+async def process_api_requests(
+        requests: List[list],
+        api_cfg: OAIApiConfig,
+        rate_limiter: Optional["RateLimiter"] = None,
+        session: Optional[aiohttp.ClientSession] = None,
+) -> List[list]:
+    """
+    Asynchronously processes in-memory API requests, executing them in parallel
+    while adhering to specified rate limits for requests and tokens per minute.
+
+    Parameters:
+    - requests: A list of `[metadata, request_json]` pairs, the same shape as one line
+      of the JSONL requests file consumed by `process_api_requests_from_file`.
+    - api_cfg: The endpoint, credentials and rate limits to use.
+    - rate_limiter: Optional shared limiter for the endpoint. A fresh one is built from
+      `api_cfg` when omitted.
+    - session: Optional long-lived session to send the requests through. When omitted a
+      session is opened for this call and closed afterwards.
+
+    Returns:
+    - A list of `[metadata, request_json, response]` triples in the same order as `requests`.
+      Requests that fail after all attempts carry `{"error": ...}` as their response.
+    """
+    results: List[Optional[list]] = [None] * len(requests)
+
+    def store_result(task_id: int, data: list) -> None:
+        results[task_id] = data
+
+    await _process_api_requests(iter(requests), api_cfg, store_result, rate_limiter, session)
+    return [result for result in results if result is not None]
+
 async def process_api_requests_from_file(
         api_cfg: OAIApiFromFileConfig
 ):
@@ -81,21 +115,46 @@ async def process_api_requests_from_file(
     and manages request retries and rate limiting. It logs the progress and any issues encountered
     during the process to facilitate monitoring and debugging.
     """
-    #extract variables from config
-    requests_filepath = api_cfg.requests_filepath
     save_filepath = api_cfg.save_filepath
+
+    def save_result(task_id: int, data: list) -> None:
+        append_to_jsonl(data, save_filepath)
+
+    with open(api_cfg.requests_filepath) as file:
+        # `requests` will provide requests one at a time
+        requests = (json.loads(line) for line in file)
+        logging.debug(f"File opened. Entering main loop")
+        await _process_api_requests(requests, api_cfg, save_result)
+    logging.info(
+        f"""Parallel processing complete. Results saved to {save_filepath}"""
+    )
+
+async def _process_api_requests(
+        requests: Iterator[list],
+        api_cfg: OAIApiConfig,
+        on_result: Callable[[int, list], None],
+        rate_limiter: Optional["RateLimiter"] = None,
+        session: Optional[aiohttp.ClientSession] = None,
+):
+    """
+    Shared dispatch loop behind `process_api_requests` and `process_api_requests_from_file`.
+
+    Pulls `[metadata, request_json]` pairs from `requests` lazily, dispatches them within the
+    configured rate limits and hands each finished `[metadata, request_json, response]` triple
+    to `on_result` together with the task id (the position of the request in `requests`).
+
+    The loop never polls: it sleeps until `rate_limiter` has capacity for the next request, or,
+    when there is nothing left to dispatch, until an in-flight call finishes or is queued for retry.
+    Passing the same `rate_limiter` to several calls makes them share one set of buckets.
+    """
+    #extract variables from config
     request_url = api_cfg.request_url
     api_key = api_cfg.api_key
-    max_requests_per_minute = api_cfg.max_requests_per_minute
-    max_tokens_per_minute = api_cfg.max_tokens_per_minute
     token_encoding_name = api_cfg.token_encoding_name
     max_attempts = api_cfg.max_attempts
     logging_level = api_cfg.logging_level
-    # constants
-    seconds_to_pause_after_rate_limit_error = 15
-    seconds_to_sleep_each_loop = (
-        0.001  # 1 ms limits max throughput to 1,000 requests per second
-    )
+    if rate_limiter is None:
+        rate_limiter = RateLimiter.from_config(api_cfg)
 
     # initialize logging
     logging.basicConfig(level=logging_level)
@@ -125,131 +184,97 @@ async def process_api_requests_from_file(
         StatusTracker()
     )  # single instance to track a collection of variables
     next_request = None  # variable to hold the next request to call
-
-    # initialize available capacity counts
-    available_request_capacity = max_requests_per_minute
-    available_token_capacity = max_tokens_per_minute
-    last_update_time = time.time()
+    in_flight = set()  # API call tasks that have not finished yet
 
     # initialize flags
-    file_not_finished = True  # after file is empty, we'll skip reading it
+    requests_not_finished = True  # after requests are exhausted, we'll skip reading them
     logging.debug(f"Initialization complete.")
 
-    # initialize file reading
-    with open(requests_filepath) as file:
-        # `requests` will provide requests one at a time
-        requests = file.__iter__()
-        logging.debug(f"File opened. Entering main loop")
-        async with aiohttp.ClientSession() as session:  # Initialize ClientSession here
-            while True:
-                # get next request (if one is not already waiting for capacity)
-                if next_request is None:
-                    if not queue_of_requests_to_retry.empty():
-                        next_request = queue_of_requests_to_retry.get_nowait()
-                        logging.debug(
-                            f"Retrying request {next_request.task_id}: {next_request}"
-                        )
-                    elif file_not_finished:
-                        try:
-                            # get new request
-                            request_json = json.loads(next(requests))
-                            metadata, actual_request = request_json  # Unpack the list
-                            next_request = APIRequest(
-                                task_id=next(task_id_generator),
-                                request_json=actual_request,
-                                token_consumption=num_tokens_consumed_from_request(
-                                    actual_request, api_endpoint, token_encoding_name
-                                ),
-                                attempts_left=max_attempts,
-                                metadata=metadata,
-                            )
-                            status_tracker.num_tasks_started += 1
-                            status_tracker.num_tasks_in_progress += 1
-                            logging.debug(
-                                f"Reading request {next_request.task_id}: {next_request}"
-                            )
-                        except StopIteration:
-                            # if file runs out, set flag to stop reading it
-                            logging.debug("Read file exhausted")
-                            file_not_finished = False
-
-                # update available capacity
-                current_time = time.time()
-                seconds_since_update = current_time - last_update_time
-                available_request_capacity = min(
-                    available_request_capacity
-                    + max_requests_per_minute * seconds_since_update / 60.0,
-                    max_requests_per_minute,
-                )
-                available_token_capacity = min(
-                    available_token_capacity
-                    + max_tokens_per_minute * seconds_since_update / 60.0,
-                    max_tokens_per_minute,
-                )
-                last_update_time = current_time
-
-                # if enough capacity available, call API
-                if next_request:
-                    next_request_tokens = next_request.token_consumption
-                    if (
-                        available_request_capacity >= 1
-                        and available_token_capacity >= next_request_tokens
-                    ):
-                        # update counters
-                        available_request_capacity -= 1
-                        available_token_capacity -= next_request_tokens
-                        next_request.attempts_left -= 1
-
-                        # call API
-                        asyncio.create_task(
-                            next_request.call_api(
-                                session=session,
-                                request_url=request_url,
-                                request_header=request_header,
-                                retry_queue=queue_of_requests_to_retry,
-                                save_filepath=save_filepath,
-                                status_tracker=status_tracker,
+    # reuse the caller's pooled session if given, otherwise open one for this call
+    session_context = aiohttp.ClientSession() if session is None else contextlib.nullcontext(session)
+    async with session_context as session:
+        while True:
+            # get next request (if one is not already waiting for capacity)
+            if next_request is None:
+                if not queue_of_requests_to_retry.empty():
+                    next_request = queue_of_requests_to_retry.get_nowait()
+                    logging.debug(
+                        f"Retrying request {next_request.task_id}: {next_request}"
+                    )
+                elif requests_not_finished:
+                    try:
+                        # get new request
+                        metadata, actual_request = next(requests)  # Unpack the list
+                        # callers that track token counts incrementally pass them in the metadata
+                        token_consumption = metadata.get("token_consumption")
+                        if token_consumption is None:
+                            token_consumption = num_tokens_consumed_from_request(
+                                actual_request, api_endpoint, token_encoding_name
                             )
+                        next_request = APIRequest(
+                            task_id=next(task_id_generator),
+                            request_json=actual_request,
+                            token_consumption=token_consumption,
+                            attempts_left=max_attempts,
+                            metadata=metadata,
+                        )
+                        status_tracker.num_tasks_started += 1
+                        status_tracker.num_tasks_in_progress += 1
+                        logging.debug(
+                            f"Reading request {next_request.task_id}: {next_request}"
                         )
-                        next_request = None  # reset next_request to empty
+                    except StopIteration:
+                        # if requests run out, set flag to stop reading them
+                        logging.debug("Requests exhausted")
+                        requests_not_finished = False
 
+            if next_request is None:
                 # if all tasks are finished, break
-                if status_tracker.num_tasks_in_progress == 0:
+                if not in_flight:
                     break
-
-                # main loop sleeps briefly so concurrent tasks can run
-                await asyncio.sleep(seconds_to_sleep_each_loop)
-
-                # if a rate limit error was hit recently, pause to cool down
-                seconds_since_rate_limit_error = (
-                    time.time() - status_tracker.time_of_last_rate_limit_error
+                # otherwise sleep until a call finishes or a request is queued for retry
+                retry_getter = asyncio.ensure_future(queue_of_requests_to_retry.get())
+                done, _ = await asyncio.wait(
+                    in_flight | {retry_getter}, return_when=asyncio.FIRST_COMPLETED
                 )
-                if (
-                    seconds_since_rate_limit_error
-                    < seconds_to_pause_after_rate_limit_error
-                ):
-                    remaining_seconds_to_pause = (
-                        seconds_to_pause_after_rate_limit_error
-                        - seconds_since_rate_limit_error
+                if retry_getter in done:
+                    next_request = retry_getter.result()
+                    logging.debug(
+                        f"Retrying request {next_request.task_id}: {next_request}"
                     )
-                    await asyncio.sleep(remaining_seconds_to_pause)
-                    # ^e.g., if pause is 15 seconds and final limit was hit 5 seconds ago
-                    logging.warn(
-                        f"Pausing to cool down until {time.ctime(status_tracker.time_of_last_rate_limit_error + seconds_to_pause_after_rate_limit_error)}"
-                    )
-
-        # after finishing, log final status
-        logging.info(
-            f"""Parallel processing complete. Results saved to {save_filepath}"""
-        )
-        if status_tracker.num_tasks_failed > 0:
-            logging.warning(
-                f"{status_tracker.num_tasks_failed} / {status_tracker.num_tasks_started} requests failed. Errors logged to {save_filepath}."
-            )
-        if status_tracker.num_rate_limit_errors > 0:
-            logging.warning(
-                f"{status_tracker.num_rate_limit_errors} rate limit errors received. Consider running at a lower rate."
+                else:
+                    retry_getter.cancel()
+                continue
+
+            # sleep exactly until the endpoint has capacity for this request
+            await rate_limiter.acquire(next_request.token_consumption)
+            next_request.attempts_left -= 1
+
+            # call API
+            task = asyncio.create_task(
+                next_request.call_api(
+                    session=session,
+                    request_url=request_url,
+                    request_header=request_header,
+                    retry_queue=queue_of_requests_to_retry,
+                    on_result=on_result,
+                    status_tracker=status_tracker,
+                    rate_limiter=rate_limiter,
+                )
             )
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+            next_request = None  # reset next_request to empty
+
+    # after finishing, log final status
+    if status_tracker.num_tasks_failed > 0:
+        logging.warning(
+            f"{status_tracker.num_tasks_failed} / {status_tracker.num_tasks_started} requests failed."
+        )
+    if status_tracker.num_rate_limit_errors > 0:
+        logging.warning(
+            f"{status_tracker.num_rate_limit_errors} rate limit errors received. Consider running at a lower rate."
+        )
 
 
 # dataclasses
@@ -273,8 +298,8 @@ class StatusTracker:
     - num_rate_limit_errors: The count of errors received due to hitting the API's rate limits.
     - num_api_errors: The count of API-related errors excluding rate limit errors.
     - num_other_errors: The count of errors that are neither API errors nor rate limit errors.
-    - time_of_last_rate_limit_error: A timestamp (as an integer) of the last time a rate limit error was encountered,
-      used to implement a cooling-off period before making subsequent requests.
+    - time_of_last_rate_limit_error: A timestamp (as an integer) of the last time a rate limit error was encountered.
+      The cooling-off period itself is handled per endpoint by `RateLimiter`.
     
     The class is initialized with all counters set to 0, and the `time_of_last_rate_limit_error`
     set to 0 indicating no rate limit errors have occurred yet.
@@ -290,6 +315,103 @@ class StatusTracker:
     time_of_last_rate_limit_error: float = 0  # used to cool off after hitting rate limits
 
 
+@dataclass
+class TokenBucket:
+    """
+    A continuously refilling capacity counter.
+
+    Attributes:
+    - capacity (float): The most units the bucket can hold, i.e. the per-minute limit.
+    - available (float): The units currently available.
+    - last_update_time (float): The monotonic time `available` was last refilled.
+
+    Capacity refills linearly at `capacity` units per minute, so instead of polling the
+    bucket a caller can ask how long it has to sleep before a given amount becomes available.
+    """
+
+    capacity: float
+    available: Optional[float] = None
+    last_update_time: float = field(default_factory=time.monotonic)
+
+    def __post_init__(self):
+        if self.available is None:
+            self.available = self.capacity
+
+    def refill(self, now: float) -> None:
+        elapsed = now - self.last_update_time
+        self.available = min(self.available + self.capacity * elapsed / 60.0, self.capacity)
+        self.last_update_time = now
+
+    def seconds_until_available(self, amount: float) -> float:
+        # requests larger than the bucket could never be served, so they only wait for a full bucket
+        missing = min(amount, self.capacity) - self.available
+        return max(missing, 0.0) * 60.0 / self.capacity
+
+    def consume(self, amount: float) -> None:
+        self.available -= min(amount, self.capacity)
+
+
+@dataclass
+class RateLimiter:
+    """
+    Per-endpoint request and token buckets with rate-limit backoff.
+
+    Attributes:
+    - request_bucket (TokenBucket): Limits requests per minute.
+    - token_bucket (TokenBucket): Limits tokens per minute.
+    - base_backoff_seconds (float): The pause after the first rate limit error.
+    - max_backoff_seconds (float): The longest pause consecutive rate limit errors can grow to.
+
+    `acquire` sleeps exactly until both buckets can cover the next request, and waiters are
+    served in FIFO order. A rate limit error only pauses the endpoint that returned it; the
+    pause doubles on consecutive errors and resets after the next successful call.
+    """
+
+    request_bucket: TokenBucket
+    token_bucket: TokenBucket
+    base_backoff_seconds: float = 1.0
+    max_backoff_seconds: float = 60.0
+    backoff_until: float = 0.0
+    consecutive_rate_limit_errors: int = 0
+    _lock: asyncio.Lock = field(default_factory=asyncio.Lock, repr=False)
+
+    @classmethod
+    def from_config(cls, api_cfg: OAIApiConfig) -> "RateLimiter":
+        return cls(
+            request_bucket=TokenBucket(capacity=api_cfg.max_requests_per_minute),
+            token_bucket=TokenBucket(capacity=api_cfg.max_tokens_per_minute),
+        )
+
+    async def acquire(self, tokens: float) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.request_bucket.refill(now)
+                self.token_bucket.refill(now)
+                wait = max(
+                    self.backoff_until - now,
+                    self.request_bucket.seconds_until_available(1),
+                    self.token_bucket.seconds_until_available(tokens),
+                )
+                if wait <= 0:
+                    self.request_bucket.consume(1)
+                    self.token_bucket.consume(tokens)
+                    return
+                await asyncio.sleep(wait)
+
+    def record_rate_limit_error(self) -> None:
+        backoff = min(
+            self.base_backoff_seconds * 2 ** self.consecutive_rate_limit_errors,
+            self.max_backoff_seconds,
+        )
+        self.consecutive_rate_limit_errors += 1
+        self.backoff_until = max(self.backoff_until, time.monotonic() + backoff)
+        logging.warning(f"Rate limit hit, pausing endpoint for {backoff:.1f} seconds")
+
+    def record_success(self) -> None:
+        self.consecutive_rate_limit_errors = 0
+
+
 @dataclass
 class APIRequest:
     """
@@ -320,8 +442,9 @@ class APIRequest:
         request_url: str,
         request_header: dict,
         retry_queue: asyncio.Queue,
-        save_filepath: str,
+        on_result: Callable[[int, list], None],
         status_tracker: StatusTracker,
+        rate_limiter: RateLimiter,
     ):
         """
         Asynchronously sends the API request using aiohttp, handles errors, and manages retries.
@@ -331,12 +454,14 @@ class APIRequest:
         - request_url (str): The URL to which the request is sent.
         - request_header (dict): Headers for the request, including authorization.
         - retry_queue (asyncio.Queue): A queue for requests that need to be retried.
-        - save_filepath (str): The file path where results or errors should be logged.
+        - on_result (Callable[[int, list], None]): Receives the task id and the final
+          `[metadata, request_json, response]` triple once the request succeeds or runs out of attempts.
         - status_tracker (StatusTracker): A shared object for tracking the status of all API requests.
+        - rate_limiter (RateLimiter): The endpoint's limiter, told about rate limit errors so it can back off.
         
         This method attempts to post the request to the given URL. If the request encounters an error,
         it determines whether to retry based on the remaining attempts and updates the status tracker
-        accordingly. Successful requests or final failures are logged to the specified file.
+        accordingly. Successful requests or final failures are handed to `on_result`.
         """
         logging.info(f"Starting request #{self.task_id}")
         error = None
@@ -351,8 +476,9 @@ class APIRequest:
                 )
                 status_tracker.num_api_errors += 1
                 error = response
-                if "Rate limit" in response["error"].get("message", ""):
+                if is_rate_limit_error(response["error"]):
                     status_tracker.time_of_last_rate_limit_error = time.time()
+                    rate_limiter.record_rate_limit_error()
                     status_tracker.num_rate_limit_errors += 1
                     status_tracker.num_api_errors -= (
                         1  # rate limit errors are counted separately
@@ -376,17 +502,18 @@ class APIRequest:
                 self.metadata["end_time"] = time.time()
                 self.metadata["total_time"] = self.metadata["end_time"] - self.metadata["start_time"]
                 data = [self.metadata, self.request_json, {"error": str(error)}]
-                append_to_jsonl(data, save_filepath)
+                on_result(self.task_id, data)
                 status_tracker.num_tasks_in_progress -= 1
                 status_tracker.num_tasks_failed += 1
         else:
+            rate_limiter.record_success()
             self.metadata["end_time"] = time.time()
             self.metadata["total_time"] = self.metadata["end_time"] - self.metadata["start_time"]
             data = [self.metadata, self.request_json, response]
-            append_to_jsonl(data, save_filepath)
+            on_result(self.task_id, data)
             status_tracker.num_tasks_in_progress -= 1
             status_tracker.num_tasks_succeeded += 1
-            logging.debug(f"Request {self.task_id} saved to {save_filepath}")
+            logging.debug(f"Request {self.task_id} completed")
 
 
 # functions
@@ -438,6 +565,13 @@ def api_endpoint_from_url(request_url: str) -> str:
     return match[1]
 
 
+def is_rate_limit_error(error) -> bool:
+    """Whether an API error payload (OpenAI or Anthropic style) reports a rate limit."""
+    if isinstance(error, dict):
+        return error.get("type") == "rate_limit_error" or "Rate limit" in str(error.get("message", ""))
+    return "Rate limit" in str(error)
+
+
 def append_to_jsonl(data, filename: str) -> None:
     """
     Appends a given JSON payload to the end of a JSON Lines (.jsonl) file.
@@ -464,8 +598,9 @@ def num_tokens_consumed_from_request(
     token_encoding_name: str,
 ):
     """Count the number of tokens in the request. Supports completion, embedding, and Anthropic message requests."""
-    encoding = tiktoken.get_encoding(token_encoding_name)
-    
+    def encoded_len(text) -> int:
+        return count_tokens(text if isinstance(text, str) else json.dumps(text), token_encoding_name)
+
     if api_endpoint.endswith("completions"):
         max_tokens = request_json.get("max_tokens", 15)
         n = request_json.get("n", 1)
@@ -477,7 +612,7 @@ def num_tokens_consumed_from_request(
             for message in request_json["messages"]:
                 num_tokens += 4  # every message follows <im_start>{role/name}\n{content}<im_end>\n
                 for key, value in message.items():
-                    num_tokens += len(encoding.encode(value))
+                    num_tokens += encoded_len(value)
                     if key == "name":  # if there's a name, the role is omitted
                         num_tokens -= 1  # role is always required and always 1 token
             num_tokens += 2  # every reply is primed with <im_start>assistant
@@ -486,11 +621,11 @@ def num_tokens_consumed_from_request(
         else:
             prompt = request_json["prompt"]
             if isinstance(prompt, str):  # single prompt
-                prompt_tokens = len(encoding.encode(prompt))
+                prompt_tokens = encoded_len(prompt)
                 num_tokens = prompt_tokens + completion_tokens
                 return num_tokens
             elif isinstance(prompt, list):  # multiple prompts
-                prompt_tokens = sum([len(encoding.encode(p)) for p in prompt])
+                prompt_tokens = sum([encoded_len(p) for p in prompt])
                 num_tokens = prompt_tokens + completion_tokens * len(prompt)
                 return num_tokens
             else:
@@ -500,10 +635,10 @@ def num_tokens_consumed_from_request(
     elif api_endpoint == "embeddings":
         input = request_json["input"]
         if isinstance(input, str):  # single input
-            num_tokens = len(encoding.encode(input))
+            num_tokens = encoded_len(input)
             return num_tokens
         elif isinstance(input, list):  # multiple inputs
-            num_tokens = sum([len(encoding.encode(i)) for i in input])
+            num_tokens = sum([encoded_len(i) for i in input])
             return num_tokens
         else:
             raise TypeError(
@@ -515,11 +650,11 @@ def num_tokens_consumed_from_request(
         for message in messages:
             content = message.get("content", "")
             if isinstance(content, str):
-                num_tokens += len(encoding.encode(content))
+                num_tokens += encoded_len(content)
             elif isinstance(content, list):
                 for item in content:
                     if isinstance(item, dict) and "text" in item:
-                        num_tokens += len(encoding.encode(item["text"]))
+                        num_tokens += encoded_len(item["text"])
         
         max_tokens = request_json.get("max_tokens", 0)
         num_tokens += max_tokens  # Add the max_tokens to account for the response
@@ -1,13 +1,17 @@
 import asyncio
 import json
-from typing import List, Dict, Any, Optional, Literal
+import logging
+from typing import List, Dict, Any, Optional, Literal, Tuple
 from pydantic import BaseModel, Field, ValidationError
-from .message_models import LLMPromptContext, LLMOutput
+from .message_models import LLMConfig, LLMPromptContext, LLMOutput
 from .clients_models import AnthropicRequest, OpenAIRequest, VLLMRequest
-from .oai_parallel import process_api_requests_from_file, OAIApiFromFileConfig
+from .oai_parallel import process_api_requests, OAIApiConfig, RateLimiter
+from .http_client import PooledHTTPClient
+from .response_cache import ResponseCache
 import os
 from dotenv import load_dotenv
 import time
+import uuid
 from openai.types.chat import ChatCompletionToolParam
 from anthropic.types.beta.prompt_caching import PromptCachingBetaToolParam
 from anthropic.types.message_create_params import ToolChoiceToolChoiceTool
@@ -15,6 +19,7 @@ from anthropic.types.message_create_params import ToolChoiceToolChoiceTool
 import openai
 import anthropic
 
+logger = logging.getLogger(__name__)
 
 class RequestLimits(BaseModel):
     max_requests_per_minute: int = Field(default=50,description="The maximum number of requests per minute for the API")
@@ -27,7 +32,9 @@ class ParallelAIUtilities:
                  vllm_request_limits: Optional[RequestLimits] = None,
                  litellm_request_limits: Optional[RequestLimits] = None,
                  local_cache: bool = True,
-                 cache_folder: Optional[str] = None):
+                 cache_folder: Optional[str] = None,
+                 http_client: Optional[PooledHTTPClient] = None,
+                 response_cache: Optional[ResponseCache] = None):
         load_dotenv()
         self.openai_key = os.getenv("OPENAI_KEY")
         self.anthropic_key = os.getenv("ANTHROPIC_API_KEY")
@@ -42,6 +49,10 @@ class ParallelAIUtilities:
         self.local_cache = local_cache
         self.cache_folder = self._setup_cache_folder(cache_folder)
         self.all_requests = []
+        self._audit_tasks = set()
+        self.rate_limiters: Dict[str, RateLimiter] = {}
+        self.http_client = http_client if http_client else PooledHTTPClient()
+        self.response_cache = response_cache
 
     def _setup_cache_folder(self, cache_folder: Optional[str]) -> str:
         if cache_folder:
@@ -63,7 +74,49 @@ class ParallelAIUtilities:
             prompt_hashmap[output.source_id].add_chat_turn_history(output)
         return list(prompt_hashmap.values())
 
-    async def run_parallel_ai_completion(self, prompts: List[LLMPromptContext], update_history:bool=True) -> List[LLMOutput]:
+    async def update_prompt_history(self, prompts: List[LLMPromptContext], llm_outputs: List[LLMOutput]) -> List[LLMPromptContext]:
+        """ append the new chat turns, then apply each prompt's history policy """
+        prompts = self._update_prompt_history(prompts, llm_outputs)
+        to_summarize = []
+        for prompt in prompts:
+            evicted = prompt.trim_history()
+            if evicted and prompt.llm_config.history_policy == "summary":
+                to_summarize.append((prompt, evicted))
+        if to_summarize:
+            await self._summarize_evicted_history(to_summarize)
+        return prompts
+
+    async def _summarize_evicted_history(self, to_summarize: List[Tuple[LLMPromptContext, List[Dict[str, Any]]]]):
+        """ fold evicted turns into each prompt's rolling summary with one batched call to the summary model """
+        summary_prompts = []
+        # summary calls get their own id so they are not recorded as the agent's turns
+        prompts_by_summary_id = {}
+        for prompt, evicted in to_summarize:
+            config = prompt.llm_config
+            transcript = "\n".join(f"{message['role']}: {message['content']}" for message in evicted)
+            summary_id = str(uuid.uuid4())
+            prompts_by_summary_id[summary_id] = prompt
+            summary_prompts.append(LLMPromptContext(
+                id=summary_id,
+                system_string="You maintain a concise running summary of a conversation. Keep facts, decisions, commitments and open questions; drop pleasantries and repetition.",
+                new_message=f"Current summary:\n{prompt.history_summary or 'None'}\n\nNew conversation turns:\n{transcript}\n\nWrite the updated summary.",
+                llm_config=LLMConfig(
+                    client=config.client,
+                    model=config.summary_model or config.model,
+                    max_tokens=config.summary_max_tokens,
+                    temperature=0,
+                    response_format="text",
+                    use_cache=config.use_cache
+                ),
+                use_history=False
+            ))
+        summaries = await self.run_parallel_ai_completion(summary_prompts, update_history=False)
+        for summary in summaries:
+            prompt = prompts_by_summary_id.get(summary.source_id)
+            if prompt is not None and summary.str_content:
+                prompt.history_summary = summary.str_content.strip()
+
+    async def run_parallel_ai_completion(self, prompts: List[LLMPromptContext], update_history:bool=True, record_requests:bool=True) -> List[LLMOutput]:
         openai_prompts = [p for p in prompts if p.llm_config.client == "openai"]
         anthropic_prompts = [p for p in prompts if p.llm_config.client == "anthropic"]
         vllm_prompts = [p for p in prompts if p.llm_config.client == "vllm"] 
@@ -81,11 +134,12 @@ class ParallelAIUtilities:
         results = await asyncio.gather(*tasks)
         flattened_results = [item for sublist in results for item in sublist]
         
-        # Track  requests
-        self.all_requests.extend(flattened_results)
+        # Track  requests, unless the caller attributes them itself
+        if record_requests:
+            self.all_requests.extend(flattened_results)
         
         if update_history:
-            prompts = self._update_prompt_history(prompts, flattened_results)
+            prompts = await self.update_prompt_history(prompts, flattened_results)
         
         return flattened_results
     
@@ -94,85 +148,118 @@ class ParallelAIUtilities:
         self.all_requests = []  
         return requests
 
+    async def close(self):
+        """Flush pending audit writes and close the pooled HTTP connections."""
+        await self.flush_audit_log()
+        await self.http_client.close()
+        if self.response_cache:
+            self.response_cache.close()
+
+    async def flush_audit_log(self):
+        """Wait for any pending JSONL audit writes to land on disk."""
+        if self._audit_tasks:
+            await asyncio.gather(*self._audit_tasks)
+
     async def _run_openai_completion(self, prompts: List[LLMPromptContext]) -> List[LLMOutput]:
-        timestamp = time.strftime("%Y-%m-%d_%H-%M-%S")
-        requests_file = os.path.join(self.cache_folder, f'openai_requests_{timestamp}.jsonl')
-        results_file = os.path.join(self.cache_folder, f'openai_results_{timestamp}.jsonl')
-        self._prepare_requests_file(prompts, "openai", requests_file)
-        config = self._create_oai_completion_config(prompts[0], requests_file, results_file)
-        if config:
-            try:
-                await process_api_requests_from_file(config)
-                return self._parse_results_file(results_file,client="openai")
-            finally:
-                if not self.local_cache:
-                    self._delete_files(requests_file, results_file)
-        return []
+        config = self._create_oai_completion_config(prompts[0])
+        return await self._run_completion(prompts, "openai", config)
 
     async def _run_anthropic_completion(self, prompts: List[LLMPromptContext]) -> List[LLMOutput]:
-        timestamp = time.strftime("%Y-%m-%d_%H-%M-%S")
-        requests_file = os.path.join(self.cache_folder, f'anthropic_requests_{timestamp}.jsonl')
-        results_file = os.path.join(self.cache_folder, f'anthropic_results_{timestamp}.jsonl')
-        self._prepare_requests_file(prompts, "anthropic", requests_file)
-        config = self._create_anthropic_completion_config(prompts[0], requests_file, results_file)
-        if config:
-            try:
-                await process_api_requests_from_file(config)
-                return self._parse_results_file(results_file,client="anthropic")
-            finally:
-                if not self.local_cache:
-                    self._delete_files(requests_file, results_file)
-        return []
+        config = self._create_anthropic_completion_config(prompts[0])
+        return await self._run_completion(prompts, "anthropic", config)
     
     async def _run_vllm_completion(self, prompts: List[LLMPromptContext]) -> List[LLMOutput]:
-        timestamp = time.strftime("%Y-%m-%d_%H-%M-%S")
-        requests_file = os.path.join(self.cache_folder, f'vllm_requests_{timestamp}.jsonl')
-        results_file = os.path.join(self.cache_folder, f'vllm_results_{timestamp}.jsonl')
-        self._prepare_requests_file(prompts, "vllm", requests_file)
-        config = self._create_vllm_completion_config(prompts[0], requests_file, results_file)
-        if config:
-            try:
-                await process_api_requests_from_file(config)
-                return self._parse_results_file(results_file,client="vllm")
-            finally:
-                if not self.local_cache:
-                    self._delete_files(requests_file, results_file)
-        return []
+        config = self._create_vllm_completion_config(prompts[0])
+        return await self._run_completion(prompts, "vllm", config)
     
     async def _run_litellm_completion(self, prompts: List[LLMPromptContext]) -> List[LLMOutput]:
-        timestamp = time.strftime("%Y-%m-%d_%H-%M-%S")
-        requests_file = os.path.join(self.cache_folder, f'litellm_requests_{timestamp}.jsonl')
-        results_file = os.path.join(self.cache_folder, f'litellm_results_{timestamp}.jsonl')
-        self._prepare_requests_file(prompts, "litellm", requests_file)
-        config = self._create_litellm_completion_config(prompts[0], requests_file, results_file)
-        if config:
-            try:
-                await process_api_requests_from_file(config)
-                return self._parse_results_file(results_file,client="litellm")
-            finally:
-                if not self.local_cache:
-                    self._delete_files(requests_file, results_file)
-        return []
+        config = self._create_litellm_completion_config(prompts[0])
+        return await self._run_completion(prompts, "litellm", config)
 
-    
+    async def _run_completion(self, prompts: List[LLMPromptContext], client: Literal["openai", "anthropic", "vllm", "litellm"], config: Optional[OAIApiConfig]) -> List[LLMOutput]:
+        if not config:
+            return []
+        requests = self._prepare_requests(prompts, client)
+        results = await self._read_cached_results(client, requests)
+        misses = [i for i, result in enumerate(results) if result is None]
+        if misses:
+            session = await self.http_client.get_session()
+            dispatched = await process_api_requests([requests[i] for i in misses], config, self._get_rate_limiter(client, config), session)
+            for i, result in zip(misses, dispatched):
+                results[i] = result
+            await self._write_cached_results(client, dispatched)
+        if self.local_cache:
+            self._schedule_audit_log(client, requests, results)
+        return self._parse_results(results, client=client)
+
+    async def _read_cached_results(self, client: str, requests: List[list]) -> List[Optional[list]]:
+        """ read-through lookup, returns a result triple for every cache hit and None for misses """
+        if not self.response_cache:
+            return [None] * len(requests)
+        keys = [
+            self.response_cache.make_key(client, request) if self.response_cache.is_cacheable(request) else None
+            for _, request in requests
+        ]
+        # one sqlite transaction per batch, off the event loop
+        cached = await asyncio.to_thread(self.response_cache.get_many, [key for key in keys if key is not None])
+        results = []
+        for (metadata, request), key in zip(requests, keys):
+            response = cached.get(key) if key is not None else None
+            if response is not None:
+                metadata["end_time"] = time.time()
+                metadata["total_time"] = metadata["end_time"] - metadata["start_time"]
+                metadata["cache_hit"] = True
+            results.append([metadata, request, response] if response is not None else None)
+        return results
 
-    def _prepare_requests_file(self, prompts: List[LLMPromptContext], client: str, filename: str):
+    async def _write_cached_results(self, client: str, results: List[list]):
+        if not self.response_cache:
+            return
+        responses = {
+            self.response_cache.make_key(client, request): response
+            for _, request, response in results
+            if isinstance(response, dict) and "error" not in response and self.response_cache.is_cacheable(request)
+        }
+        if responses:
+            await asyncio.to_thread(self.response_cache.put_many, responses)
+
+    def _get_rate_limiter(self, client: str, config: OAIApiConfig) -> RateLimiter:
+        """ one limiter per provider, shared by every batch so concurrent batches respect the same budget """
+        if client not in self.rate_limiters:
+            self.rate_limiters[client] = RateLimiter.from_config(config)
+        return self.rate_limiters[client]
+
+    def _prepare_requests(self, prompts: List[LLMPromptContext], client: str) -> List[List[Dict[str, Any]]]:
         requests = []
         for prompt in prompts:
             request = self._convert_prompt_to_request(prompt, client)
             if request:
                 metadata = {
                     "prompt_context_id": prompt.id,
+                    "token_consumption": prompt.prompt_token_estimate + prompt.llm_config.max_tokens,
                     "start_time": time.time(),
                     "end_time": None,
                     "total_time": None
                 }
                 requests.append([metadata, request])
-        
-        with open(filename, 'w') as f:
-            for request in requests:
-                json.dump(request, f)
-                f.write('\n')
+        return requests
+
+    def _schedule_audit_log(self, client: str, requests: List[list], results: List[list]):
+        """ write the batch to the cache folder in a worker thread without blocking the caller """
+        batch_id = f"{time.strftime('%Y-%m-%d_%H-%M-%S')}_{uuid.uuid4().hex[:8]}"
+        requests_file = os.path.join(self.cache_folder, f'{client}_requests_{batch_id}.jsonl')
+        results_file = os.path.join(self.cache_folder, f'{client}_results_{batch_id}.jsonl')
+        task = asyncio.create_task(asyncio.to_thread(self._write_audit_log, requests_file, requests, results_file, results))
+        self._audit_tasks.add(task)
+        task.add_done_callback(self._audit_tasks.discard)
+
+    def _write_audit_log(self, requests_file: str, requests: List[list], results_file: str, results: List[list]):
+        try:
+            for filename, rows in ((requests_file, requests), (results_file, results)):
+                with open(filename, 'w') as f:
+                    f.writelines(json.dumps(row) + '\n' for row in rows)
+        except (OSError, TypeError, ValueError) as e:
+            logger.error(f"Error writing audit log {filename}: {e}")
 
     def _validate_anthropic_request(self, request: Dict[str, Any]) -> bool:
         try:
@@ -290,11 +377,9 @@ class ParallelAIUtilities:
             raise ValueError(f"Invalid client: {client}")
 
 
-    def _create_oai_completion_config(self, prompt: LLMPromptContext, requests_file: str, results_file: str) -> Optional[OAIApiFromFileConfig]:
+    def _create_oai_completion_config(self, prompt: LLMPromptContext) -> Optional[OAIApiConfig]:
         if prompt.llm_config.client == "openai" and self.openai_key:
-            return OAIApiFromFileConfig(
-                requests_filepath=requests_file,
-                save_filepath=results_file,
+            return OAIApiConfig(
                 request_url="https://api.openai.com/v1/chat/completions",
                 api_key=self.openai_key,
                 max_requests_per_minute=self.oai_request_limits.max_requests_per_minute,
@@ -305,11 +390,9 @@ class ParallelAIUtilities:
             )
         return None
 
-    def _create_anthropic_completion_config(self, prompt: LLMPromptContext, requests_file: str, results_file: str) -> Optional[OAIApiFromFileConfig]:
+    def _create_anthropic_completion_config(self, prompt: LLMPromptContext) -> Optional[OAIApiConfig]:
         if prompt.llm_config.client == "anthropic" and self.anthropic_key:
-            return OAIApiFromFileConfig(
-                requests_filepath=requests_file,
-                save_filepath=results_file,
+            return OAIApiConfig(
                 request_url="https://api.anthropic.com/v1/messages",
                 api_key=self.anthropic_key,
                 max_requests_per_minute=self.anthropic_request_limits.max_requests_per_minute,
@@ -320,11 +403,9 @@ class ParallelAIUtilities:
             )
         return None
     
-    def _create_vllm_completion_config(self, prompt: LLMPromptContext, requests_file: str, results_file: str) -> Optional[OAIApiFromFileConfig]:
+    def _create_vllm_completion_config(self, prompt: LLMPromptContext) -> Optional[OAIApiConfig]:
         if prompt.llm_config.client == "vllm":
-            return OAIApiFromFileConfig(
-                requests_filepath=requests_file,
-                save_filepath=results_file,
+            return OAIApiConfig(
                 request_url=self.vllm_endpoint,
                 api_key=self.vllm_key if self.vllm_key else "",
                 max_requests_per_minute=self.vllm_request_limits.max_requests_per_minute,
@@ -335,11 +416,9 @@ class ParallelAIUtilities:
             )
         return None
     
-    def _create_litellm_completion_config(self, prompt: LLMPromptContext, requests_file: str, results_file: str) -> Optional[OAIApiFromFileConfig]:
+    def _create_litellm_completion_config(self, prompt: LLMPromptContext) -> Optional[OAIApiConfig]:
         if prompt.llm_config.client == "litellm":
-            return OAIApiFromFileConfig(
-                requests_filepath=requests_file,
-                save_filepath=results_file,
+            return OAIApiConfig(
                 request_url=self.litellm_endpoint,
                 api_key=self.litellm_key if self.litellm_key else "",
                 max_requests_per_minute=self.litellm_request_limits.max_requests_per_minute,
@@ -351,21 +430,15 @@ class ParallelAIUtilities:
         return None
     
 
-    def _parse_results_file(self, filepath: str,client: Literal["openai", "anthropic", "vllm", "litellm"]) -> List[LLMOutput]:
-        results = []
-        with open(filepath, 'r') as f:
-            for line in f:
-                try:
-                    result = json.loads(line)
-                    llm_output = self._convert_result_to_llm_output(result,client)
-                    results.append(llm_output)
-                except json.JSONDecodeError:
-                    print(f"Error decoding JSON: {line}")
-                    results.append(LLMOutput(raw_result={"error": "JSON decode error"}, completion_kwargs={}, start_time=time.time(), end_time=time.time(), source_id="error"))
-                except Exception as e:
-                    print(f"Error processing result: {e}")
-                    results.append(LLMOutput(raw_result={"error": str(e)}, completion_kwargs={}, start_time=time.time(), end_time=time.time(), source_id="error"))
-        return results
+    def _parse_results(self, results: List[List[Dict[str, Any]]], client: Literal["openai", "anthropic", "vllm", "litellm"]) -> List[LLMOutput]:
+        llm_outputs = []
+        for result in results:
+            try:
+                llm_outputs.append(self._convert_result_to_llm_output(result, client))
+            except Exception as e:
+                logger.error(f"Error processing result: {e}")
+                llm_outputs.append(LLMOutput(raw_result={"error": str(e)}, completion_kwargs={}, start_time=time.time(), end_time=time.time(), source_id="error"))
+        return llm_outputs
 
     def _convert_result_to_llm_output(self, result: List[Dict[str, Any]],client: Literal["openai", "anthropic", "vllm", "litellm"]) -> LLMOutput:
         metadata, request_data, response_data = result
@@ -378,10 +451,3 @@ class ParallelAIUtilities:
             source_id=metadata["prompt_context_id"],
             client=client
         )
-
-    def _delete_files(self, *files):
-        for file in files:
-            try:
-                os.remove(file)
-            except OSError as e:
-                print(f"Error deleting file {file}: {e}")
\ No newline at end of file
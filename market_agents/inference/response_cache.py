@@ -0,0 +1,169 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel, Field
+
+
+class ResponseCacheConfig(BaseModel):
+    cache_path: Optional[str] = Field(default=None, description="Path of the SQLite file, defaults to outputs/inference_cache/responses.sqlite")
+    max_entries: Optional[int] = Field(default=100_000, description="Least recently used entries beyond this count are evicted")
+    max_size_bytes: Optional[int] = Field(default=1_000_000_000, description="Least recently used entries beyond this total response size are evicted")
+    max_age_seconds: Optional[float] = Field(default=30 * 24 * 3600, description="Entries older than this are evicted")
+    deterministic_only: bool = Field(default=True, description="Only cache requests sent with temperature 0")
+    evict_every: int = Field(default=1000, description="Run eviction after this many inserts")
+
+
+class ResponseCache:
+    """
+    Content-addressed on-disk cache of LLM completions.
+
+    Entries are keyed by a hash of the parts of a request that determine the completion:
+    client, model, system prompt, messages, tools, tool choice, response format, temperature
+    and max tokens. Only successful responses are stored. Eviction is age based and then
+    least-recently-used by entry count and total response size.
+    """
+
+    KEY_FIELDS = ("model", "system", "messages", "tools", "tool_choice", "response_format", "temperature", "max_tokens")
+
+    def __init__(self, config: Optional[ResponseCacheConfig] = None):
+        self.config = config or ResponseCacheConfig()
+        self.cache_path = self._setup_cache_path(self.config.cache_path)
+        self.hits = 0
+        self.misses = 0
+        self._inserts_since_eviction = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.cache_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_accessed REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_last_accessed_idx ON responses (last_accessed)")
+        self._conn.commit()
+        self.evict()
+
+    def _setup_cache_path(self, cache_path: Optional[str]) -> str:
+        if cache_path:
+            full_path = os.path.abspath(cache_path)
+        else:
+            repo_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+            full_path = os.path.join(repo_root, 'outputs', 'inference_cache', 'responses.sqlite')
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        return full_path
+
+    def is_cacheable(self, request: Dict[str, Any]) -> bool:
+        return not self.config.deterministic_only or request.get("temperature") == 0
+
+    def make_key(self, client: str, request: Dict[str, Any]) -> str:
+        normalized = {field: request.get(field) for field in self.KEY_FIELDS}
+        normalized["client"] = client
+        payload = json.dumps(normalized, sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT response, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or self._is_expired(row[1]):
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET last_accessed = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def get_many(self, keys: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Look up a batch of keys in one transaction, returning the responses of the hits."""
+        if not keys:
+            return {}
+        unique = list(dict.fromkeys(keys))
+        found = {}
+        with self._lock:
+            # chunked to stay under SQLite's bound parameter limit
+            for start in range(0, len(unique), 500):
+                chunk = unique[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, response, created_at FROM responses WHERE key IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                found.update({key: response for key, response, created_at in rows if not self._is_expired(created_at)})
+            if found:
+                now = time.time()
+                self._conn.executemany("UPDATE responses SET last_accessed = ? WHERE key = ?", [(now, key) for key in found])
+                self._conn.commit()
+            hits = sum(1 for key in keys if key in found)
+            self.hits += hits
+            self.misses += len(keys) - hits
+        return {key: json.loads(response) for key, response in found.items()}
+
+    def put(self, key: str, response: Dict[str, Any]) -> None:
+        self.put_many({key: response})
+
+    def put_many(self, responses: Dict[str, Dict[str, Any]]) -> None:
+        """Store a batch of responses in one transaction."""
+        if not responses:
+            return
+        now = time.time()
+        rows = []
+        for key, response in responses.items():
+            serialized = json.dumps(response)
+            rows.append((key, serialized, len(serialized), now, now))
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO responses (key, response, size, created_at, last_accessed) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            self._conn.commit()
+            self._inserts_since_eviction += len(rows)
+            run_eviction = self._inserts_since_eviction >= self.config.evict_every
+        if run_eviction:
+            self.evict()
+
+    def evict(self) -> None:
+        with self._lock:
+            if self.config.max_age_seconds is not None:
+                self._conn.execute("DELETE FROM responses WHERE created_at < ?", (time.time() - self.config.max_age_seconds,))
+            if self.config.max_entries is not None:
+                self._conn.execute(
+                    "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY last_accessed DESC, rowid DESC LIMIT -1 OFFSET ?)",
+                    (self.config.max_entries,)
+                )
+            if self.config.max_size_bytes is not None:
+                self._conn.execute("""
+                    DELETE FROM responses WHERE key IN (
+                        SELECT key FROM (
+                            SELECT key, SUM(size) OVER (ORDER BY last_accessed DESC, rowid DESC) AS running_size FROM responses
+                        ) WHERE running_size > ?
+                    )
+                """, (self.config.max_size_bytes,))
+            self._conn.commit()
+            self._inserts_since_eviction = 0
+
+    def _is_expired(self, created_at: float) -> bool:
+        return self.config.max_age_seconds is not None and created_at < time.time() - self.config.max_age_seconds
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+            "size_bytes": size,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+        logging.info(f"Closed response cache at {self.cache_path}")
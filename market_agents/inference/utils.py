@@ -20,6 +20,17 @@ import json
 import re
 import tiktoken
 import ast
+from functools import lru_cache
+
+@lru_cache(maxsize=None)
+def get_token_encoding(encoding_name: str = "cl100k_base") -> tiktoken.Encoding:
+    """Shared encoder registry, tiktoken encodings are expensive to look up and safe to reuse."""
+    return tiktoken.get_encoding(encoding_name)
+
+@lru_cache(maxsize=65536)
+def count_tokens(text: str, encoding_name: str = "cl100k_base") -> int:
+    """Token count of a string, memoized so unchanged history messages are only encoded once."""
+    return len(get_token_encoding(encoding_name).encode(text, disallowed_special=()))
 
 def parse_json_string(content: str) -> Optional[Dict[str, Any]]:
     # Remove any leading/trailing whitespace and newlines
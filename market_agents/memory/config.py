@@ -1,3 +1,5 @@
+from typing import Optional
+
 import yaml
 from pydantic_settings import BaseSettings
 from pydantic import Field
@@ -8,11 +10,19 @@ class MarketMemoryConfig(BaseSettings):
     password: str = Field(default="password")
     host: str = Field(default="localhost")
     port: str = Field(default="0000")
-    index_method: str = Field(default="ivfflat") 
+    index_method: str = Field(default="ivfflat", description="Options: ivfflat, hnsw")
     lists: int = Field(default=100)
+    hnsw_m: int = Field(default=16, description="HNSW connections per node")
+    hnsw_ef_construction: int = Field(default=64, description="HNSW candidate list size while building")
+    ivfflat_probes: int = Field(default=10, description="ivfflat lists scanned per query, higher is slower with better recall")
+    hnsw_ef_search: int = Field(default=40, description="HNSW candidate list size per query, higher is slower with better recall")
+    index_min_rows: int = Field(default=1000, description="Rows a table needs before its vector index is built")
+    index_rebuild_factor: float = Field(default=4.0, description="ivfflat indexes are rebuilt when a table has grown this many times since the last build")
     embedding_api_url: str = Field(default="http://0.0.0.0:8080/embed")
     model: str = Field(default="jinaai/jina-embeddings-v2-base-en")
     batch_size: int = Field(default=32)
+    max_batch_tokens: int = Field(default=8192, description="Token budget of one embedding request, batches are packed up to it")
+    max_concurrent_requests: int = Field(default=4, description="Embedding requests in flight at once")
     timeout: int = Field(default=10)
     retry_attempts: int = Field(default=3)
     retry_delay: float = Field(default=1.0)
@@ -25,6 +35,16 @@ class MarketMemoryConfig(BaseSettings):
     encoding_format: str = Field(default="float")
 
     embedding_provider: str = Field(default="tei", description="Options: tei, openai, etc.")
+    embedding_cache_size: int = Field(default=10_000, description="Embeddings kept in the in-process LRU cache, 0 disables it")
+    embedding_cache_path: Optional[str] = Field(default=None, description="SQLite file for a persistent embedding cache, e.g. outputs/embedding_cache/embeddings.sqlite")
+
+    pool_min_size: int = Field(default=1, description="Connections opened when the pool is created")
+    pool_max_size: int = Field(default=20, description="Maximum pooled connections, callers wait when all are in use")
+    pool_health_check_seconds: float = Field(default=30.0, description="Idle time after which a pooled connection is checked before reuse")
+    statement_timeout: str = Field(default="60s", description="Postgres statement_timeout for memory connections")
+
+    table_layout: str = Field(default="per_agent", description="Options: per_agent (agent_<id>_cognitive / _episodic tables), shared (one hash-partitioned table per memory type)")
+    table_partitions: int = Field(default=16, description="Number of hash partitions on agent_id for the shared layout")
 
 def load_config_from_yaml(yaml_path: str = "config.yaml") -> MarketMemoryConfig:
     with open(yaml_path, 'r') as f:
@@ -1,22 +1,72 @@
+import asyncio
 import os
-import requests
-import time
-import tiktoken
+import random
+import threading
 import logging
+from typing import List, Optional
+
+import aiohttp
 from dotenv import load_dotenv
+from market_agents.inference.http_client import PooledHTTPClient
+from market_agents.inference.utils import count_tokens, get_token_encoding
+from market_agents.memory.embedding_cache import EmbeddingCache
+
+
+class _BackgroundLoop:
+    """
+    A daemon thread running one event loop, shared by every synchronous `get_embeddings`
+    caller. Sync callers mostly run on executor threads without a loop of their own; routing
+    them through a single long-lived loop lets them reuse one pooled session.
+    """
+    _lock = threading.Lock()
+    _loop: Optional[asyncio.AbstractEventLoop] = None
+    http_client = PooledHTTPClient()
+
+    @classmethod
+    def run(cls, coro):
+        with cls._lock:
+            if cls._loop is None:
+                cls._loop = asyncio.new_event_loop()
+                threading.Thread(target=cls._loop.run_forever, name="memory-embedder", daemon=True).start()
+        return asyncio.run_coroutine_threadsafe(coro, cls._loop).result()
+
 
 class MemoryEmbedder:
     """
     MemoryEmbedder embeds given text inputs from a specified embedding model.
+
+    Results are cached by model and truncated text in the process-wide `EmbeddingCache`
+    for the config, and repeated texts within one call are sent to the provider once.
+
+    Requests go out through aiohttp on a pooled session. Texts are packed into batches of
+    up to `max_batch_tokens` tokens (and at most `batch_size` inputs), and up to
+    `max_concurrent_requests` batches are in flight at once. Failed requests are retried
+    with jittered exponential backoff. `aget_embeddings` is the async entry point;
+    `get_embeddings` keeps the synchronous API by running the same code on a background loop.
+
+    Pass the simulation's `PooledHTTPClient` as `http_client` so embeddings share the pool
+    of the inference and group chat clients; its owner closes it. An embedder created
+    without one opens its own pool, which `close()` / `aclose()` shut down.
     """
-    def __init__(self, config):
+    RETRY_STATUSES = {408, 429, 500, 502, 503, 504}
+
+    def __init__(self, config, http_client: Optional[PooledHTTPClient] = None):
         self.config = config
-        self.encoding = tiktoken.get_encoding("cl100k_base")
+        self.encoding = get_token_encoding("cl100k_base")
         self.max_input = self.config.max_input - 1000
+        self._owns_http_client = http_client is None
+        self.http_client = http_client if http_client else PooledHTTPClient()
+        self.cache = EmbeddingCache.shared(config)
+        if config.embedding_provider == "openai":
+            load_dotenv()
+            self.openai_key = os.getenv("OPENAI_KEY")
         logging.info(f"Initialized MemoryEmbedder with {config.embedding_provider} provider")
 
     def _truncate_text(self, text: str) -> str:
         """Truncate text to max_input tokens using tiktoken."""
+        # every token covers at least one byte, so short texts can skip encoding entirely
+        if len(text.encode("utf-8")) <= self.max_input:
+            return text
         tokens = self.encoding.encode(text)
         if len(tokens) > self.max_input:
             logging.warning(f"Text truncated from {len(tokens)} to {self.max_input} tokens")
@@ -26,87 +76,111 @@ class MemoryEmbedder:
 
     def get_embeddings(self, texts):
         """Get embeddings with retry logic and batch processing."""
+        return _BackgroundLoop.run(self._embed(texts, _BackgroundLoop.http_client))
+
+    async def aget_embeddings(self, texts):
+        """Async version of `get_embeddings`, sending batches on this embedder's HTTP client."""
+        return await self._embed(texts, self.http_client)
+
+    async def _embed(self, texts, http_client: PooledHTTPClient):
         single_input = isinstance(texts, str)
         texts = [texts] if single_input else texts
 
         texts = [self._truncate_text(text) for text in texts]
+        keys = [EmbeddingCache.make_key(self.config.model, text) for text in texts]
 
+        unique = dict(zip(keys, texts))
+        embeddings_by_key = self.cache.get_many(list(unique)) if self.cache else {}
+        pending = {key: text for key, text in unique.items() if key not in embeddings_by_key}
+
+        if pending:
+            fetched = dict(zip(pending, await self._fetch_embeddings(list(pending.values()), http_client)))
+            if self.cache:
+                fetched = self.cache.put_many(fetched)
+            embeddings_by_key.update(fetched)
+        logging.debug(f"Embedding {len(texts)} texts, {len(unique)} unique, {len(pending)} sent to {self.config.embedding_provider}")
+
+        all_embeddings = [embeddings_by_key[key] for key in keys]
+        return all_embeddings[0] if single_input else all_embeddings
+
+    async def aclose(self) -> None:
+        """Close the HTTP client, if this embedder created it."""
+        if self._owns_http_client:
+            await self.http_client.close()
+
+    def close(self) -> None:
+        """Synchronous `aclose`, for callers outside an event loop."""
+        if self._owns_http_client:
+            asyncio.run(self.aclose())
+
+    def cache_stats(self):
+        """Hit-rate statistics of the embedding cache, None when caching is disabled."""
+        return self.cache.stats() if self.cache else None
+
+    def _make_batches(self, texts: List[str]) -> List[List[str]]:
+        """Pack consecutive texts into batches bounded by token count and input count."""
+        batches, batch, batch_tokens = [], [], 0
+        for text in texts:
+            tokens = count_tokens(text)
+            if batch and (batch_tokens + tokens > self.config.max_batch_tokens or len(batch) >= self.config.batch_size):
+                batches.append(batch)
+                batch, batch_tokens = [], 0
+            batch.append(text)
+            batch_tokens += tokens
+        if batch:
+            batches.append(batch)
+        return batches
+
+    async def _fetch_embeddings(self, texts: List[str], http_client: PooledHTTPClient) -> List[List[float]]:
         if self.config.embedding_provider == "openai":
-            all_embeddings = self._get_openai_embeddings(texts)
+            headers = {
+                "Authorization": f"Bearer {self.openai_key}",
+                "Content-Type": "application/json"
+            }
+            input_field = "input"
         elif self.config.embedding_provider == "tei":
-            all_embeddings = self._get_tei_embeddings(texts)
+            headers = {"Content-Type": "application/json"}
+            input_field = "inputs"
         else:
             raise NotImplementedError(
                 f"Unknown embedding provider: {self.config.embedding_provider}"
             )
 
-        return all_embeddings[0] if single_input else all_embeddings
+        semaphore = asyncio.Semaphore(self.config.max_concurrent_requests)
 
-    def _get_openai_embeddings(self, texts):
-        """Embeddings from OpenAI API."""
-        load_dotenv()
-        self.openai_key = os.getenv("OPENAI_KEY")
-        headers = {
-            "Authorization": f"Bearer {self.openai_key}",
-            "Content-Type": "application/json"
-        }
-        all_embeddings = []
-
-        for i in range(0, len(texts), self.config.batch_size):
-            batch = texts[i : i + self.config.batch_size]
-            payload = {
-                "input": batch,
-                "model": self.config.model
-            }
-            # Reuse the _send_embedding_request method
-            response = self._send_embedding_request(payload, headers)
-            response_json = response.json()
-            batch_embeddings = [item["embedding"] for item in response_json.get("data", [])]
-            all_embeddings.extend(batch_embeddings)
-
-        return all_embeddings
-
-    def _get_tei_embeddings(self, texts):
-        """Embeddings for local embedding model (TEI)."""
-        headers = {"Content-Type": "application/json"}
-        all_embeddings = []
-
-        for i in range(0, len(texts), self.config.batch_size):
-            batch = texts[i : i + self.config.batch_size]
-            payload = {
-                "inputs": batch,
-                "model": self.config.model
-            }
-            # Reuse the _send_embedding_request method
-            response = self._send_embedding_request(payload, headers)
-            all_embeddings.extend(response.json())
+        async def embed_batch(batch: List[str]) -> List[List[float]]:
+            payload = {input_field: batch, "model": self.config.model}
+            async with semaphore:
+                response_json = await self._send_embedding_request(http_client, payload, headers)
+            if self.config.embedding_provider == "openai":
+                data = sorted(response_json.get("data", []), key=lambda item: item["index"])
+                return [item["embedding"] for item in data]
+            return response_json
 
-        return all_embeddings
+        results = await asyncio.gather(*(embed_batch(batch) for batch in self._make_batches(texts)))
+        return [embedding for batch_embeddings in results for embedding in batch_embeddings]
 
-    def _send_embedding_request(self, payload, headers):
+    async def _send_embedding_request(self, http_client: PooledHTTPClient, payload, headers):
         """
-        Sends POST request to the embedding API with retry logic. 
+        Sends POST request to the embedding API, retrying transient failures with jittered backoff.
         """
+        session = await http_client.get_session()
+        timeout = aiohttp.ClientTimeout(total=self.config.timeout)
         for attempt in range(self.config.retry_attempts):
             try:
-                response = requests.post(
-                    self.config.embedding_api_url,
-                    headers=headers,
-                    json=payload,
-                    timeout=self.config.timeout
-                )
-                response.raise_for_status()
-                return response
-            except requests.exceptions.HTTPError as http_err:
-                print(f"HTTP error occurred: {http_err}")
-                if response is not None:
-                    print(f"Response content: {response.content}")
+                async with session.post(self.config.embedding_api_url, headers=headers, json=payload, timeout=timeout) as response:
+                    if response.status >= 400:
+                        body = await response.text()
+                        if response.status not in self.RETRY_STATUSES or attempt == self.config.retry_attempts - 1:
+                            logging.error(f"Embedding request failed with status {response.status}: {body}")
+                            response.raise_for_status()
+                        logging.warning(f"Embedding request failed with status {response.status}, retrying")
+                    else:
+                        return await response.json()
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
                 if attempt == self.config.retry_attempts - 1:
                     raise
-                time.sleep(self.config.retry_delay)
-            except Exception as e:
-                if attempt == self.config.retry_attempts - 1:
-                    raise e
-                time.sleep(self.config.retry_delay)
+                logging.warning(f"Embedding request error {e!r}, retrying")
+            await asyncio.sleep(self.config.retry_delay * 2 ** attempt * random.uniform(0.5, 1.5))
 
-        raise RuntimeError("Unexpected error in _send_embedding_request")
\ No newline at end of file
+        raise RuntimeError("Unexpected error in _send_embedding_request")
@@ -0,0 +1,138 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+
+class EmbeddingCache:
+    """
+    Two-level cache of embeddings keyed by (model, hash of the truncated text).
+
+    The first level is an in-process LRU of up to `max_entries` vectors. The optional
+    second level is a SQLite file that survives restarts and is shared by processes
+    running against the same path. Vectors are held as float32 arrays, the precision
+    pgvector stores them with, which keeps a 768-dim entry around 3 KB in memory.
+
+    Every `MemoryEmbedder` built from the same config shares one cache through `shared()`,
+    so agents whose memories and queries repeat hit the same entries.
+    """
+
+    _instances: Dict[Tuple[int, Optional[str]], "EmbeddingCache"] = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, max_entries: int = 10_000, cache_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.cache_path = cache_path
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, array]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        if cache_path:
+            full_path = os.path.abspath(cache_path)
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            self._conn = sqlite3.connect(full_path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    key TEXT PRIMARY KEY,
+                    embedding BLOB NOT NULL
+                )
+            """)
+            self._conn.commit()
+
+    @classmethod
+    def shared(cls, config) -> Optional["EmbeddingCache"]:
+        """The process-wide cache for a memory config, or None if caching is disabled."""
+        max_entries = config.embedding_cache_size
+        cache_path = config.embedding_cache_path
+        if not max_entries and not cache_path:
+            return None
+        with cls._instances_lock:
+            key = (max_entries, cache_path)
+            if key not in cls._instances:
+                cls._instances[key] = cls(max_entries=max_entries, cache_path=cache_path)
+            return cls._instances[key]
+
+    @staticmethod
+    def make_key(model: str, text: str) -> str:
+        return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, List[float]]:
+        """Look up keys in memory, then on disk, promoting disk hits into memory."""
+        found: Dict[str, array] = {}
+        missing = []
+        with self._lock:
+            for key in keys:
+                vector = self._entries.get(key)
+                if vector is not None:
+                    self._entries.move_to_end(key)
+                    found[key] = vector
+                    self.memory_hits += 1
+                else:
+                    missing.append(key)
+
+            if missing and self._conn is not None:
+                for start in range(0, len(missing), 500):
+                    chunk = missing[start:start + 500]
+                    rows = self._conn.execute(
+                        f"SELECT key, embedding FROM embeddings WHERE key IN ({', '.join('?' * len(chunk))})",
+                        chunk
+                    ).fetchall()
+                    for key, blob in rows:
+                        vector = array("f")
+                        vector.frombytes(blob)
+                        found[key] = vector
+                        self._remember(key, vector)
+                        self.disk_hits += 1
+            self.misses += len(keys) - len(found)
+        return {key: vector.tolist() for key, vector in found.items()}
+
+    def put_many(self, items: Dict[str, List[float]]) -> Dict[str, List[float]]:
+        """Store embeddings, returning them as cached so hits and misses round the same way."""
+        vectors = {key: array("f", embedding) for key, embedding in items.items()}
+        with self._lock:
+            for key, vector in vectors.items():
+                self._remember(key, vector)
+            if self._conn is not None and vectors:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, embedding) VALUES (?, ?)",
+                    [(key, vector.tobytes()) for key, vector in vectors.items()]
+                )
+                self._conn.commit()
+        return {key: vector.tolist() for key, vector in vectors.items()}
+
+    def _remember(self, key: str, vector: array) -> None:
+        if not self.max_entries:
+            return
+        self._entries[key] = vector
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        hits = self.memory_hits + self.disk_hits
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+        }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+        logging.info(f"Closed embedding cache, stats: {self.stats()}")
@@ -0,0 +1,196 @@
+import argparse
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+
+@dataclass
+class _TableIndexState:
+    rows: int
+    index_name: Optional[str] = None
+    index_method: Optional[str] = None
+    indexed_rows: int = 0
+    building: bool = False
+
+
+class VectorIndexManager:
+    """
+    Creates and maintains the vector indexes of memory and knowledge base tables.
+
+    Indexes follow `index_method` in the memory config: `ivfflat` with `lists`, or `hnsw`
+    with `hnsw_m` and `hnsw_ef_construction`. A table is indexed once it holds
+    `index_min_rows` rows rather than when it is created, because ivfflat centroids
+    trained on an empty table are meaningless. Writers report inserted rows through
+    `note_rows`; ivfflat indexes are rebuilt when a table has grown `index_rebuild_factor`
+    times since its index was built, and `after_bulk_load` rebuilds right away.
+    HNSW indexes stay accurate as rows are added and are only built once.
+
+    Search-time recall is set per connection from `ivfflat_probes` / `hnsw_ef_search`
+    and can be overridden for one query with `apply_search_settings`.
+    """
+
+    def __init__(self, db, config):
+        self.db = db
+        self.config = config
+        self._lock = threading.Lock()
+        self._tables: Dict[str, _TableIndexState] = {}
+
+    @staticmethod
+    def index_name(table: str) -> str:
+        return f"{table}_vec_idx"
+
+    def index_definition(self, rows: int) -> str:
+        method = self.config.index_method
+        if method == "hnsw":
+            return f"hnsw (embedding vector_cosine_ops) WITH (m = {self.config.hnsw_m}, ef_construction = {self.config.hnsw_ef_construction})"
+        if method == "ivfflat":
+            # fewer lists than rows / 10 leaves most lists nearly empty
+            lists = max(1, min(self.config.lists, rows // 10))
+            return f"ivfflat (embedding vector_cosine_ops) WITH (lists = {lists})"
+        raise ValueError(f"Unknown index method: {method}")
+
+    def apply_search_settings(self, cur, probes: Optional[int] = None, ef_search: Optional[int] = None) -> None:
+        """Override ivfflat.probes / hnsw.ef_search for the rest of the current transaction."""
+        if probes is not None:
+            cur.execute("SELECT set_config('ivfflat.probes', %s, true)", (str(probes),))
+        if ef_search is not None:
+            cur.execute("SELECT set_config('hnsw.ef_search', %s, true)", (str(ef_search),))
+
+    def note_rows(self, table: str, added: int) -> None:
+        """Record rows committed to a table and build or rebuild its index when due."""
+        with self._lock:
+            state = self._tables.get(table)
+            if state is not None:
+                state.rows += added
+        if state is None:
+            # the first sight of a table counts what is already there, including these rows
+            state = self._inspect(table)
+        if self._is_due(state):
+            self.build_index(table)
+
+    def after_bulk_load(self, table: str) -> None:
+        """Recount a table after a bulk load and build, or rebuild a stale ivfflat index."""
+        state = self._inspect(table)
+        if state.rows >= self.config.index_min_rows:
+            self.build_index(table, rebuild=state.index_method == "ivfflat")
+
+    def build_index(self, table: str, rebuild: bool = False) -> None:
+        """Create the vector index of a table, replacing an existing one if `rebuild` or the method changed."""
+        with self._lock:
+            state = self._tables.setdefault(table, _TableIndexState(rows=0))
+            if state.building:
+                return
+            state.building = True
+        try:
+            start = time.perf_counter()
+            with self.db.transaction() as cur:
+                existing = self._existing_index(cur, table)
+                if existing and existing[1] == self.config.index_method and not rebuild:
+                    index_name, method = existing
+                    cur.execute(f"SELECT COUNT(*) FROM {table}")
+                    rows = cur.fetchone()[0]
+                else:
+                    if existing:
+                        cur.execute(f"DROP INDEX IF EXISTS {existing[0]}")
+                    cur.execute(f"SELECT COUNT(*) FROM {table}")
+                    rows = cur.fetchone()[0]
+                    index_name, method = self.index_name(table), self.config.index_method
+                    cur.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {table} USING {self.index_definition(rows)}")
+                    logging.info(f"Built {method} index on {table} ({rows} rows) in {time.perf_counter() - start:.2f}s")
+            with self._lock:
+                self._tables[table] = _TableIndexState(rows=rows, index_name=index_name, index_method=method, indexed_rows=rows)
+        finally:
+            with self._lock:
+                self._tables[table].building = False
+
+    def reindex(self, tables: Optional[List[str]] = None) -> None:
+        """Rebuild the vector index of the given tables, or of every table with an embedding column."""
+        for table in tables or self.vector_tables():
+            self.build_index(table, rebuild=True)
+
+    def vector_tables(self) -> List[str]:
+        with self.db.transaction() as cur:
+            cur.execute("""
+                SELECT c.relname
+                FROM pg_attribute a
+                JOIN pg_class c ON a.attrelid = c.oid
+                JOIN pg_type t ON a.atttypid = t.oid
+                JOIN pg_namespace n ON c.relnamespace = n.oid
+                WHERE a.attname = 'embedding' AND t.typname = 'vector'
+                  AND c.relkind IN ('r', 'p') AND NOT c.relispartition
+                  AND n.nspname = current_schema()
+                ORDER BY c.relname;
+            """)
+            return [row[0] for row in cur.fetchall()]
+
+    def _is_due(self, state: _TableIndexState) -> bool:
+        if state.building or state.rows < self.config.index_min_rows:
+            return False
+        if state.index_name is None or state.index_method != self.config.index_method:
+            return True
+        return state.index_method == "ivfflat" and state.rows >= state.indexed_rows * self.config.index_rebuild_factor
+
+    def _inspect(self, table: str) -> _TableIndexState:
+        with self.db.transaction() as cur:
+            cur.execute(f"SELECT COUNT(*) FROM {table}")
+            rows = cur.fetchone()[0]
+            existing = self._existing_index(cur, table)
+        state = _TableIndexState(rows=rows)
+        if existing:
+            # an index found on startup counts as built at the current size, unless the table
+            # is still below the threshold: then it was built too early and is rebuilt later
+            state.index_name, state.index_method = existing
+            state.indexed_rows = rows if rows >= self.config.index_min_rows else 0
+        with self._lock:
+            known = self._tables.get(table)
+            if known is not None:
+                state.building = known.building
+                if known.index_method == state.index_method:
+                    state.indexed_rows = known.indexed_rows
+            self._tables[table] = state
+        return state
+
+    @staticmethod
+    def _existing_index(cur, table: str):
+        cur.execute("""
+            SELECT indexname, indexdef FROM pg_indexes
+            WHERE schemaname = current_schema() AND tablename = %s
+              AND (indexdef LIKE '%% USING ivfflat %%' OR indexdef LIKE '%% USING hnsw %%');
+        """, (table,))
+        row = cur.fetchone()
+        if row is None:
+            return None
+        return row[0], "hnsw" if " USING hnsw " in row[1] else "ivfflat"
+
+
+def main():
+    from market_agents.memory.config import load_config_from_yaml
+    from market_agents.memory.setup_db import DatabaseConnection
+
+    parser = argparse.ArgumentParser(description="Rebuild the vector indexes of agent memory and knowledge base tables")
+    parser.add_argument("--config", default="market_agents/memory/memory_config.yaml", help="Path of the memory config YAML")
+    parser.add_argument("--method", choices=["ivfflat", "hnsw"], help="Index method, defaults to index_method from the config")
+    parser.add_argument("--lists", type=int, help="ivfflat lists")
+    parser.add_argument("--m", type=int, help="hnsw m")
+    parser.add_argument("--ef-construction", type=int, help="hnsw ef_construction")
+    parser.add_argument("--tables", nargs="*", help="Tables to reindex, defaults to every table with an embedding column")
+    args = parser.parse_args()
+
+    config = load_config_from_yaml(args.config)
+    overrides = {"index_method": args.method, "lists": args.lists, "hnsw_m": args.m, "hnsw_ef_construction": args.ef_construction}
+    for field, value in overrides.items():
+        if value is not None:
+            setattr(config, field, value)
+
+    logging.basicConfig(level=logging.INFO)
+    db = DatabaseConnection(config)
+    try:
+        db.index_manager.reindex(args.tables)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
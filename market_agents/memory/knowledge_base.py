@@ -51,15 +51,14 @@ class MarketKnowledgeBase:
     def check_table_exists(cls, db_conn: DatabaseConnection, table_prefix: str) -> bool:
         """Check if knowledge base tables exist"""
         try:
-            db_conn.connect()
-            db_conn.cursor.execute("""
-                SELECT EXISTS (
-                    SELECT FROM information_schema.tables 
-                    WHERE table_name = %s
-                );
-            """, (f"{table_prefix}_knowledge_objects",))
-            
-            return db_conn.cursor.fetchone()[0]
+            with db_conn.transaction() as cur:
+                cur.execute("""
+                    SELECT EXISTS (
+                        SELECT FROM information_schema.tables 
+                        WHERE table_name = %s
+                    );
+                """, (f"{table_prefix}_knowledge_objects",))
+                return cur.fetchone()[0]
         except Exception as e:
             logging.error(f"Error checking knowledge base existence: {str(e)}")
             return False
@@ -82,6 +81,7 @@ class MarketKnowledgeBase:
             chunk.embedding = emb
 
         knowledge_id = self._save_knowledge_and_chunks(text, chunks, metadata)
+        self.db.index_manager.after_bulk_load(self.knowledge_chunks_table)
         return knowledge_id
 
     def _chunk(self, text: str) -> List[KnowledgeChunk]:
@@ -97,39 +97,29 @@ class MarketKnowledgeBase:
     def _save_knowledge_and_chunks(self, document_text: str, chunks: List[KnowledgeChunk], metadata: Optional[Dict[str, Any]]) -> UUID:
         """Save knowledge object and chunks to the dynamically named tables."""
         knowledge_id = uuid.uuid4()
-        self.db.connect()
-        try:
+        with self.db.transaction() as cur:
             # Insert into the knowledge objects table
-            self.db.cursor.execute(f"""
+            cur.execute(f"""
                 INSERT INTO {self.knowledge_objects_table} (knowledge_id, content, metadata)
                 VALUES (%s, %s, %s)
                 RETURNING created_at;
             """, (str(knowledge_id), document_text, json.dumps(metadata) if metadata else json.dumps({})))
-            created_at = self.db.cursor.fetchone()[0]
+            created_at = cur.fetchone()[0]
 
             # Insert chunks into the knowledge chunks table
             for chunk in chunks:
-                self.db.cursor.execute(f"""
+                cur.execute(f"""
                     INSERT INTO {self.knowledge_chunks_table} (knowledge_id, text, start_pos, end_pos, embedding)
                     VALUES (%s, %s, %s, %s, %s);
                 """, (str(knowledge_id), chunk.text, chunk.start, chunk.end, chunk.embedding))
 
-            self.db.conn.commit()
-            return knowledge_id
-        except Exception as e:
-            self.db.conn.rollback()
-            raise e
+        return knowledge_id
 
     def clear_knowledge_base(self):
         """Clear all knowledge entries from the dynamically named tables."""
-        self.db.connect()
-        try:
-            self.db.cursor.execute(f"DELETE FROM {self.knowledge_chunks_table};")
-            self.db.cursor.execute(f"DELETE FROM {self.knowledge_objects_table};")
-            self.db.conn.commit()
-        except Exception as e:
-            self.db.conn.rollback()
-            raise e
+        with self.db.transaction() as cur:
+            cur.execute(f"DELETE FROM {self.knowledge_chunks_table};")
+            cur.execute(f"DELETE FROM {self.knowledge_objects_table};")
         
 class SemanticChunker(KnowledgeChunker):
     def __init__(self, min_size: int, max_size: int):
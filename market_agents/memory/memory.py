@@ -5,6 +5,7 @@ from datetime import datetime, timezone
 from typing import List, Optional, Dict, Any, Union
 from uuid import UUID
 
+from psycopg2.extras import execute_values
 from pydantic import BaseModel, Field, ConfigDict
 
 from market_agents.memory.embedding import MemoryEmbedder
@@ -80,22 +81,25 @@ class BaseMemory:
         self.embedder = embedder
         self.agent_id = agent_id
         self.safe_id = self._sanitize_id(agent_id)
-        
-        # Initialize database connection
-        self._initialize_database()
+
+    def _agent_columns(self) -> tuple:
+        """Leading key column of the shared layout, empty for per-agent tables."""
+        return ("agent_id",) if self.db.shared_memory_tables else ()
+
+    def _scoped_conditions(self) -> tuple:
+        """Start a WHERE clause with this agent's scope in the configured layout."""
+        condition, params = self.db.agent_scope(self.agent_id)
+        return [condition], list(params)
 
     @staticmethod
     def _sanitize_id(agent_id: str) -> str:
         """Sanitize agent ID for table names"""
         return agent_id.replace('-', '_')
 
-    def _initialize_database(self):
-        """Ensure database connection is ready"""
-        self.db.connect()
-
 class CognitiveMemory(BaseMemory):
     """
-    Handles storing and retrieving single-step memory items in agent_{agent_id}_cognitive table.
+    Handles storing and retrieving single-step memory items in agent_{agent_id}_cognitive table,
+    or this agent's rows of the shared cognitive table.
     """
 
     def __init__(
@@ -106,40 +110,44 @@ class CognitiveMemory(BaseMemory):
         agent_id: str
     ):
         BaseMemory.__init__(self, config, db_conn, embedder, agent_id)
-        self.cognitive_table = f"agent_{self.safe_id}_cognitive"
+        self.cognitive_table = self.db.cognitive_table(self.agent_id)
         self.db.create_agent_cognitive_memory_table(self.agent_id)
 
     def store_cognitive_item(self, memory_object: MemoryObject) -> None:
         """Store a single cognitive memory item."""
-        try:
-            # Generate embedding if not already present
-            if not memory_object.embedding:
-                memory_object.embedding = self.embedder.get_embeddings(memory_object.content)
-
-            # Serialize metadata
-            metadata_json = memory_object.serialize_metadata()
-
-            # Insert the memory item
-            self.db.cursor.execute(
-                f"""
-                INSERT INTO {self.cognitive_table} 
-                (memory_id, cognitive_step, content, embedding, created_at, metadata)
-                VALUES (%s, %s, %s, %s, %s, %s)
-                """,
-                (
-                    str(memory_object.memory_id),
-                    memory_object.cognitive_step,
-                    memory_object.content,
-                    memory_object.embedding,
-                    memory_object.created_at or datetime.now(timezone.utc),
-                    metadata_json
-                )
+        # Generate embedding if not already present
+        if not memory_object.embedding:
+            memory_object.embedding = self.embedder.get_embeddings(memory_object.content)
+
+        with self.db.transaction() as cur:
+            self.insert_cognitive_items(cur, [memory_object])
+        self.db.index_manager.note_rows(self.cognitive_table, 1)
+
+    def insert_cognitive_items(self, cur, memory_objects: List[MemoryObject]) -> None:
+        """Insert already embedded items with one multi-row INSERT on the given cursor."""
+        agent_columns = self._agent_columns()
+        agent_values = (self.agent_id,) if agent_columns else ()
+        rows = [
+            agent_values + (
+                str(memory_object.memory_id),
+                memory_object.cognitive_step,
+                memory_object.content,
+                memory_object.embedding,
+                memory_object.created_at or datetime.now(timezone.utc),
+                memory_object.serialize_metadata()
             )
-            self.db.conn.commit()
-
-        except Exception as e:
-            self.db.conn.rollback()
-            raise e
+            for memory_object in memory_objects
+        ]
+        execute_values(
+            cur,
+            f"""
+            INSERT INTO {self.cognitive_table}
+            ({", ".join(agent_columns + ("memory_id", "cognitive_step", "content", "embedding", "created_at", "metadata"))})
+            VALUES %s
+            """,
+            rows,
+            template="(" + "%s, " * len(agent_columns) + "%s, %s, %s, %s::vector, %s, %s)"
+        )
 
     def get_cognitive_items(
         self,
@@ -152,10 +160,8 @@ class CognitiveMemory(BaseMemory):
         """
         Retrieve a list of single-step memory items (short-term) from the agent's cognitive table.
         """
-        self.db.connect()
 
-        conditions = []
-        params = []
+        conditions, params = self._scoped_conditions()
 
         if cognitive_step:
             if isinstance(cognitive_step, str):
@@ -180,7 +186,7 @@ class CognitiveMemory(BaseMemory):
             conditions.append("created_at <= %s")
             params.append(end_time)
 
-        where_clause = " AND ".join(conditions) if conditions else "TRUE"
+        where_clause = " AND ".join(conditions)
 
         params.append(limit)
         
@@ -202,32 +208,30 @@ class CognitiveMemory(BaseMemory):
             ORDER BY created_at ASC;
         """
 
-        try:
-            self.db.cursor.execute(query, tuple(params))
-            rows = self.db.cursor.fetchall()
-
-            items = []
-            for row in rows:
-                if len(row) != 6:
-                    continue
-
-                mem_id, step, content, embedding, created_at, meta = row
-                if isinstance(embedding, str):
-                    embedding = [float(x) for x in embedding.strip('[]').split(',')]
-
-                mo = MemoryObject(
-                    memory_id=UUID(mem_id),
-                    agent_id=self.agent_id,
-                    cognitive_step=step,
-                    content=content,
-                    embedding=embedding,
-                    created_at=created_at,
-                    metadata=meta if meta else {}
-                )
-                items.append(mo)
-            return items
-        except Exception as e:
-            raise e
+        with self.db.transaction() as cur:
+            cur.execute(query, tuple(params))
+            rows = cur.fetchall()
+
+        items = []
+        for row in rows:
+            if len(row) != 6:
+                continue
+
+            mem_id, step, content, embedding, created_at, meta = row
+            if isinstance(embedding, str):
+                embedding = [float(x) for x in embedding.strip('[]').split(',')]
+
+            mo = MemoryObject(
+                memory_id=UUID(mem_id),
+                agent_id=self.agent_id,
+                cognitive_step=step,
+                content=content,
+                embedding=embedding,
+                created_at=created_at,
+                metadata=meta if meta else {}
+            )
+            items.append(mo)
+        return items
 
     def delete_cognitive_items(
         self,
@@ -240,10 +244,7 @@ class CognitiveMemory(BaseMemory):
         Delete rows from the short-term cognitive memory based on filters.
         Returns how many rows were deleted.
         """
-        self.db.connect()
-
-        conditions = []
-        params = []
+        conditions, params = self._scoped_conditions()
 
         if cognitive_step:
             if isinstance(cognitive_step, str):
@@ -268,24 +269,20 @@ class CognitiveMemory(BaseMemory):
             conditions.append("created_at <= %s")
             params.append(end_time)
 
-        where_clause = " AND ".join(conditions) if conditions else "TRUE"
+        where_clause = " AND ".join(conditions)
 
-        try:
-            self.db.cursor.execute(
+        with self.db.transaction() as cur:
+            cur.execute(
                 f"DELETE FROM {self.cognitive_table} WHERE {where_clause} RETURNING *;",
                 tuple(params)
             )
-            deleted_count = self.db.cursor.rowcount
-            self.db.conn.commit()
-            return deleted_count
-        except Exception as e:
-            self.db.conn.rollback()
-            raise e
+            return cur.rowcount
 
 
 class EpisodicMemory(BaseMemory):
     """
-    Manages the 'episodic' memory table named agent_{agent_id}_episodic.
+    Manages the 'episodic' memory table named agent_{agent_id}_episodic,
+    or this agent's rows of the shared episodic table.
     Each row represents a full 'episode' containing multiple steps.
     """
 
@@ -297,45 +294,53 @@ class EpisodicMemory(BaseMemory):
         agent_id: str
     ):
         BaseMemory.__init__(self, config, db_conn, embedder, agent_id)
-        self.episodic_table = f"agent_{self.safe_id}_episodic"
+        self.episodic_table = self.db.episodic_table(self.agent_id)
         self.db.create_agent_episodic_memory_table(self.agent_id)
 
     def store_episode(self, episode: EpisodicMemoryObject):
         """
         Insert an entire 'episode' in agent_{agent_id}_episodic.
         """
-        self.db.connect()
-        try:
-            # If no embedding was provided, derive from the task_query + cognitive steps
-            if episode.embedding is None:
-                concat_str = f"Task:{episode.task_query} + Steps:{episode.cognitive_steps}"
-                episode.embedding = self.embedder.get_embeddings(concat_str)
-
-            step_data = [step.dict() for step in episode.cognitive_steps]
-            strategy_data = episode.strategy_update if episode.strategy_update else []
-            meta = episode.metadata if episode.metadata else {}
-
-            now = episode.created_at or datetime.now(timezone.utc)
-
-            self.db.cursor.execute(f"""
-                INSERT INTO {self.episodic_table}
-                (memory_id, task_query, cognitive_steps, total_reward,
-                 strategy_update, embedding, created_at, metadata)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s);
-            """, (
+        # If no embedding was provided, derive from the task_query + cognitive steps
+        if episode.embedding is None:
+            episode.embedding = self.embedder.get_embeddings(self.embedding_text(episode))
+
+        with self.db.transaction() as cur:
+            self.insert_episodes(cur, [episode])
+        self.db.index_manager.note_rows(self.episodic_table, 1)
+
+    @staticmethod
+    def embedding_text(episode: EpisodicMemoryObject) -> str:
+        return f"Task:{episode.task_query} + Steps:{episode.cognitive_steps}"
+
+    def insert_episodes(self, cur, episodes: List[EpisodicMemoryObject]) -> None:
+        """Insert already embedded episodes with one multi-row INSERT on the given cursor."""
+        agent_columns = self._agent_columns()
+        agent_values = (self.agent_id,) if agent_columns else ()
+        rows = [
+            agent_values + (
                 str(episode.memory_id),
                 episode.task_query,
-                json.dumps(step_data),
+                json.dumps([step.dict() for step in episode.cognitive_steps]),
                 episode.total_reward,
-                json.dumps(strategy_data),
+                json.dumps(episode.strategy_update if episode.strategy_update else []),
                 episode.embedding,
-                now,
-                json.dumps(meta),
-            ))
-            self.db.conn.commit()
-        except Exception as e:
-            self.db.conn.rollback()
-            raise e
+                episode.created_at or datetime.now(timezone.utc),
+                json.dumps(episode.metadata if episode.metadata else {}),
+            )
+            for episode in episodes
+        ]
+        execute_values(
+            cur,
+            f"""
+            INSERT INTO {self.episodic_table}
+            ({", ".join(agent_columns + ("memory_id", "task_query", "cognitive_steps", "total_reward",
+                                         "strategy_update", "embedding", "created_at", "metadata"))})
+            VALUES %s
+            """,
+            rows,
+            template="(" + "%s, " * len(agent_columns) + "%s, %s, %s, %s, %s, %s::vector, %s, %s)"
+        )
 
     def get_episodes(
         self,
@@ -347,10 +352,8 @@ class EpisodicMemory(BaseMemory):
         """
         Retrieve episodes in descending order of created_at.
         """
-        self.db.connect()
 
-        conditions = []
-        params = []
+        conditions, params = self._scoped_conditions()
 
         if metadata_filters:
             for k, v in metadata_filters.items():
@@ -366,7 +369,7 @@ class EpisodicMemory(BaseMemory):
             conditions.append("created_at <= %s")
             params.append(end_time)
 
-        where_clause = " AND ".join(conditions) if conditions else "TRUE"
+        where_clause = " AND ".join(conditions)
 
         query = f"""
             SELECT 
@@ -385,45 +388,43 @@ class EpisodicMemory(BaseMemory):
         """
         params.append(limit)
 
-        try:
-            self.db.cursor.execute(query, tuple(params))
-            rows = self.db.cursor.fetchall()
+        with self.db.transaction() as cur:
+            cur.execute(query, tuple(params))
+            rows = cur.fetchall()
 
-            episodes = []
-            for row in rows:
-                (mem_id, task_query, steps_json, reward, strategy_json,
-                 embedding, created_at, meta) = row
+        episodes = []
+        for row in rows:
+            (mem_id, task_query, steps_json, reward, strategy_json,
+             embedding, created_at, meta) = row
 
-                if isinstance(steps_json, str):
-                    steps_list = json.loads(steps_json)
-                else:
-                    steps_list = steps_json or []
+            if isinstance(steps_json, str):
+                steps_list = json.loads(steps_json)
+            else:
+                steps_list = steps_json or []
 
-                if isinstance(strategy_json, str):
-                    strategy_list = json.loads(strategy_json)
-                else:
-                    strategy_list = strategy_json or []
-
-                if isinstance(embedding, str):
-                    embedding = [float(x) for x in embedding.strip('[]').split(',')]
-
-                csteps = [CognitiveStep(**step) for step in steps_list]
-
-                episode_obj = EpisodicMemoryObject(
-                    memory_id=UUID(mem_id),
-                    agent_id=self.agent_id,
-                    task_query=task_query,
-                    cognitive_steps=csteps,
-                    total_reward=reward,
-                    strategy_update=strategy_list,
-                    embedding=embedding,
-                    created_at=created_at,
-                    metadata=meta if meta else {}
-                )
-                episodes.append(episode_obj)
-            return episodes
-        except Exception as e:
-            raise e
+            if isinstance(strategy_json, str):
+                strategy_list = json.loads(strategy_json)
+            else:
+                strategy_list = strategy_json or []
+
+            if isinstance(embedding, str):
+                embedding = [float(x) for x in embedding.strip('[]').split(',')]
+
+            csteps = [CognitiveStep(**step) for step in steps_list]
+
+            episode_obj = EpisodicMemoryObject(
+                memory_id=UUID(mem_id),
+                agent_id=self.agent_id,
+                task_query=task_query,
+                cognitive_steps=csteps,
+                total_reward=reward,
+                strategy_update=strategy_list,
+                embedding=embedding,
+                created_at=created_at,
+                metadata=meta if meta else {}
+            )
+            episodes.append(episode_obj)
+        return episodes
 
     def delete_episodes(
         self,
@@ -435,10 +436,7 @@ class EpisodicMemory(BaseMemory):
         Delete entire episodes based on optional filters.
         Returns how many rows were deleted.
         """
-        self.db.connect()
-
-        conditions = []
-        params = []
+        conditions, params = self._scoped_conditions()
 
         if task_query:
             conditions.append("task_query = %s")
@@ -452,19 +450,14 @@ class EpisodicMemory(BaseMemory):
             conditions.append("created_at <= %s")
             params.append(end_time)
 
-        where_clause = " AND ".join(conditions) if conditions else "TRUE"
+        where_clause = " AND ".join(conditions)
 
-        try:
-            self.db.cursor.execute(
+        with self.db.transaction() as cur:
+            cur.execute(
                 f"DELETE FROM {self.episodic_table} WHERE {where_clause} RETURNING *;",
                 tuple(params)
             )
-            deleted_count = self.db.cursor.rowcount
-            self.db.conn.commit()
-            return deleted_count
-        except Exception as e:
-            self.db.conn.rollback()
-            raise e
+            return cur.rowcount
 
 class ShortTermMemory(BaseModel):
     model_config = ConfigDict(arbitrary_types_allowed=True)
@@ -472,9 +465,10 @@ class ShortTermMemory(BaseModel):
     cognitive_memory: CognitiveMemory
     items_cache: List[MemoryObject] = Field(default_factory=list)
 
-    def __init__(self, memory_config: MarketMemoryConfig, db_conn: DatabaseConnection, agent_id: str):
+    def __init__(self, memory_config: MarketMemoryConfig, db_conn: DatabaseConnection, agent_id: str,
+                 embedder: Optional[MemoryEmbedder] = None):
         super().__init__(
-            cognitive_memory=CognitiveMemory(memory_config, db_conn, MemoryEmbedder(memory_config), agent_id)
+            cognitive_memory=CognitiveMemory(memory_config, db_conn, embedder or MemoryEmbedder(memory_config), agent_id)
         )
 
     async def store_memory(self, memory_object: MemoryObject):
@@ -535,8 +529,9 @@ class LongTermMemory(BaseModel):
     memory_retriever: MemoryRetriever
     episodic_store: EpisodicMemory
 
-    def __init__(self, memory_config: MarketMemoryConfig, db_conn: DatabaseConnection, agent_id: str):
-        embedder = MemoryEmbedder(memory_config)
+    def __init__(self, memory_config: MarketMemoryConfig, db_conn: DatabaseConnection, agent_id: str,
+                 embedder: Optional[MemoryEmbedder] = None):
+        embedder = embedder or MemoryEmbedder(memory_config)
         super().__init__(
             memory_retriever=MemoryRetriever(config=memory_config, db_conn=db_conn, embedding_service=embedder),
             episodic_store=EpisodicMemory(memory_config, db_conn, embedder, agent_id)
@@ -579,7 +574,19 @@ class LongTermMemory(BaseModel):
         """
         The synchronous logic that builds EpisodicMemoryObject and calls store_episode(...).
         """
+        episode = self.build_episode(agent_id, task_query, steps, total_reward, strategy_update, metadata)
+        self.episodic_store.store_episode(episode)
 
+    def build_episode(
+        self,
+        agent_id: str,
+        task_query: str,
+        steps: List[MemoryObject],
+        total_reward: Optional[float] = None,
+        strategy_update: Optional[List[str]] = None,
+        metadata: Optional[Dict[str, Any]] = None
+    ) -> EpisodicMemoryObject:
+        """Build an EpisodicMemoryObject from the cognitive steps of one episode."""
         csteps = []
         for step in steps:
             raw_content = (step.content or "").strip()
@@ -601,7 +608,7 @@ class LongTermMemory(BaseModel):
                 )
             )
 
-        episode = EpisodicMemoryObject(
+        return EpisodicMemoryObject(
             agent_id=agent_id,
             task_query=task_query,
             cognitive_steps=csteps,
@@ -610,7 +617,6 @@ class LongTermMemory(BaseModel):
             metadata=metadata,
             created_at=datetime.now(timezone.utc)
         )
-        self.episodic_store.store_episode(episode)
 
 
     async def retrieve_episodic_memories(
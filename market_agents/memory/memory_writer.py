@@ -0,0 +1,130 @@
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from market_agents.memory.embedding import MemoryEmbedder
+from market_agents.memory.memory import (
+    CognitiveMemory,
+    EpisodicMemory,
+    EpisodicMemoryObject,
+    LongTermMemory,
+    MemoryObject,
+    ShortTermMemory,
+)
+
+
+class MemoryWriter:
+    """
+    Write-behind buffer for cognitive memory items and episodes.
+
+    Orchestrators add the memories produced by every agent in a cognitive phase and call
+    `flush()` at the phase boundary. A flush embeds everything that still needs an
+    embedding in one batched async call and writes all rows with multi-row INSERTs in a
+    single transaction, instead of one embedding call, INSERT and commit per agent and step.
+
+    When `max_pending` items are buffered, the next `add_*` call waits for a flush, which
+    bounds memory use if a phase produces more than expected.
+
+    Concurrent cohorts share the writer, so one flush may write items other tasks added.
+    If it fails, its items are put back at the front of the buffer and the error is raised
+    to the caller; every other contributor retries them in its own `flush()`, which raises
+    only if the retry fails too. Items are never dropped.
+    """
+
+    def __init__(self, embedder: Optional[MemoryEmbedder] = None, max_pending: int = 1000):
+        self.embedder = embedder
+        self.max_pending = max_pending
+        self._memories: List[Tuple[ShortTermMemory, MemoryObject]] = []
+        self._episodes: List[Tuple[EpisodicMemory, EpisodicMemoryObject]] = []
+        self._flush_lock = asyncio.Lock()
+
+    @property
+    def pending(self) -> int:
+        return len(self._memories) + len(self._episodes)
+
+    async def add_memory(self, short_term_memory: ShortTermMemory, memory_object: MemoryObject) -> None:
+        if self.pending >= self.max_pending:
+            await self.flush()
+        self._memories.append((short_term_memory, memory_object))
+
+    async def add_episode(self, long_term_memory: LongTermMemory, episode: EpisodicMemoryObject) -> None:
+        if self.pending >= self.max_pending:
+            await self.flush()
+        self._episodes.append((long_term_memory.episodic_store, episode))
+
+    async def flush(self) -> int:
+        """Write everything buffered so far, returning the number of rows written."""
+        async with self._flush_lock:
+            memories, self._memories = self._memories, []
+            episodes, self._episodes = self._episodes, []
+            if not memories and not episodes:
+                return 0
+            try:
+                await self._embed_missing(memories, episodes)
+                await asyncio.to_thread(self._write_batch, memories, episodes)
+            except BaseException:
+                # keep them for the next flush, ahead of anything added meanwhile
+                self._memories[:0] = memories
+                self._episodes[:0] = episodes
+                raise
+            for short_term_memory, memory_object in memories:
+                short_term_memory.items_cache.append(memory_object)
+            logging.debug(f"Flushed {len(memories)} memories and {len(episodes)} episodes")
+            return len(memories) + len(episodes)
+
+    def _write_batch(
+        self,
+        memories: List[Tuple[ShortTermMemory, MemoryObject]],
+        episodes: List[Tuple[EpisodicMemory, EpisodicMemoryObject]]
+    ) -> None:
+        memories_by_store: Dict[int, Tuple[CognitiveMemory, List[MemoryObject]]] = {}
+        for short_term_memory, memory_object in memories:
+            store = short_term_memory.cognitive_memory
+            memories_by_store.setdefault(id(store), (store, []))[1].append(memory_object)
+        episodes_by_store: Dict[int, Tuple[EpisodicMemory, List[EpisodicMemoryObject]]] = {}
+        for store, episode in episodes:
+            episodes_by_store.setdefault(id(store), (store, []))[1].append(episode)
+
+        # agents normally share one DatabaseConnection, so this is a single transaction
+        stores_by_db = defaultdict(list)
+        for store, items in memories_by_store.values():
+            stores_by_db[id(store.db)].append((store.db, store.cognitive_table, items, store.insert_cognitive_items))
+        for store, items in episodes_by_store.values():
+            stores_by_db[id(store.db)].append((store.db, store.episodic_table, items, store.insert_episodes))
+
+        for batches in stores_by_db.values():
+            db = batches[0][0]
+            with db.transaction() as cur:
+                for _, _, items, insert in batches:
+                    insert(cur, items)
+            rows_by_table = defaultdict(int)
+            for _, table, items, _ in batches:
+                rows_by_table[table] += len(items)
+            for table, rows in rows_by_table.items():
+                db.index_manager.note_rows(table, rows)
+
+    async def _embed_missing(
+        self,
+        memories: List[Tuple[ShortTermMemory, MemoryObject]],
+        episodes: List[Tuple[EpisodicMemory, EpisodicMemoryObject]]
+    ) -> None:
+        targets = []
+        texts = []
+        for _, memory_object in memories:
+            if not memory_object.embedding:
+                targets.append(memory_object)
+                texts.append(memory_object.content)
+        for _, episode in episodes:
+            if episode.embedding is None:
+                targets.append(episode)
+                texts.append(EpisodicMemory.embedding_text(episode))
+        if not texts:
+            return
+
+        embedder = self.embedder
+        if embedder is None:
+            embedder = memories[0][0].cognitive_memory.embedder if memories else episodes[0][0].embedder
+        embeddings = await embedder.aget_embeddings(texts)
+        for target, embedding in zip(targets, embeddings):
+            target.embedding = embedding
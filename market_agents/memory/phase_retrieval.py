@@ -0,0 +1,218 @@
+import asyncio
+import json
+from collections import defaultdict
+from typing import Dict, List, Optional, Sequence, Tuple
+from uuid import UUID
+
+from pydantic import BaseModel, Field
+
+from market_agents.memory.config import MarketMemoryConfig
+from market_agents.memory.embedding import MemoryEmbedder
+from market_agents.memory.memory import CognitiveStep, EpisodicMemoryObject, MemoryObject
+from market_agents.memory.setup_db import DatabaseConnection
+from market_agents.memory.vector_search import MemoryRetriever, RetrievedMemory
+
+
+class AgentRetrievalRequest(BaseModel):
+    agent_id: str
+    query: str
+    knowledge_base: Optional[str] = Field(default=None, description="Table prefix of the agent's knowledge base, if any")
+
+
+class AgentMemoryContext(BaseModel):
+    short_term_memories: List[MemoryObject] = Field(default_factory=list)
+    episodic_memories: List[EpisodicMemoryObject] = Field(default_factory=list)
+    documents: List[RetrievedMemory] = Field(default_factory=list)
+
+
+class PhaseMemoryRetriever:
+    """
+    Retrieves the perception context of every agent in a phase at once.
+
+    Instead of a recent-memory query, an embedding call and an episodic search per agent
+    (plus a knowledge base search), all queries are embedded in one batch and each kind of
+    lookup is a single statement over all agents: recent cognitive memories, episodic
+    top-k and one knowledge base search per distinct knowledge base. With the shared table
+    layout the per-agent top-k is a LATERAL join; per-agent tables are combined with
+    UNION ALL. All statements run on one pooled connection.
+
+    Results match `retrieve_recent_memories`, `retrieve_episodic_memories` and
+    `KnowledgeBaseAgent.retrieve`, except that recent memories are returned without their
+    embeddings, which perception prompts do not use.
+    """
+
+    def __init__(self, config: MarketMemoryConfig, db_conn: DatabaseConnection, embedder: MemoryEmbedder):
+        self.config = config
+        self.db = db_conn
+        self.embedder = embedder
+        self.retriever = MemoryRetriever(config=config, db_conn=db_conn, embedding_service=embedder)
+
+    async def retrieve(
+        self,
+        requests: Sequence[AgentRetrievalRequest],
+        recent_limit: int = 5,
+        episodic_top_k: int = 2,
+        knowledge_top_k: Optional[int] = None,
+        probes: Optional[int] = None,
+        ef_search: Optional[int] = None
+    ) -> Dict[str, AgentMemoryContext]:
+        if not requests:
+            return {}
+        embeddings = await self.embedder.aget_embeddings([request.query for request in requests])
+        return await asyncio.to_thread(
+            self._retrieve_sync, requests, embeddings, recent_limit, episodic_top_k,
+            knowledge_top_k or self.config.top_k, probes, ef_search
+        )
+
+    def _retrieve_sync(
+        self,
+        requests: Sequence[AgentRetrievalRequest],
+        embeddings: List[List[float]],
+        recent_limit: int,
+        episodic_top_k: int,
+        knowledge_top_k: int,
+        probes: Optional[int],
+        ef_search: Optional[int]
+    ) -> Dict[str, AgentMemoryContext]:
+        # agents in the same environment usually share a query, so each distinct vector is sent once
+        vectors: List[str] = []
+        vector_index: Dict[str, int] = {}
+        query_index = []
+        for embedding in embeddings:
+            vector = "[" + ",".join(map(str, embedding)) + "]"
+            if vector not in vector_index:
+                vectors.append(vector)
+                vector_index[vector] = len(vectors)
+            query_index.append(vector_index[vector])
+
+        agent_ids = [request.agent_id for request in requests]
+        contexts = {agent_id: AgentMemoryContext() for agent_id in agent_ids}
+
+        with self.db.transaction() as cur:
+            self.db.index_manager.apply_search_settings(cur, probes, ef_search)
+            for agent_id, memory in self._recent_memories(cur, agent_ids, recent_limit):
+                contexts[agent_id].short_term_memories.append(memory)
+            for agent_id, episode in self._episodic_memories(cur, agent_ids, vectors, query_index, episodic_top_k):
+                contexts[agent_id].episodic_memories.append(episode)
+
+            agents_by_kb: Dict[str, List[Tuple[str, int]]] = defaultdict(list)
+            for request, idx in zip(requests, query_index):
+                if request.knowledge_base:
+                    agents_by_kb[request.knowledge_base].append((request.agent_id, idx))
+            for table_prefix, kb_agents in agents_by_kb.items():
+                documents = self._documents(cur, table_prefix, vectors, {idx for _, idx in kb_agents}, knowledge_top_k)
+                for agent_id, idx in kb_agents:
+                    contexts[agent_id].documents = list(documents.get(idx, []))
+
+        for context in contexts.values():
+            context.short_term_memories.sort(key=lambda memory: memory.created_at)
+            context.episodic_memories.sort(key=lambda episode: episode.similarity, reverse=True)
+        return contexts
+
+    def _recent_memories(self, cur, agent_ids: List[str], limit: int):
+        columns = "memory_id, cognitive_step, content, created_at, metadata"
+        if self.db.shared_memory_tables:
+            cur.execute(f"""
+                SELECT a.agent_id, m.*
+                FROM unnest(%s::text[]) AS a(agent_id)
+                CROSS JOIN LATERAL (
+                    SELECT {columns}
+                    FROM {self.db.SHARED_COGNITIVE_TABLE} c
+                    WHERE c.agent_id = a.agent_id
+                    ORDER BY c.created_at DESC
+                    LIMIT %s
+                ) m;
+            """, (agent_ids, limit))
+        else:
+            branches, params = [], []
+            for agent_id in agent_ids:
+                branches.append(f"(SELECT %s AS agent_id, {columns} FROM {self.db.cognitive_table(agent_id)} ORDER BY created_at DESC LIMIT %s)")
+                params += [agent_id, limit]
+            cur.execute(" UNION ALL ".join(branches), params)
+
+        for agent_id, mem_id, step, content, created_at, meta in cur.fetchall():
+            yield agent_id, MemoryObject(
+                memory_id=UUID(str(mem_id)),
+                agent_id=agent_id,
+                cognitive_step=step,
+                content=content,
+                created_at=created_at,
+                metadata=meta if meta else {}
+            )
+
+    def _episodic_memories(self, cur, agent_ids: List[str], vectors: List[str], query_index: List[int], top_k: int):
+        columns = "memory_id, task_query, cognitive_steps, total_reward, strategy_update, metadata, created_at"
+        query_vectors = """
+            WITH q AS MATERIALIZED (
+                SELECT v::vector AS embedding, i AS query_idx
+                FROM unnest(%s::text[]) WITH ORDINALITY AS u(v, i)
+            )
+        """
+        if self.db.shared_memory_tables:
+            cur.execute(query_vectors + f"""
+                SELECT a.agent_id, m.*
+                FROM unnest(%s::text[], %s::bigint[]) AS a(agent_id, query_idx)
+                JOIN q USING (query_idx)
+                CROSS JOIN LATERAL (
+                    SELECT {columns}, 1 - (e.embedding <=> q.embedding) AS similarity
+                    FROM {self.db.SHARED_EPISODIC_TABLE} e
+                    WHERE e.agent_id = a.agent_id
+                    ORDER BY e.embedding <=> q.embedding
+                    LIMIT %s
+                ) m;
+            """, (vectors, agent_ids, query_index, top_k))
+        else:
+            branches, params = [], [vectors]
+            for agent_id, idx in zip(agent_ids, query_index):
+                branches.append(f"""
+                    (SELECT %s AS agent_id, {columns}, 1 - (e.embedding <=> q.embedding) AS similarity
+                     FROM {self.db.episodic_table(agent_id)} e, q
+                     WHERE q.query_idx = %s
+                     ORDER BY e.embedding <=> q.embedding
+                     LIMIT %s)""")
+                params += [agent_id, idx, top_k]
+            cur.execute(query_vectors + " UNION ALL ".join(branches), params)
+
+        for (agent_id, mem_id, task_query, steps_json, total_reward, strategy_update,
+             meta, created_at, sim) in cur.fetchall():
+            if isinstance(steps_json, str):
+                steps_json = json.loads(steps_json)
+            yield agent_id, EpisodicMemoryObject(
+                memory_id=UUID(str(mem_id)),
+                agent_id=agent_id,
+                task_query=task_query or "",
+                cognitive_steps=[CognitiveStep(**step) for step in steps_json or []],
+                total_reward=total_reward,
+                strategy_update=strategy_update,
+                created_at=created_at,
+                metadata=meta or {},
+                similarity=round(sim, 2)
+            )
+
+    def _documents(self, cur, table_prefix: str, vectors: List[str], indexes: set, top_k: int) -> Dict[int, List[RetrievedMemory]]:
+        indexes = sorted(indexes)
+        cur.execute(f"""
+            SELECT q.query_idx, r.text, r.start_pos, r.end_pos, r.content, r.similarity
+            FROM unnest(%s::text[], %s::bigint[]) AS q(v, query_idx)
+            CROSS JOIN LATERAL (
+                SELECT * FROM (
+                    SELECT DISTINCT ON (c.text)
+                        c.text, c.start_pos, c.end_pos, k.content,
+                        (1 - (c.embedding <=> q.v::vector)) AS similarity
+                    FROM {table_prefix}_knowledge_chunks c
+                    JOIN {table_prefix}_knowledge_objects k ON c.knowledge_id = k.knowledge_id
+                    WHERE (1 - (c.embedding <=> q.v::vector)) >= %s
+                    ORDER BY c.text, similarity DESC
+                ) ranked_chunks
+                ORDER BY similarity DESC
+                LIMIT %s
+            ) r;
+        """, ([vectors[idx - 1] for idx in indexes], indexes, self.config.similarity_threshold, top_k))
+
+        documents: Dict[int, List[RetrievedMemory]] = defaultdict(list)
+        for idx, text, start_pos, end_pos, full_content, sim in cur.fetchall():
+            context = self.retriever._get_context(start_pos, end_pos, full_content)
+            documents[idx].append(RetrievedMemory(text=text, similarity=sim, context=context))
+        for results in documents.values():
+            results.sort(key=lambda document: document.similarity, reverse=True)
+        return documents
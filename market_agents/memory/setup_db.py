@@ -1,39 +1,151 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+
 import psycopg2
+from psycopg2 import pool
 from psycopg2.errors import DuplicateDatabase
 
+from market_agents.memory.index_manager import VectorIndexManager
+
 
 class DatabaseConnection:
+    """
+    Postgres access for the memory subsystem.
+
+    Work is done through `transaction()`, which checks a connection out of a thread-safe
+    pool, yields its own cursor and commits or rolls back when the block exits. Memory
+    operations for many agents run on executor threads, so each gets a separate connection
+    instead of interleaving statements on one shared cursor. When the pool is exhausted,
+    callers wait for a connection instead of failing.
+
+    Connections that have been idle longer than `pool_health_check_seconds` are checked
+    with `SELECT 1` on checkout and replaced if they are broken. `conn` / `cursor` and
+    `connect()` keep a single dedicated connection, opened on first use, for existing callers
+    that use it directly.
+
+    With `table_layout: shared`, agent memories live in one cognitive and one episodic table
+    keyed by `agent_id` and hash partitioned on it, instead of two tables per agent.
+    `cognitive_table()`, `episodic_table()` and `agent_scope()` resolve names and filters
+    for either layout.
+
+    Vector indexes are not created with the tables; `index_manager` builds them once a
+    table has enough rows, see `VectorIndexManager`.
+    """
+
+    SHARED_COGNITIVE_TABLE = "agent_cognitive_memory"
+    SHARED_EPISODIC_TABLE = "agent_episodic_memory"
+
     def __init__(self, config):
         self.config = config
-        self.conn = None
-        self.cursor = None
+        self._conn = None
+        self._cursor = None
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._pool_slots = threading.BoundedSemaphore(self.config.pool_max_size)
+        self._last_used: Dict[int, float] = {}
+        self._shared_tables_lock = threading.Lock()
+        self._shared_tables_ready = False
+        self.index_manager = VectorIndexManager(self, config)
         self._ensure_database_exists()
 
+    def _connection_kwargs(self) -> dict:
+        return dict(
+            dbname=self.config.dbname,
+            user=self.config.user,
+            password=self.config.password,
+            host=self.config.host,
+            port=self.config.port,
+            keepalives=1,
+            keepalives_idle=30,
+            keepalives_interval=10,
+            keepalives_count=5,
+            options=(
+                f"-c statement_timeout={self.config.statement_timeout} "
+                f"-c ivfflat.probes={self.config.ivfflat_probes} "
+                f"-c hnsw.ef_search={self.config.hnsw_ef_search}"
+            )
+        )
+
+    @property
+    def conn(self):
+        self.connect()
+        return self._conn
+
+    @property
+    def cursor(self):
+        self.connect()
+        return self._cursor
+
     def connect(self):
         """Establish a new connection if needed"""
-        if self.conn is None or (hasattr(self.conn, 'closed') and self.conn.closed):
-            self.conn = psycopg2.connect(
-                dbname=self.config.dbname,
-                user=self.config.user,
-                password=self.config.password,
-                host=self.config.host,
-                port=self.config.port,
-                keepalives=1,
-                keepalives_idle=30,
-                keepalives_interval=10,
-                keepalives_count=5
-            )
-            self.conn.set_session(autocommit=False)
-            self.cursor = self.conn.cursor()
-            
-            self.cursor.execute("SET statement_timeout = '60s'")
+        if self._conn is None or self._conn.closed:
+            self._conn = psycopg2.connect(**self._connection_kwargs())
+            self._conn.set_session(autocommit=False)
+            self._cursor = self._conn.cursor()
+
+    def _get_pool(self) -> pool.ThreadedConnectionPool:
+        if self._pool is None or self._pool.closed:
+            with self._pool_lock:
+                if self._pool is None or self._pool.closed:
+                    self._pool = pool.ThreadedConnectionPool(
+                        self.config.pool_min_size,
+                        self.config.pool_max_size,
+                        **self._connection_kwargs()
+                    )
+        return self._pool
+
+    def _checkout(self):
+        db_pool = self._get_pool()
+        conn = db_pool.getconn()
+        if conn.closed:
+            db_pool.putconn(conn, close=True)
+            return db_pool.getconn()
+        last_used = self._last_used.get(id(conn))
+        if last_used is not None and time.monotonic() - last_used > self.config.pool_health_check_seconds:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT 1")
+                conn.rollback()
+            except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                logging.warning("Discarding broken pooled database connection")
+                db_pool.putconn(conn, close=True)
+                conn = db_pool.getconn()
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """Yield a cursor on a pooled connection, committing on success and rolling back on error."""
+        self._pool_slots.acquire()
+        try:
+            conn = self._checkout()
+            broken = False
+            try:
+                with conn.cursor() as cur:
+                    yield cur
+                conn.commit()
+            except BaseException as e:
+                broken = conn.closed or isinstance(e, (psycopg2.OperationalError, psycopg2.InterfaceError))
+                if not conn.closed:
+                    conn.rollback()
+                raise
+            finally:
+                self._last_used[id(conn)] = time.monotonic()
+                self._get_pool().putconn(conn, close=broken)
+        finally:
+            self._pool_slots.release()
 
     def close(self):
-        """Close the database connection."""
-        if self.cursor:
-            self.cursor.close()
-        if self.conn:
-            self.conn.close()
+        """Close the dedicated connection and every pooled connection."""
+        if self._cursor is not None:
+            self._cursor.close()
+        if self._conn is not None:
+            self._conn.close()
+        if self._pool is not None and not self._pool.closed:
+            self._pool.closeall()
+        self._last_used.clear()
 
     def _ensure_database_exists(self):
         """Ensure the database exists, creating it if necessary."""
@@ -57,19 +169,19 @@ class DatabaseConnection:
                 temp_conn.close()
 
             # Connect to the new database and create pgvector extension
-            self.connect()
-            self.cursor.execute("CREATE EXTENSION IF NOT EXISTS vector")
-            self.conn.commit()
+            with self.transaction() as cur:
+                cur.execute("CREATE EXTENSION IF NOT EXISTS vector")
 
         except Exception as e:
             print(f"Error ensuring database exists: {e}")
             raise
 
     def ensure_connection(self):
-        """Check connection and reconnect if needed"""
+        """Check the dedicated connection and reconnect if needed"""
         try:
             self.cursor.execute("SELECT 1")
-        except (psycopg2.OperationalError, psycopg2.InterfaceError, AttributeError):
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            self._conn = None
             self.connect()
 
     def _sanitize_table_name(self, name: str) -> str:
@@ -78,68 +190,123 @@ class DatabaseConnection:
 
     def create_knowledge_base_tables(self, base_name: str):
         """Create separate tables for a specific knowledge base."""
-        self.connect()
         knowledge_objects_table = f"{base_name}_knowledge_objects"
         knowledge_chunks_table = f"{base_name}_knowledge_chunks"
 
-        self.cursor.execute(f"""
-            CREATE TABLE IF NOT EXISTS {knowledge_objects_table} (
-                knowledge_id UUID PRIMARY KEY,
-                content TEXT,
-                created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
-                metadata JSONB DEFAULT '{{}}'::jsonb
-            );
-        """)
-
-        self.cursor.execute(f"""
-            CREATE TABLE IF NOT EXISTS {knowledge_chunks_table} (
-                id SERIAL PRIMARY KEY,
-                knowledge_id UUID REFERENCES {knowledge_objects_table}(knowledge_id),
-                text TEXT,
-                start_pos INTEGER,
-                end_pos INTEGER,
-                embedding vector({self.config.vector_dim}),
-                created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
-            );
-        """)
-
-        # Add vector index for the chunks
-        self.cursor.execute(f"""
-            CREATE INDEX IF NOT EXISTS {base_name}_chunks_index
-            ON {knowledge_chunks_table} USING ivfflat (embedding vector_cosine_ops)
-            WITH (lists = {self.config.lists});
-        """)
-
-        self.conn.commit()
+        with self.transaction() as cur:
+            cur.execute(f"""
+                CREATE TABLE IF NOT EXISTS {knowledge_objects_table} (
+                    knowledge_id UUID PRIMARY KEY,
+                    content TEXT,
+                    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+                    metadata JSONB DEFAULT '{{}}'::jsonb
+                );
+            """)
+
+            cur.execute(f"""
+                CREATE TABLE IF NOT EXISTS {knowledge_chunks_table} (
+                    id SERIAL PRIMARY KEY,
+                    knowledge_id UUID REFERENCES {knowledge_objects_table}(knowledge_id),
+                    text TEXT,
+                    start_pos INTEGER,
+                    end_pos INTEGER,
+                    embedding vector({self.config.vector_dim}),
+                    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+                );
+            """)
+
+    @property
+    def shared_memory_tables(self) -> bool:
+        return getattr(self.config, "table_layout", "per_agent") == "shared"
+
+    def cognitive_table(self, agent_id: str) -> str:
+        if self.shared_memory_tables:
+            return self.SHARED_COGNITIVE_TABLE
+        return f"agent_{self._sanitize_table_name(agent_id)}_cognitive"
+
+    def episodic_table(self, agent_id: str) -> str:
+        if self.shared_memory_tables:
+            return self.SHARED_EPISODIC_TABLE
+        return f"agent_{self._sanitize_table_name(agent_id)}_episodic"
+
+    def agent_scope(self, agent_id: str) -> Tuple[str, List[str]]:
+        """SQL condition and params restricting a memory table to one agent's rows."""
+        if self.shared_memory_tables:
+            return "agent_id = %s", [agent_id]
+        return "TRUE", []
+
+    def create_shared_memory_tables(self):
+        """
+        Create the shared cognitive and episodic tables, hash partitioned on agent_id.
+        Vector indexes are left to `index_manager` once rows exist.
+        """
+        if self._shared_tables_ready:
+            return
+        with self._shared_tables_lock:
+            if self._shared_tables_ready:
+                return
+            partitions = self.config.table_partitions
+            with self.transaction() as cur:
+                cur.execute(f"""
+                    CREATE TABLE IF NOT EXISTS {self.SHARED_COGNITIVE_TABLE} (
+                        agent_id TEXT NOT NULL,
+                        memory_id UUID NOT NULL,
+                        cognitive_step TEXT,
+                        content TEXT,
+                        embedding vector({self.config.vector_dim}),
+                        created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+                        metadata JSONB DEFAULT '{{}}'::jsonb,
+                        PRIMARY KEY (agent_id, memory_id)
+                    ) PARTITION BY HASH (agent_id);
+                """)
+                cur.execute(f"""
+                    CREATE TABLE IF NOT EXISTS {self.SHARED_EPISODIC_TABLE} (
+                        agent_id TEXT NOT NULL,
+                        memory_id UUID NOT NULL,
+                        task_query TEXT,
+                        cognitive_steps JSONB,
+                        total_reward DOUBLE PRECISION,
+                        strategy_update JSONB,
+                        embedding vector({self.config.vector_dim}),
+                        created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+                        metadata JSONB DEFAULT '{{}}'::jsonb,
+                        PRIMARY KEY (agent_id, memory_id)
+                    ) PARTITION BY HASH (agent_id);
+                """)
+                for table in (self.SHARED_COGNITIVE_TABLE, self.SHARED_EPISODIC_TABLE):
+                    for remainder in range(partitions):
+                        cur.execute(f"""
+                            CREATE TABLE IF NOT EXISTS {table}_p{remainder}
+                            PARTITION OF {table}
+                            FOR VALUES WITH (MODULUS {partitions}, REMAINDER {remainder});
+                        """)
+                    # recency reads filter on agent and order by time
+                    cur.execute(f"CREATE INDEX IF NOT EXISTS {table}_agent_created_index ON {table} (agent_id, created_at);")
+            self._shared_tables_ready = True
 
     def create_agent_cognitive_memory_table(self, agent_id: str):
         """
         Create a separate cognitive memory table for a specific agent.
         This can store single-step or short-horizon items (akin to 'STM').
+        With the shared layout, makes sure the shared tables exist instead.
         """
-        self.connect()
-        sanitized_agent_id = self._sanitize_table_name(agent_id)
-        cognitive_table = f"agent_{sanitized_agent_id}_cognitive"
-
-        self.cursor.execute(f"""
-            CREATE TABLE IF NOT EXISTS {cognitive_table} (
-                memory_id UUID PRIMARY KEY,
-                cognitive_step TEXT,
-                content TEXT,
-                embedding vector({self.config.vector_dim}),
-                created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
-                metadata JSONB DEFAULT '{{}}'::jsonb
-            );
-        """)
-
-        index_name = f"agent_{sanitized_agent_id}_cognitive_index"
-        self.cursor.execute(f"""
-            CREATE INDEX IF NOT EXISTS {index_name}
-            ON {cognitive_table} USING ivfflat (embedding vector_cosine_ops)
-            WITH (lists = {self.config.lists});
-        """)
-
-        self.conn.commit()
+        if self.shared_memory_tables:
+            self.create_shared_memory_tables()
+            return
+
+        cognitive_table = self.cognitive_table(agent_id)
+
+        with self.transaction() as cur:
+            cur.execute(f"""
+                CREATE TABLE IF NOT EXISTS {cognitive_table} (
+                    memory_id UUID PRIMARY KEY,
+                    cognitive_step TEXT,
+                    content TEXT,
+                    embedding vector({self.config.vector_dim}),
+                    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+                    metadata JSONB DEFAULT '{{}}'::jsonb
+                );
+            """)
 
     def init_agent_cognitive_memory(self, agent_ids: list):
         """Initialize cognitive memory tables for multiple agents."""
@@ -148,47 +315,34 @@ class DatabaseConnection:
 
     def clear_agent_cognitive_memory(self, agent_id: str):
         """Clear all cognitive memory entries for a specific agent."""
-        self.connect()
-        sanitized_agent_id = self._sanitize_table_name(agent_id)
-        cognitive_table = f"agent_{sanitized_agent_id}_cognitive"
-        try:
-            self.cursor.execute(f"TRUNCATE TABLE {cognitive_table};")
-            self.conn.commit()
-        except Exception as e:
-            self.conn.rollback()
-            raise e
+        self._clear_agent_table(self.cognitive_table(agent_id), agent_id)
 
     def create_agent_episodic_memory_table(self, agent_id: str):
         """
         Create a separate episodic memory table for a specific agent.
         Each row will store an entire 'episode' (cognitive_steps in JSON),
         plus other relevant episodic info (task_query, total_reward, etc.).
+        With the shared layout, makes sure the shared tables exist instead.
         """
-        self.connect()
-        sanitized_agent_id = self._sanitize_table_name(agent_id)
-        episodic_table = f"agent_{sanitized_agent_id}_episodic"
-
-        self.cursor.execute(f"""
-            CREATE TABLE IF NOT EXISTS {episodic_table} (
-                memory_id UUID PRIMARY KEY,
-                task_query TEXT,
-                cognitive_steps JSONB,
-                total_reward DOUBLE PRECISION,
-                strategy_update JSONB,
-                embedding vector({self.config.vector_dim}),
-                created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
-                metadata JSONB DEFAULT '{{}}'::jsonb
-            );
-        """)
-
-        index_name = f"agent_{sanitized_agent_id}_episodic_index"
-        self.cursor.execute(f"""
-            CREATE INDEX IF NOT EXISTS {index_name}
-            ON {episodic_table} USING ivfflat (embedding vector_cosine_ops)
-            WITH (lists = {self.config.lists});
-        """)
-
-        self.conn.commit()
+        if self.shared_memory_tables:
+            self.create_shared_memory_tables()
+            return
+
+        episodic_table = self.episodic_table(agent_id)
+
+        with self.transaction() as cur:
+            cur.execute(f"""
+                CREATE TABLE IF NOT EXISTS {episodic_table} (
+                    memory_id UUID PRIMARY KEY,
+                    task_query TEXT,
+                    cognitive_steps JSONB,
+                    total_reward DOUBLE PRECISION,
+                    strategy_update JSONB,
+                    embedding vector({self.config.vector_dim}),
+                    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+                    metadata JSONB DEFAULT '{{}}'::jsonb
+                );
+            """)
 
     def init_agent_episodic_memory(self, agent_ids: list):
         """Initialize episodic memory tables for multiple agents."""
@@ -197,12 +351,11 @@ class DatabaseConnection:
 
     def clear_agent_episodic_memory(self, agent_id: str):
         """Clear all episodic (long-horizon) memory entries for a specific agent."""
-        self.connect()
-        sanitized_agent_id = self._sanitize_table_name(agent_id)
-        episodic_table = f"agent_{sanitized_agent_id}_episodic"
-        try:
-            self.cursor.execute(f"TRUNCATE TABLE {episodic_table};")
-            self.conn.commit()
-        except Exception as e:
-            self.conn.rollback()
-            raise e
\ No newline at end of file
+        self._clear_agent_table(self.episodic_table(agent_id), agent_id)
+
+    def _clear_agent_table(self, table: str, agent_id: str):
+        with self.transaction() as cur:
+            if self.shared_memory_tables:
+                cur.execute(f"DELETE FROM {table} WHERE agent_id = %s;", (agent_id,))
+            else:
+                cur.execute(f"TRUNCATE TABLE {table};")
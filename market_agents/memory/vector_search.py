@@ -1,5 +1,5 @@
 import json
-from typing import List
+from typing import List, Optional
 from pydantic import BaseModel
 
 class RetrievedMemory(BaseModel):
@@ -12,6 +12,7 @@ class MemoryRetriever:
     """
     MemoryRetriever provides methods to search stored documents or agent memories
     based on embedding similarity, dynamically referencing tables.
+    `probes` / `ef_search` override the configured ivfflat / HNSW recall for one search.
     """
     def __init__(self, config, db_conn, embedding_service):
         self.config = config
@@ -23,100 +24,104 @@ class MemoryRetriever:
         """Sanitize agent ID for table names"""
         return agent_id.replace('-', '_')
 
-    def search_knowledge_base(self, table_prefix: str, query: str, top_k: int = None) -> List[RetrievedMemory]:
+    def search_knowledge_base(self, table_prefix: str, query: str, top_k: int = None,
+                              probes: Optional[int] = None, ef_search: Optional[int] = None) -> List[RetrievedMemory]:
         """
         Search a specific knowledge base for relevant content based on semantic similarity.
         """
         try:
-            self.db.conn.rollback()
-            self.db.ensure_connection()
-            
             query_embedding = self.embedding_service.get_embeddings(query)
             top_k = top_k or self.config.top_k
 
             knowledge_chunks_table = f"{table_prefix}_knowledge_chunks"
             knowledge_objects_table = f"{table_prefix}_knowledge_objects"
 
-            self.db.cursor.execute(f"""
-                WITH ranked_chunks AS (
-                    SELECT DISTINCT ON (c.text)
-                        c.id, c.text, c.start_pos, c.end_pos, k.content,
-                        (1 - (c.embedding <=> %s::vector)) AS similarity
-                    FROM {knowledge_chunks_table} c
-                    JOIN {knowledge_objects_table} k ON c.knowledge_id = k.knowledge_id
-                    WHERE (1 - (c.embedding <=> %s::vector)) >= %s
-                    ORDER BY c.text, similarity DESC
-                )
-                SELECT * FROM ranked_chunks
-                ORDER BY similarity DESC
-                LIMIT %s;
-            """, (query_embedding, query_embedding, self.config.similarity_threshold, top_k))
+            with self.db.transaction() as cur:
+                self.db.index_manager.apply_search_settings(cur, probes, ef_search)
+                cur.execute(f"""
+                    WITH ranked_chunks AS (
+                        SELECT DISTINCT ON (c.text)
+                            c.id, c.text, c.start_pos, c.end_pos, k.content,
+                            (1 - (c.embedding <=> %s::vector)) AS similarity
+                        FROM {knowledge_chunks_table} c
+                        JOIN {knowledge_objects_table} k ON c.knowledge_id = k.knowledge_id
+                        WHERE (1 - (c.embedding <=> %s::vector)) >= %s
+                        ORDER BY c.text, similarity DESC
+                    )
+                    SELECT * FROM ranked_chunks
+                    ORDER BY similarity DESC
+                    LIMIT %s;
+                """, (query_embedding, query_embedding, self.config.similarity_threshold, top_k))
+                rows = cur.fetchall()
 
             results = []
-            rows = self.db.cursor.fetchall()
             for row in rows:
                 _, text, start_pos, end_pos, full_content, sim = row
                 self.full_text = full_content
                 context = self._get_context(start_pos, end_pos, full_content)
                 results.append(RetrievedMemory(text=text, similarity=sim, context=context))
 
-            self.db.conn.commit()
             return results
             
         except Exception as e:
-            self.db.conn.rollback()
             print(f"Error during knowledge base search: {str(e)}")
             raise
 
-    def search_agent_cognitive_memory(self, agent_id: str, query: str, top_k: int = None) -> List[RetrievedMemory]:
+    def search_agent_cognitive_memory(self, agent_id: str, query: str, top_k: int = None,
+                                      probes: Optional[int] = None, ef_search: Optional[int] = None) -> List[RetrievedMemory]:
         """Search a specific agent's cognitive memory"""
-        self.db.connect()
         query_embedding = self.embedding_service.get_embeddings(query)
         top_k = top_k or self.config.top_k
         
-        safe_id = self._sanitize_id(agent_id)
-        agent_cognitive_table = f"agent_{safe_id}_cognitive"
-
-        self.db.cursor.execute(f"""
-            SELECT content,
-                   (1 - (embedding <=> %s::vector)) AS similarity
-            FROM {agent_cognitive_table}
-            ORDER BY similarity DESC
-            LIMIT %s;
-        """, (query_embedding, top_k))
+        agent_cognitive_table = self.db.cognitive_table(agent_id)
+        scope, scope_params = self.db.agent_scope(agent_id)
+
+        with self.db.transaction() as cur:
+            self.db.index_manager.apply_search_settings(cur, probes, ef_search)
+            cur.execute(f"""
+                SELECT content,
+                       (1 - (embedding <=> %s::vector)) AS similarity
+                FROM {agent_cognitive_table}
+                WHERE {scope}
+                ORDER BY embedding <=> %s::vector
+                LIMIT %s;
+            """, (query_embedding, *scope_params, query_embedding, top_k))
+            rows = cur.fetchall()
 
         results = []
-        rows = self.db.cursor.fetchall()
         for row in rows:
             content, sim = row
             results.append(RetrievedMemory(text=content, similarity=sim))
         return results
 
-    def search_agent_episodic_memory(self, agent_id: str, query: str, top_k: int = None) -> List[RetrievedMemory]:
+    def search_agent_episodic_memory(self, agent_id: str, query: str, top_k: int = None,
+                                     probes: Optional[int] = None, ef_search: Optional[int] = None) -> List[RetrievedMemory]:
         """Search an agent's episodic memory"""
-        self.db.connect()
         query_embedding = self.embedding_service.get_embeddings(query)
         top_k = top_k or self.config.top_k
 
-        safe_id = self._sanitize_id(agent_id)
-        agent_episodic_table = f"agent_{safe_id}_episodic"
-
-        self.db.cursor.execute(f"""
-            SELECT 
-                memory_id, 
-                task_query, 
-                cognitive_steps,
-                total_reward, 
-                strategy_update, 
-                metadata,
-                created_at,
-                (1 - (embedding <=> %s::vector)) AS similarity
-            FROM {agent_episodic_table}
-            ORDER BY similarity DESC
-            LIMIT %s;
-        """, (query_embedding, top_k))
-
-        rows = self.db.cursor.fetchall()
+        agent_episodic_table = self.db.episodic_table(agent_id)
+        scope, scope_params = self.db.agent_scope(agent_id)
+
+        with self.db.transaction() as cur:
+            self.db.index_manager.apply_search_settings(cur, probes, ef_search)
+            cur.execute(f"""
+                SELECT 
+                    memory_id, 
+                    task_query, 
+                    cognitive_steps,
+                    total_reward, 
+                    strategy_update, 
+                    metadata,
+                    created_at,
+                    (1 - (embedding <=> %s::vector)) AS similarity
+                FROM {agent_episodic_table}
+                WHERE {scope}
+                ORDER BY embedding <=> %s::vector
+                LIMIT %s;
+            """, (query_embedding, *scope_params, query_embedding, top_k))
+            rows = cur.fetchall()
+
         results = []
         for (mem_id, task_query, steps_json, total_reward, strategy_update, meta, created_at, sim) in rows:
             content_dict = {
@@ -4,16 +4,32 @@ import logging
 from typing import Any, List
 from market_agents.agents.market_agent import MarketAgent
 from market_agents.memory.memory import MemoryObject, BaseMemory
+from market_agents.memory.memory_writer import MemoryWriter
+from market_agents.memory.phase_retrieval import PhaseMemoryRetriever
+from market_agents.orchestrators.persistence import SimulationPersistenceService
 from market_agents.orchestrators.logger_utils import log_perception, log_persona, log_reflection
 
 
 class AgentCognitiveProcessor:
-    def __init__(self, ai_utils, data_inserter, logger: logging.Logger, tool_mode=False):
+    def __init__(self, ai_utils, data_inserter, logger: logging.Logger, tool_mode=False, memory_writer: MemoryWriter = None,
+                 phase_retriever: PhaseMemoryRetriever = None, persistence: SimulationPersistenceService = None):
         self.ai_utils = ai_utils
         self.data_inserter = data_inserter
+        # AI requests are written by a background worker, off the event loop
+        self.persistence = persistence or SimulationPersistenceService.shared(data_inserter)
         self.logger = logger
         self.tool_mode = tool_mode
         self.episode_steps = {}
+        # memories of a whole phase are written together when the phase ends
+        self.memory_writer = memory_writer or MemoryWriter()
+        # perception context for all agents of a phase is fetched in one batch
+        self.phase_retriever = phase_retriever
+
+    def _get_phase_retriever(self, agents: List[MarketAgent]) -> PhaseMemoryRetriever:
+        if self.phase_retriever is None:
+            retriever = agents[0].long_term_memory.memory_retriever
+            self.phase_retriever = PhaseMemoryRetriever(retriever.config, retriever.db, retriever.embedding_service)
+        return self.phase_retriever
 
     def _get_safe_id(self, agent_id: str) -> str:
         """Get sanitized agent ID consistent with memory storage"""
@@ -49,13 +65,24 @@ class AgentCognitiveProcessor:
             return str(content)
 
     async def run_parallel_perceive(self, agents: List[MarketAgent], environment_name: str) -> List[Any]:
+        memory_contexts = {}
+        if agents:
+            memory_contexts = await self._get_phase_retriever(agents).retrieve(
+                [agent.retrieval_request(environment_name) for agent in agents]
+            )
+
         perception_prompts = []
         for agent in agents:
-            perception_prompt = await agent.perceive(environment_name, return_prompt=True, structured_tool=self.tool_mode)
+            perception_prompt = await agent.perceive(
+                environment_name,
+                return_prompt=True,
+                structured_tool=self.tool_mode,
+                memory_context=memory_contexts.get(agent.id)
+            )
             perception_prompts.append(perception_prompt)
         
         perceptions = await self.ai_utils.run_parallel_ai_completion(perception_prompts, update_history=True)
-        self.data_inserter.insert_ai_requests(self.ai_utils.get_all_requests())
+        await self.persistence.submit_ai_requests(self.ai_utils.get_all_requests())
         
         # Log personas and perceptions, and store in memory
         for agent, perception in zip(agents, perceptions):
@@ -75,10 +102,11 @@ class AgentCognitiveProcessor:
                 metadata={"environment": environment_name},
                 created_at=datetime.now(timezone.utc)
             )
-            await agent.short_term_memory.store_memory(memory_obj)
+            await self.memory_writer.add_memory(agent.short_term_memory, memory_obj)
             self.episode_steps[safe_id].append(memory_obj)
             agent.last_perception = perception_content
 
+        await self.memory_writer.flush()
         return perceptions
 
     async def run_parallel_action(self, agents: List[MarketAgent], environment_name: str) -> List[Any]:
@@ -88,7 +116,7 @@ class AgentCognitiveProcessor:
             action_prompts.append(action_prompt)
             
         actions = await self.ai_utils.run_parallel_ai_completion(action_prompts, update_history=True)
-        self.data_inserter.insert_ai_requests(self.ai_utils.get_all_requests())
+        await self.persistence.submit_ai_requests(self.ai_utils.get_all_requests())
         
         # Store actions in memory
         for agent, action in zip(agents, actions):
@@ -104,9 +132,10 @@ class AgentCognitiveProcessor:
                 metadata={"environment": environment_name},
                 created_at=datetime.now(timezone.utc)
             )
-            await agent.short_term_memory.store_memory(memory_obj)
+            await self.memory_writer.add_memory(agent.short_term_memory, memory_obj)
             self.episode_steps[safe_id].append(memory_obj)
-            
+
+        await self.memory_writer.flush()
         return actions
 
     async def run_parallel_reflect(self, agents: List[MarketAgent], environment_name: str) -> None:
@@ -121,7 +150,7 @@ class AgentCognitiveProcessor:
                 
         if reflection_prompts:
             reflections = await self.ai_utils.run_parallel_ai_completion(reflection_prompts, update_history=True)
-            self.data_inserter.insert_ai_requests(self.ai_utils.get_all_requests())
+            await self.persistence.submit_ai_requests(self.ai_utils.get_all_requests())
             
             for agent, reflection in zip(agents_with_observations, reflections):
                 safe_id = self._get_safe_id(agent.id)
@@ -178,7 +207,7 @@ class AgentCognitiveProcessor:
                         },
                         created_at=datetime.now(timezone.utc)
                     )
-                    await agent.short_term_memory.store_memory(memory_obj)
+                    await self.memory_writer.add_memory(agent.short_term_memory, memory_obj)
                     self.episode_steps[safe_id].append(memory_obj)
 
                     # Store episodic memory and clear episode steps
@@ -192,7 +221,7 @@ class AgentCognitiveProcessor:
                         "observation": observation_data
                     }
                     
-                    await agent.long_term_memory.store_episodic_memory(
+                    episode = agent.long_term_memory.build_episode(
                         agent_id=agent.id,
                         task_query=query_str,
                         steps=self.episode_steps[safe_id],
@@ -200,4 +229,7 @@ class AgentCognitiveProcessor:
                         strategy_update=reflection_content.get("strategy_update", []),
                         metadata=serializable_metadata
                     )
-                    self.episode_steps[safe_id].clear()
\ No newline at end of file
+                    await self.memory_writer.add_episode(agent.long_term_memory, episode)
+                    self.episode_steps[safe_id].clear()
+
+            await self.memory_writer.flush()
\ No newline at end of file
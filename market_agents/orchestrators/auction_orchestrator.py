@@ -33,6 +33,7 @@ from market_agents.orchestrators.logger_utils import (
     log_round
 )
 from market_agents.orchestrators.insert_simulation_data import SimulationDataInserter
+from market_agents.orchestrators.persistence import SimulationPersistenceService
 from market_agents.orchestrators.agent_cognitive import AgentCognitiveProcessor
 
 # Define AuctionTracker for tracking auction-specific data
@@ -91,13 +92,15 @@ class AuctionOrchestrator(BaseEnvironmentOrchestrator):
         agents: List[MarketAgent],
         ai_utils,
         data_inserter: SimulationDataInserter,
-        logger=None
+        logger=None,
+        persistence: SimulationPersistenceService = None
     ):
         super().__init__(
             config=config,
             agents=agents,
             ai_utils=ai_utils,
             data_inserter=data_inserter,
+            persistence=persistence,
             logger=logger
         )
         self.orchestrator_config = orchestrator_config
@@ -106,7 +109,7 @@ class AuctionOrchestrator(BaseEnvironmentOrchestrator):
         self.tracker = AuctionTracker()
         self.agent_surpluses: Dict[str, float] = {}
         self.logger = logger or logging.getlogger(__name__)
-        self.cognitive_processor = AgentCognitiveProcessor(ai_utils, data_inserter, self.logger, self.orchestrator_config.tool_mode)
+        self.cognitive_processor = AgentCognitiveProcessor(ai_utils, data_inserter, self.logger, self.orchestrator_config.tool_mode, persistence=self.persistence)
 
         
     async def setup_environment(self):
@@ -398,35 +401,29 @@ class AuctionOrchestrator(BaseEnvironmentOrchestrator):
 
     async def process_round_results(self, round_num: int):
         try:
-            agents_data = [
-                {
-                    'id': str(agent.id),
-                    'role': agent.role,
-                    'is_llm': agent.use_llm,
-                    'max_iter': self.orchestrator_config.max_rounds,
-                    'llm_config': agent.llm_config if isinstance(agent.llm_config, dict) else agent.llm_config.dict()
-                }
-                for agent in self.agents
-            ]
-            agent_id_map = self.data_inserter.insert_agents(agents_data)
-            
+            agents_data = self.data_inserter.prepare_agents_data(self.agents, self.orchestrator_config.max_rounds)
             trades_data = self.tracker.get_trades_data()
-            if trades_data:
-                self.data_inserter.insert_trades(trades_data, agent_id_map)
-            
-            self.data_inserter.insert_round_data(
+            round_data = self.data_inserter.prepare_round_data(
                 round_num,
                 self.agents,
                 {self.environment_name: self.environment},
                 self.orchestrator_config,
                 {self.environment_name: self.tracker}
             )
-            
-            self.logger.info(f"Data for round {round_num} inserted successfully.")
+
+            # rows are snapshotted above, the database writes happen on the persistence worker
+            await self.persistence.asubmit(self._write_round_results, agents_data, trades_data, round_data)
+            self.logger.info(f"Data for round {round_num} queued for insertion.")
         except Exception as e:
             self.logger.error(f"Error inserting data for round {round_num}: {str(e)}")
             self.logger.exception("Exception details:")
 
+    def _write_round_results(self, agents_data: List[Dict[str, Any]], trades_data: List[Dict[str, Any]], round_data: Dict[str, Any]):
+        agent_id_map = self.data_inserter.insert_agents(agents_data)
+        if trades_data:
+            self.data_inserter.insert_trades(trades_data, agent_id_map)
+        self.data_inserter.write_round_data(round_data)
+
     async def run(self):
         self.setup_environment()
         for round_num in range(1, self.config.max_rounds + 1):
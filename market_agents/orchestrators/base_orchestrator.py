@@ -4,8 +4,10 @@ from market_agents.agents.market_agent import MarketAgent
 from market_agents.inference.parallel_inference import ParallelAIUtilities
 from market_agents.orchestrators.config import OrchestratorConfig
 from market_agents.orchestrators.insert_simulation_data import SimulationDataInserter
+from market_agents.orchestrators.persistence import SimulationPersistenceService
 from pydantic import BaseModel, Field
 from abc import ABC, abstractmethod
+from typing import Optional
 import logging
 
 class BaseEnvironmentOrchestrator(BaseModel, ABC):
@@ -14,6 +16,7 @@ class BaseEnvironmentOrchestrator(BaseModel, ABC):
     agents: List['MarketAgent']
     ai_utils: 'ParallelAIUtilities'
     data_inserter: 'SimulationDataInserter'
+    persistence: Optional[SimulationPersistenceService] = Field(default=None, description="Background writer for round results, shared per data_inserter by default")
     logger: logging.Logger = Field(default=None)
     environment_name: str = Field(default="")
 
@@ -25,6 +28,8 @@ class BaseEnvironmentOrchestrator(BaseModel, ABC):
         super().__init__(**data)
         if self.logger is None:
             self.logger = logging.getLogger(self.__class__.__name__)
+        if self.persistence is None:
+            self.persistence = SimulationPersistenceService.shared(self.data_inserter)
 
     @abstractmethod
     async def setup_environment(self):
@@ -49,3 +54,7 @@ class BaseEnvironmentOrchestrator(BaseModel, ABC):
     async def run(self):
         # Implement common run logic if any
         pass
+
+    async def close(self):
+        # Release resources held by the orchestrator, called once the simulation ends
+        pass
@@ -1,10 +1,11 @@
 # config.py
 
 from pydantic import BaseModel, Field
-from typing import List, Dict, Union
+from typing import List, Dict, Optional, Union
 from pydantic_settings import BaseSettings, SettingsConfigDict
 import yaml
 from pathlib import Path
+from market_agents.inference.response_cache import ResponseCacheConfig
 
 class AgentConfig(BaseModel):
     knowledge_base: str
@@ -17,6 +18,7 @@ class GroupChatConfig(BaseModel):
     sub_rounds: int = Field(default=3)
     group_size: int = Field(default=100)
     api_url: str = Field(default="http://localhost:8001")
+    coalesce_window_seconds: float = Field(default=0.05, description="How long concurrent cohort prompts are collected before being dispatched as one batch")
 
 class ResearchConfig(BaseModel):
     name: str
@@ -34,6 +36,12 @@ class LLMConfigModel(BaseModel):
     temperature: float
     max_tokens: int
     use_cache: bool
+    history_policy: str = Field(default="unbounded", description="Options: unbounded, sliding_window, token_budget, summary")
+    max_history_turns: int = Field(default=10)
+    max_history_tokens: int = Field(default=4000)
+    history_retain_ratio: float = Field(default=0.5)
+    summary_model: Optional[str] = Field(default=None)
+    summary_max_tokens: int = Field(default=300)
 
 class DatabaseConfig(BaseSettings):
     db_type: str = "postgres"
@@ -42,6 +50,10 @@ class DatabaseConfig(BaseSettings):
     db_password: str = Field(..., env='DB_PASSWORD')
     db_host: str = Field('localhost', env='DB_HOST')
     db_port: str = Field('5432', env='DB_PORT')
+    request_storage: str = Field(default="inline", description="Options: inline (full payloads in requests), deduplicated (request_refs + request_blobs)")
+    partition_by: str = Field(default="none", description="Options: none, round, created_at. Applies to newly created tables, see migrate_orchestrator_tables")
+    partition_size: int = Field(default=10, description="Rounds per partition when partition_by is round")
+    partition_interval: str = Field(default="day", description="Options: day, week, month; partition length when partition_by is created_at")
 
     model_config = SettingsConfigDict(env_file='.env', env_file_encoding='utf-8', extra='ignore')
 
@@ -55,6 +67,8 @@ class OrchestratorConfig(BaseSettings):
     protocol: str
     database_config: DatabaseConfig = DatabaseConfig()
     tool_mode: bool
+    persistence_queue_size: int = Field(default=100, description="Max simulation writes queued for the background persistence worker before submitters wait")
+    response_cache: Optional[ResponseCacheConfig] = Field(default=None, description="On-disk LLM response cache reused by re-runs and resumed simulations, disabled when unset")
     model_config = SettingsConfigDict(env_file='.env', env_file_encoding='utf-8', extra='ignore')
 
 def load_config(config_path: Path) -> OrchestratorConfig:
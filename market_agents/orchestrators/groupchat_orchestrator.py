@@ -20,8 +20,10 @@ from market_agents.orchestrators.logger_utils import (
     log_group_message
 )
 from market_agents.orchestrators.insert_simulation_data import SimulationDataInserter
+from market_agents.orchestrators.persistence import SimulationPersistenceService
 
 from market_agents.orchestrators.group_chat.groupchat_api_utils import GroupChatAPIUtils
+from market_agents.inference.coalescer import RequestCoalescer
 from market_agents.orchestrators.agent_cognitive import AgentCognitiveProcessor
 
 
@@ -40,20 +42,26 @@ class GroupChatOrchestrator:
         agents: List[MarketAgent],
         ai_utils,
         data_inserter: SimulationDataInserter,
-        logger=None
+        logger=None,
+        persistence: SimulationPersistenceService = None
     ):
         self.config = config
         self.orchestrator_config = orchestrator_config
         self.agents = agents
         self.ai_utils = ai_utils
         self.data_inserter = data_inserter
+        # Database writes go through a background worker so rounds never wait on Postgres
+        self.persistence = persistence or SimulationPersistenceService.shared(data_inserter)
         self.logger = logger or logging.getLogger(__name__)
 
         # Initialize API utils
-        self.api_utils = GroupChatAPIUtils(self.config.api_url, self.logger)
+        self.api_utils = GroupChatAPIUtils(self.config.api_url, self.logger, http_client=getattr(ai_utils, "http_client", None))
+
+        # Cohort sub-rounds run concurrently; coalesce their prompts into shared batches
+        self.request_coalescer = RequestCoalescer(ai_utils, window_seconds=config.coalesce_window_seconds)
 
         # Initialize cognitive processor
-        self.cognitive_processor = AgentCognitiveProcessor(ai_utils, data_inserter, self.logger, self.orchestrator_config.tool_mode)
+        self.cognitive_processor = AgentCognitiveProcessor(self.request_coalescer, data_inserter, self.logger, self.orchestrator_config.tool_mode, persistence=self.persistence)
 
         # Agent dictionary for quick lookup
         self.agent_dict = {agent.id: agent for agent in agents}
@@ -233,7 +241,7 @@ class GroupChatOrchestrator:
 
         # Run prompts in parallel
         proposals = await self.ai_utils.run_parallel_ai_completion(proposer_prompts, update_history=False)
-        self.data_inserter.insert_ai_requests(self.ai_utils.get_all_requests())
+        await self.persistence.submit_ai_requests(self.ai_utils.get_all_requests())
 
         tasks = []
         for (cohort_id, proposer_agent), proposal in zip(proposer_agents, proposals):
@@ -372,26 +380,21 @@ class GroupChatOrchestrator:
 
             # Execute API posts in parallel
             await asyncio.gather(*api_tasks)
-            agents_data = [
-                {
-                    'id': str(agent.id),
-                    'role': agent.role,
-                    'is_llm': agent.use_llm,
-                    'max_iter': self.config.max_rounds,
-                    'llm_config': agent.llm_config if isinstance(agent.llm_config, dict) else agent.llm_config.dict()
-                }
-                for agent in cohort_agents
-            ]
-            
-            # Get agent ID mappings
-            agent_id_map = self.data_inserter.insert_agents(agents_data)
-            # Insert messages into database
-            if messages_to_insert:
-                self.data_inserter.insert_groupchat_messages(messages_to_insert, round_num, agent_id_map)
+            agents_data = self.data_inserter.prepare_agents_data(cohort_agents, self.orchestrator_config.max_rounds)
+
+            await self.persistence.asubmit(self._write_messages, agents_data, messages_to_insert, round_num)
 
         except Exception as e:
             self.logger.warning(f"Error during data insertion in sub-round {sub_round_num} for cohort {cohort_id}: {e}")
 
+    def _write_messages(self, agents_data: List[Dict[str, Any]], messages: List[Dict[str, Any]], round_num: int):
+        """Runs on the persistence worker."""
+        # Get agent ID mappings
+        agent_id_map = self.data_inserter.insert_agents(agents_data)
+        # Insert messages into database
+        if messages:
+            self.data_inserter.insert_groupchat_messages(messages, round_num, agent_id_map)
+
     def extract_message_content(self, action) -> Optional[str]:
         """
         Extracts the message content from the action.
@@ -430,7 +433,7 @@ class GroupChatOrchestrator:
                 cohort_env_name = f"group_chat_{cohort_id}"
                 environment = cohort_agents[0].environments['group_chat']
                 
-                self.data_inserter.insert_round_data(
+                await self.persistence.submit_round_data(
                     round_num=round_num,
                     agents=cohort_agents,
                     environment=environment,
@@ -438,7 +441,7 @@ class GroupChatOrchestrator:
                     tracker=None,
                     environment_name=cohort_env_name
                 )
-                self.logger.info(f"Data for round {round_num}, cohort {cohort_id} inserted successfully.")
+                self.logger.info(f"Data for round {round_num}, cohort {cohort_id} queued for insertion.")
 
             # Store round summary
             round_summary = await self.get_round_summary(round_num)
@@ -467,6 +470,9 @@ class GroupChatOrchestrator:
         }
         return summary
 
+    async def close(self):
+        await self.request_coalescer.close()
+
     async def print_summary(self):
         """Print a summary of the simulation results"""
         log_section(self.logger, "GROUP CHAT SIMULATION SUMMARY")
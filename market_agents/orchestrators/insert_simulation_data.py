@@ -1,3 +1,4 @@
+import hashlib
 import psycopg2
 import psycopg2.extras
 import os
@@ -7,9 +8,9 @@ from psycopg2.extensions import register_adapter, AsIs
 import json
 import logging
 import uuid
-from datetime import datetime
+from datetime import datetime, timedelta
 from market_agents.economics.econ_models import Bid, BuyerPreferenceSchedule, SellerPreferenceSchedule
-from .setup_orchestrator_db import create_database, setup_orchestrator_tables
+from .setup_orchestrator_db import create_database, ensure_partition, partitioned_tables, setup_orchestrator_tables
 
 def json_serial(obj):
     """JSON serializer for objects not serializable by default json code"""
@@ -51,14 +52,48 @@ def validate_json(data):
     return None
 
 class SimulationDataInserter:
-    def __init__(self, db_params):
+    """
+    Writes simulation results to the orchestrator database.
+
+    Every insert method builds its rows (serializing JSON payloads once, as it goes) and
+    writes them with multi-row INSERT statements via `execute_values` in a single
+    transaction, so persisting a table costs one or two round-trips per call instead of
+    one per row. Batches larger than `page_size` rows are split into several statements.
+
+    With `request_storage="deduplicated"`, AI requests are written to `request_refs` and
+    `request_blobs` instead of `requests`, storing each distinct message and payload once
+    (see `setup_request_blob_tables`); read them back through `requests_deduplicated`.
+
+    `partition_by` creates new tables range partitioned by round or created_at. Writes to
+    partitioned tables first create the partitions their rows fall into, once per
+    partition, so rows land in the default partition only if that fails.
+    """
+    MAX_KNOWN_BLOBS = 100_000
+
+    def __init__(self, db_params, page_size: int = 5000, request_storage: str = "inline",
+                 partition_by: str = "none", partition_size: int = 10, partition_interval: str = "day"):
         create_database(db_params)
-        
+
         # Connect to the database
         self.conn = psycopg2.connect(**db_params)
         self.cursor = self.conn.cursor()
-        
-        setup_orchestrator_tables(db_params)
+        self.page_size = page_size
+        self.request_storage = request_storage
+        # hashes of blobs already committed, so repeated history is not even sent again
+        self._known_blobs = set()
+        # agents upserted so far: id -> database id, and a hash of the fields written for it
+        self._agent_ids: Dict[str, Any] = {}
+        self._agent_hashes: Dict[str, int] = {}
+
+        self.partition_size = partition_size
+        self.partition_interval = partition_interval
+        self._partitions = set()
+
+        setup_orchestrator_tables(db_params, request_storage=request_storage, partition_by=partition_by)
+        # go by what the database has, tables created before partitioning was enabled stay plain
+        with self.conn.cursor() as cur:
+            self._partition_columns = partitioned_tables(cur)
+        self.conn.commit()
 
     def __del__(self):
         if hasattr(self, 'cursor') and self.cursor:
@@ -66,10 +101,79 @@ class SimulationDataInserter:
         if hasattr(self, 'conn') and self.conn:
             self.conn.close()
 
+    def _insert_rows(self, query: str, rows: List[tuple], description: str, fetch: bool = False):
+        """Run a multi-row statement for all rows in one transaction."""
+        try:
+            with self.conn.cursor() as cur:
+                result = psycopg2.extras.execute_values(cur, query, rows, page_size=self.page_size, fetch=fetch)
+            self.conn.commit()
+            logging.info(f"Inserted {len(rows)} {description}")
+            return result
+        except Exception as e:
+            self.conn.rollback()
+            logging.error(f"Error inserting {description}: {str(e)}")
+            raise
+
+    def _ensure_partitions(self, table: str, rounds=()):
+        """Create the partitions of `table` that rows of these rounds, or rows created now, go to."""
+        column = self._partition_columns.get(table)
+        if column is None:
+            return
+        if column == "round":
+            values = {r for r in rounds if r is not None}
+        else:
+            # created_at is set by the server, cover the days around now in case its clock or timezone differs
+            now = datetime.now()
+            values = [now + timedelta(days=offset) for offset in (-1, 0, 1)]
+        for value in values:
+            key = (table, column, value if column == "round" else value.date())
+            if key in self._partitions:
+                continue
+            try:
+                with self.conn.cursor() as cur:
+                    ensure_partition(cur, table, column, value, self.partition_size, self.partition_interval)
+                self.conn.commit()
+            except Exception as e:
+                self.conn.rollback()
+                logging.warning(f"Could not create partition of {table} for {value}, rows go to the default partition: {e}")
+            self._partitions.add(key)
+
+    @staticmethod
+    def _map_agent_ids(items: List[Dict[str, Any]], agent_id_map: Dict[str, uuid.UUID]):
+        """Yield (item, mapped agent id) for items whose agent is in the map."""
+        for item in items:
+            agent_id = agent_id_map.get(str(item['agent_id']))
+            if agent_id is None:
+                logging.error(f"No matching UUID found for agent_id: {item['agent_id']}")
+                continue
+            yield item, agent_id
+
+    @staticmethod
+    def prepare_agents_data(agents: List[Any], max_iter: int) -> List[Dict[str, Any]]:
+        """Agent rows for `insert_agents`; every caller builds them the same way so unchanged agents hash the same."""
+        return [
+            {
+                'id': str(agent.id),
+                'role': agent.role,
+                'persona': agent.persona.dict() if hasattr(agent.persona, 'dict') else agent.persona,
+                'is_llm': agent.use_llm,
+                'max_iter': max_iter,
+                'llm_config': agent.llm_config if isinstance(agent.llm_config, dict) else agent.llm_config.dict()
+            }
+            for agent in agents
+        ]
+
     def insert_agents(self, agents_data):
+        """
+        Register agents and return the map from their ids to database ids.
+
+        Ids and a hash of each agent's serialized fields are kept in memory, so only new or
+        changed agents are upserted, in one statement; when nothing changed since the last
+        call this makes no database round-trip at all.
+        """
         query = """
             INSERT INTO agents (id, role, persona, is_llm, max_iter, llm_config)
-            VALUES (%s, %s, %s, %s, %s, %s)
+            VALUES %s
             ON CONFLICT (id) DO UPDATE SET
                 role = EXCLUDED.role,
                 persona = EXCLUDED.persona,
@@ -79,184 +183,167 @@ class SimulationDataInserter:
             RETURNING id
         """
         agent_id_map = {}
+        rows = {}
+        keys = {}
+        hashes = {}
         for agent in agents_data:
             try:
-                agent_id = uuid.UUID(str(agent['id'])) if isinstance(agent['id'], (str, int)) else agent['id']
-                with self.conn.cursor() as cur:
-                    cur.execute(query, (
-                        agent_id,
-                        agent['role'],
-                        json.dumps(agent.get('persona', {})),
-                        agent['is_llm'],
-                        agent['max_iter'],
-                        json.dumps(agent['llm_config']),
-                    ))
-                    inserted_id = cur.fetchone()
-                    if inserted_id:
-                        agent_id_map[str(agent['id'])] = inserted_id[0]
-                    else:
-                        logging.warning(f"No id returned for agent: {agent['id']}")
-                self.conn.commit()
+                key = str(agent['id'])
+                row = (
+                    agent['role'],
+                    json.dumps(agent.get('persona', {})),
+                    agent['is_llm'],
+                    agent['max_iter'],
+                    json.dumps(agent['llm_config']),
+                )
+                row_hash = hash(row)
+                if self._agent_hashes.get(key) == row_hash:
+                    agent_id_map[key] = self._agent_ids[key]
+                    continue
+                agent_id = uuid.UUID(key) if isinstance(agent['id'], (str, int)) else agent['id']
+                # one row per id, an upsert cannot touch the same row twice in a statement
+                rows[str(agent_id)] = (agent_id,) + row
+                keys[str(agent_id)] = key
+                hashes[key] = row_hash
             except Exception as e:
                 logging.error(f"Error inserting agent: {str(e)}")
-                self.conn.rollback()
+
+        if not rows:
+            return agent_id_map
+        try:
+            inserted = self._insert_rows(query, list(rows.values()), "agents", fetch=True)
+        except Exception:
+            return agent_id_map
+        for (inserted_id,) in inserted:
+            key = keys[str(inserted_id)]
+            agent_id_map[key] = inserted_id
+            self._agent_ids[key] = inserted_id
+            self._agent_hashes[key] = hashes[key]
+        for key in keys.values():
+            if key not in agent_id_map:
+                logging.warning(f"No id returned for agent: {key}")
         return agent_id_map
 
+    def reset_agent_cache(self):
+        """Forget registered agents, e.g. after the agents table was cleared outside this inserter."""
+        self._agent_ids.clear()
+        self._agent_hashes.clear()
+
     def insert_agent_memories(self, memories: List[Dict[str, Any]]):
+        rows = []
         for memory in memories:
             try:
                 agent_id = uuid.UUID(str(memory['agent_id'])) if isinstance(memory['agent_id'], (str, int)) else memory['agent_id']
-                with self.conn.cursor() as cur:
-                    cur.execute("""
-                    INSERT INTO agent_memories (agent_id, step_id, memory_data)
-                    VALUES (%s, %s, %s)
-                    """, (agent_id, memory['step_id'], psycopg2.extras.Json(memory['memory_data'])))
-                self.conn.commit()
+                rows.append((agent_id, memory['step_id'], json.dumps(memory['memory_data'])))
             except Exception as e:
-                self.conn.rollback()
                 logging.error(f"Error inserting agent memory: {e}")
-        logging.info(f"Inserted {len(memories)} agent memories into the database")
+        if not rows:
+            return
+        try:
+            self._insert_rows("INSERT INTO agent_memories (agent_id, step_id, memory_data) VALUES %s", rows, "agent memories into the database")
+        except Exception:
+            pass
 
     def insert_groupchat_messages(self, messages: List[Dict[str, Any]], round_num: int, agent_id_map: Dict[str, uuid.UUID]):
         query = """
         INSERT INTO groupchat (message_id, agent_id, round, sub_round, cohort_id, content, timestamp, topic)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        VALUES %s
         """
-        try:
-            with self.conn.cursor() as cur:
-                for message in messages:
-                    # Get the mapped agent ID from the database
-                    agent_id = agent_id_map.get(str(message['agent_id']))
-                    if agent_id is None:
-                        logging.error(f"No matching UUID found for agent_id: {message['agent_id']}")
-                        continue
-
-                    cur.execute(query, (
-                        message['message_id'],
-                        agent_id,  # Use the mapped agent_id
-                        round_num,
-                        message['sub_round'],
-                        message['cohort_id'],
-                        message['content'],
-                        message['timestamp'],
-                        message.get('topic')
-                    ))
-            self.conn.commit()
-            logging.info(f"Inserted {len(messages)} group chat messages")
-        except Exception as e:
-            self.conn.rollback()
-            logging.error(f"Error inserting group chat messages: {str(e)}")
-            raise
+        rows = [
+            (
+                message['message_id'],
+                agent_id,  # Use the mapped agent_id
+                round_num,
+                message['sub_round'],
+                message['cohort_id'],
+                message['content'],
+                message['timestamp'],
+                message.get('topic')
+            )
+            for message, agent_id in self._map_agent_ids(messages, agent_id_map)
+        ]
+        if rows:
+            self._ensure_partitions("groupchat", [round_num])
+            self._insert_rows(query, rows, "group chat messages")
 
     def insert_interactions(self, interactions: List[Dict[str, Any]], agent_id_map: Dict[str, uuid.UUID]):
         query = """
         INSERT INTO interactions (agent_id, round, task, response)
-        VALUES (%s, %s, %s, %s)
+        VALUES %s
         """
-        try:
-            with self.conn.cursor() as cur:
-                for interaction in interactions:
-                    agent_id = agent_id_map.get(str(interaction['agent_id']))
-                    if agent_id is None:
-                        logging.error(f"No matching UUID found for agent_id: {interaction['agent_id']}")
-                        continue
-                    cur.execute(query, (
-                        agent_id,
-                        interaction['round'],
-                        interaction['task'],
-                        interaction['response']
-                    ))
-            self.conn.commit()
-            logging.info(f"Inserted {len(interactions)} interactions into the database")
-        except Exception as e:
-            self.conn.rollback()
-            logging.error(f"Error inserting interactions: {str(e)}")
-            raise
+        rows = [
+            (
+                agent_id,
+                interaction['round'],
+                interaction['task'],
+                interaction['response']
+            )
+            for interaction, agent_id in self._map_agent_ids(interactions, agent_id_map)
+        ]
+        if rows:
+            self._insert_rows(query, rows, "interactions into the database")
 
     def insert_observations(self, observations: List[Dict[str, Any]], agent_id_map: Dict[str, uuid.UUID]):
         query = """
         INSERT INTO observations (agent_id, environment_name, round, observation)
-        VALUES (%s, %s, %s, %s)
+        VALUES %s
         """
-        try:
-            with self.conn.cursor() as cur:
-                for observation in observations:
-                    agent_id = agent_id_map.get(str(observation['agent_id']))
-                    if agent_id is None:
-                        logging.error(f"No matching UUID found for agent_id: {observation['agent_id']}")
-                        continue
-                    cur.execute(query, (
-                        agent_id,
-                        observation['environment_name'],
-                        observation['round'],
-                        psycopg2.extras.Json(observation['observation'])
-                    ))
-            self.conn.commit()
-            logging.info(f"Inserted {len(observations)} observations into the database")
-        except Exception as e:
-            self.conn.rollback()
-            logging.error(f"Error inserting observations: {str(e)}")
-            raise
+        rows = [
+            (
+                agent_id,
+                observation['environment_name'],
+                observation['round'],
+                json.dumps(observation['observation'])
+            )
+            for observation, agent_id in self._map_agent_ids(observations, agent_id_map)
+        ]
+        if rows:
+            self._ensure_partitions("observations", (observation['round'] for observation in observations))
+            self._insert_rows(query, rows, "observations into the database")
 
     def insert_perceptions(self, perceptions: List[Dict[str, Any]], agent_id_map: Dict[str, uuid.UUID]):
         query = """
         INSERT INTO perceptions (memory_id, agent_id, environment_name, round, observation)
-        VALUES (%s, %s, %s, %s, %s)
+        VALUES %s
         """
-        try:
-            with self.conn.cursor() as cur:
-                for perception in perceptions:
-                    agent_id = agent_id_map.get(str(perception['agent_id']))
-                    memory_id = perception.get('memory_id', uuid.uuid4())  # Generate UUID if not provided
-                    if agent_id is None:
-                        logging.error(f"No matching UUID found for agent_id: {perception['agent_id']}")
-                        continue
-                    cur.execute(query, (
-                        memory_id,
-                        agent_id,
-                        perception['environment_name'],
-                        perception['round'],
-                        psycopg2.extras.Json(perception['observation'])
-                    ))
-            self.conn.commit()
-            logging.info(f"Inserted {len(perceptions)} perceptions into the database")
-        except Exception as e:
-            self.conn.rollback()
-            logging.error(f"Error inserting perceptions: {str(e)}")
-            raise
+        rows = [
+            (
+                perception.get('memory_id', uuid.uuid4()),  # Generate UUID if not provided
+                agent_id,
+                perception['environment_name'],
+                perception['round'],
+                json.dumps(perception['observation'])
+            )
+            for perception, agent_id in self._map_agent_ids(perceptions, agent_id_map)
+        ]
+        if rows:
+            self._ensure_partitions("perceptions", (perception['round'] for perception in perceptions))
+            self._insert_rows(query, rows, "perceptions into the database")
 
     def insert_actions(self, actions: List[Dict[str, Any]], agent_id_map: Dict[str, uuid.UUID]):
         query = """
         INSERT INTO actions (
             memory_id,
-            agent_id, 
+            agent_id,
             environment_name,
             round,
             action
         )
-        VALUES (%s, %s, %s, %s, %s)
+        VALUES %s
         """
-        try:
-            with self.conn.cursor() as cur:
-                for action in actions:
-                    agent_id = agent_id_map.get(str(action['agent_id']))
-                    memory_id = action.get('memory_id', uuid.uuid4())  # Generate UUID if not provided
-                    if agent_id is None:
-                        logging.error(f"No matching UUID found for agent_id: {action['agent_id']}")
-                        continue
-                    cur.execute(query, (
-                        memory_id,
-                        agent_id,
-                        action['environment_name'],
-                        action['round'],
-                        json.dumps(action['action'], default=str)
-                    ))
-            self.conn.commit()
-            logging.info(f"Inserted {len(actions)} actions into the database")
-        except Exception as e:
-            self.conn.rollback()
-            logging.error(f"Error inserting actions: {str(e)}")
-            raise
+        rows = [
+            (
+                action.get('memory_id', uuid.uuid4()),  # Generate UUID if not provided
+                agent_id,
+                action['environment_name'],
+                action['round'],
+                json.dumps(action['action'], default=str)
+            )
+            for action, agent_id in self._map_agent_ids(actions, agent_id_map)
+        ]
+        if rows:
+            self._ensure_partitions("actions", (action['round'] for action in actions))
+            self._insert_rows(query, rows, "actions into the database")
 
     def insert_reflections(self, reflections: List[Dict[str, Any]], agent_id_map: Dict[str, uuid.UUID]):
         query = """
@@ -271,35 +358,34 @@ class SimulationDataInserter:
             total_reward,
             strategy_update
         )
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+        VALUES %s
         """
+        rows = [
+            (
+                reflection.get('memory_id', uuid.uuid4()),  # Generate UUID if not provided
+                agent_id,
+                reflection['environment_name'],
+                reflection['round'],
+                reflection['reflection'],
+                reflection.get('self_reward'),
+                reflection.get('environment_reward'),
+                reflection.get('total_reward'),
+                reflection.get('strategy_update')
+            )
+            for reflection, agent_id in self._map_agent_ids(reflections, agent_id_map)
+        ]
+        if rows:
+            self._ensure_partitions("reflections", (reflection['round'] for reflection in reflections))
+            self._insert_rows(query, rows, "reflections into the database")
+
+    def insert_ai_requests(self, ai_requests):
         try:
-            with self.conn.cursor() as cur:
-                for reflection in reflections:
-                    agent_id = agent_id_map.get(str(reflection['agent_id']))
-                    memory_id = reflection.get('memory_id', uuid.uuid4())  # Generate UUID if not provided
-                    if agent_id is None:
-                        logging.error(f"No matching UUID found for agent_id: {reflection['agent_id']}")
-                        continue
-                    cur.execute(query, (
-                        memory_id,
-                        agent_id,
-                        reflection['environment_name'],
-                        reflection['round'],
-                        reflection['reflection'],
-                        reflection.get('self_reward'),
-                        reflection.get('environment_reward'),
-                        reflection.get('total_reward'),
-                        reflection.get('strategy_update')
-                    ))
-            self.conn.commit()
-            logging.info(f"Inserted {len(reflections)} reflections into the database")
+            self.write_ai_requests(ai_requests)
         except Exception as e:
-            self.conn.rollback()
-            logging.error(f"Error inserting reflections: {str(e)}")
-            raise
+            logging.error(f"Error inserting AI requests: {e}")
 
-    def insert_ai_requests(self, ai_requests):
+    def write_ai_requests(self, ai_requests):
+        """Like `insert_ai_requests`, but raises when the insert fails."""
         requests_data = []
         for request in ai_requests:
             start_time = request.start_time
@@ -333,45 +419,102 @@ class SimulationDataInserter:
             })
 
         if requests_data:
-            try:
-                self._insert_ai_requests_to_db(requests_data)
-            except Exception as e:
-                logging.error(f"Error inserting AI requests: {e}")
+            self._insert_ai_requests_to_db(requests_data)
 
     def _insert_ai_requests_to_db(self, requests_data):
+        if self.request_storage == "deduplicated":
+            return self._insert_deduplicated_ai_requests(requests_data)
         query = """
-        INSERT INTO requests 
-        (prompt_context_id, start_time, end_time, total_time, model, 
+        INSERT INTO requests
+        (prompt_context_id, start_time, end_time, total_time, model,
         max_tokens, temperature, messages, system, tools, tool_choice,
         raw_response, completion_tokens, prompt_tokens, total_tokens)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        VALUES %s
         """
+        rows = [
+            (
+                request['prompt_context_id'],
+                request['start_time'],
+                request['end_time'],
+                request['total_time'],
+                request['model'],
+                request['max_tokens'],
+                request['temperature'],
+                json.dumps(request['messages']),
+                request['system'],
+                json.dumps(request.get('tools', [])),
+                json.dumps(request.get('tool_choice', {})),
+                json.dumps(request['raw_response']),
+                request['completion_tokens'],
+                request['prompt_tokens'],
+                request['total_tokens']
+            )
+            for request in requests_data
+        ]
+        self._ensure_partitions("requests")
+        self._insert_rows(query, rows, "AI requests")
+
+    def _insert_deduplicated_ai_requests(self, requests_data):
+        blobs = {}
+
+        def blob(value):
+            data = json.dumps(value, sort_keys=True)
+            key = hashlib.sha256(data.encode("utf-8")).digest()
+            if key not in self._known_blobs:
+                blobs[key] = data
+            return key
+
+        rows = [
+            (
+                request['prompt_context_id'],
+                request['start_time'],
+                request['end_time'],
+                request['total_time'],
+                request['model'],
+                request['max_tokens'],
+                request['temperature'],
+                [blob(message) for message in request['messages']],
+                blob(request['system']) if request['system'] is not None else None,
+                blob(request.get('tools', [])),
+                blob(request.get('tool_choice', {})),
+                blob(request['raw_response']),
+                request['completion_tokens'],
+                request['prompt_tokens'],
+                request['total_tokens']
+            )
+            for request in requests_data
+        ]
         try:
             with self.conn.cursor() as cur:
-                for request in requests_data:
-                    cur.execute(query, (
-                        request['prompt_context_id'],
-                        request['start_time'],
-                        request['end_time'],
-                        request['total_time'],
-                        request['model'],
-                        request['max_tokens'],
-                        request['temperature'],
-                        json.dumps(request['messages']),
-                        request['system'],
-                        json.dumps(request.get('tools', [])),
-                        json.dumps(request.get('tool_choice', {})),
-                        json.dumps(request['raw_response']),
-                        request['completion_tokens'],
-                        request['prompt_tokens'],
-                        request['total_tokens']
-                    ))
+                if blobs:
+                    psycopg2.extras.execute_values(
+                        cur,
+                        "INSERT INTO request_blobs (hash, data) VALUES %s ON CONFLICT (hash) DO NOTHING",
+                        list(blobs.items()),
+                        page_size=self.page_size
+                    )
+                psycopg2.extras.execute_values(
+                    cur,
+                    """
+                    INSERT INTO request_refs
+                    (prompt_context_id, start_time, end_time, total_time, model,
+                    max_tokens, temperature, message_hashes, system_hash, tools_hash, tool_choice_hash,
+                    raw_response_hash, completion_tokens, prompt_tokens, total_tokens)
+                    VALUES %s
+                    """,
+                    rows,
+                    template="(%s, %s, %s, %s, %s, %s, %s, %s::bytea[], %s, %s, %s, %s, %s, %s, %s)",
+                    page_size=self.page_size
+                )
             self.conn.commit()
-            logging.info(f"Inserted {len(requests_data)} AI requests")
         except Exception as e:
             self.conn.rollback()
             logging.error(f"Error inserting AI requests: {str(e)}")
             raise
+        if len(self._known_blobs) + len(blobs) > self.MAX_KNOWN_BLOBS:
+            self._known_blobs.clear()
+        self._known_blobs.update(blobs)
+        logging.info(f"Inserted {len(rows)} AI requests with {len(blobs)} new blobs")
 
     def insert_round_data(
         self, 
@@ -384,114 +527,131 @@ class SimulationDataInserter:
     ):
         """Insert simulation data for a specific round."""
         try:
-            # Insert agent data
-            agents_data = [
-                {
-                    'id': str(agent.id),
-                    'role': agent.role,
-                    'persona': agent.persona.dict() if hasattr(agent.persona, 'dict') else agent.persona,
-                    'is_llm': agent.use_llm,
-                    'max_iter': config.max_rounds,
-                    'llm_config': agent.llm_config if isinstance(agent.llm_config, dict) else agent.llm_config.dict()
-                }
-                for agent in agents
-            ]
-            agent_id_map = self.insert_agents(agents_data)
-
-            # Perceptions data
-            logging.info("Preparing perceptions data")
-            perceptions_data = []
-            for agent in agents:
-                if agent.last_perception is not None:
-                    perception = validate_json(agent.last_perception)
-                    if perception is not None:
-                        perceptions_data.append({
-                            'agent_id': str(agent.id),  # Changed from memory_id to agent_id
-                            'environment_name': environment_name,
-                            'round': round_num,
-                            'observation': perception  # Changed to include full perception
-                        })
-                    else:
-                        logging.warning(f"Invalid JSON perception data for agent {agent.id}: {agent.last_perception}")
-
-            if perceptions_data:
-                self.insert_perceptions(perceptions_data, agent_id_map)
-
-            # Actions data
-            logging.info("Preparing actions data")
-            actions_data = [
-                {
-                    'agent_id': str(agent.id),  # Changed from memory_id to agent_id
-                    'environment_name': environment_name,
-                    'round': round_num,
-                    'action': agent.last_action
-                }
-                for agent in agents
-                if hasattr(agent, 'last_action') and agent.last_action
-            ]
-            if actions_data:
-                self.insert_actions(actions_data, agent_id_map)
-
-            # Observations data
-            logging.info("Preparing observations data")
-            observations_data = []
-            for agent in agents:
-                if hasattr(agent, 'last_observation') and agent.last_observation:
-                    observations_data.append({
-                        'agent_id': str(agent.id),
+            self.write_round_data(self.prepare_round_data(round_num, agents, environment, config, tracker, environment_name))
+        except Exception as e:
+            logging.error(f"Error inserting data for round {round_num}: {str(e)}")
+            logging.exception("Exception details:")
+
+    def prepare_round_data(
+        self,
+        round_num: int,
+        agents: List[Any],
+        environment: Any,
+        config: Any,
+        tracker: Any,
+        environment_name: str = 'auction'
+    ) -> Dict[str, Any]:
+        """
+        Snapshot the rows of a round from the live agents and environment, without touching
+        the database, so they can be written later by `write_round_data` on another thread.
+        """
+        # Agent data
+        agents_data = self.prepare_agents_data(agents, config.max_rounds)
+
+        # Perceptions data
+        logging.info("Preparing perceptions data")
+        perceptions_data = []
+        for agent in agents:
+            if agent.last_perception is not None:
+                perception = validate_json(agent.last_perception)
+                if perception is not None:
+                    perceptions_data.append({
+                        'agent_id': str(agent.id),  # Changed from memory_id to agent_id
                         'environment_name': environment_name,
                         'round': round_num,
-                        'observation': serialize_memory_data(agent.last_observation)
+                        'observation': perception  # Changed to include full perception
                     })
                 else:
-                    logging.debug(f"Agent {agent.id} has no last_observation")
-
-            if observations_data:
-                self.insert_observations(observations_data, agent_id_map)
-            else:
-                logging.warning("No observations data to insert")
-
-            # Reflections data (if available)
-            logging.info("Preparing reflections data")
-            reflections_data = [
-                {
-                    'agent_id': str(agent.id),  # Changed from memory_id to agent_id
+                    logging.warning(f"Invalid JSON perception data for agent {agent.id}: {agent.last_perception}")
+
+        # Actions data
+        logging.info("Preparing actions data")
+        actions_data = [
+            {
+                'agent_id': str(agent.id),  # Changed from memory_id to agent_id
+                'environment_name': environment_name,
+                'round': round_num,
+                'action': agent.last_action
+            }
+            for agent in agents
+            if hasattr(agent, 'last_action') and agent.last_action
+        ]
+
+        # Observations data
+        logging.info("Preparing observations data")
+        observations_data = []
+        for agent in agents:
+            if hasattr(agent, 'last_observation') and agent.last_observation:
+                observations_data.append({
+                    'agent_id': str(agent.id),
                     'environment_name': environment_name,
                     'round': round_num,
-                    'reflection': str(agent.last_reflection) if hasattr(agent, 'last_reflection') else None,
-                    'self_reward': getattr(agent, 'self_reward', 0.0),
-                    'environment_reward': getattr(agent, 'environment_reward', 0.0),
-                    'total_reward': getattr(agent, 'total_reward', 0.0),
-                    'strategy_update': getattr(agent, 'strategy_update', '')
-                }
-                for agent in agents
-                if hasattr(agent, 'last_reflection') and agent.last_reflection
-            ]
-            if reflections_data:
-                self.insert_reflections(reflections_data, agent_id_map)
-
-            # Group chat data
-            groupchat_data = []
-            if hasattr(environment, 'mechanism') and hasattr(environment.mechanism, 'topics'):
-                for message in environment.mechanism.messages:
-                    groupchat_data.append({
-                        'message_id': str(uuid.uuid4()),
-                        'agent_id': str(message.agent_id),
-                        'round': round_num,
-                        'sub_round': getattr(message, 'sub_round', None),
-                        'cohort_id': message.cohort_id,
-                        'content': message.content,
-                        'timestamp': message.timestamp if hasattr(message, 'timestamp') else datetime.now(),
-                        'topic': environment.mechanism.topics.get(message.cohort_id, '')
-                    })
-            
-            if groupchat_data:
-                self.insert_groupchat_messages(groupchat_data, round_num, agent_id_map)
-
-        except Exception as e:
+                    'observation': serialize_memory_data(agent.last_observation)
+                })
+            else:
+                logging.debug(f"Agent {agent.id} has no last_observation")
+        if not observations_data:
+            logging.warning("No observations data to insert")
+
+        # Reflections data (if available)
+        logging.info("Preparing reflections data")
+        reflections_data = [
+            {
+                'agent_id': str(agent.id),  # Changed from memory_id to agent_id
+                'environment_name': environment_name,
+                'round': round_num,
+                'reflection': str(agent.last_reflection) if hasattr(agent, 'last_reflection') else None,
+                'self_reward': getattr(agent, 'self_reward', 0.0),
+                'environment_reward': getattr(agent, 'environment_reward', 0.0),
+                'total_reward': getattr(agent, 'total_reward', 0.0),
+                'strategy_update': getattr(agent, 'strategy_update', '')
+            }
+            for agent in agents
+            if hasattr(agent, 'last_reflection') and agent.last_reflection
+        ]
+
+        # Group chat data
+        groupchat_data = []
+        if hasattr(environment, 'mechanism') and hasattr(environment.mechanism, 'topics'):
+            for message in environment.mechanism.messages:
+                groupchat_data.append({
+                    'message_id': str(uuid.uuid4()),
+                    'agent_id': str(message.agent_id),
+                    'round': round_num,
+                    'sub_round': getattr(message, 'sub_round', None),
+                    'cohort_id': message.cohort_id,
+                    'content': message.content,
+                    'timestamp': message.timestamp if hasattr(message, 'timestamp') else datetime.now(),
+                    'topic': environment.mechanism.topics.get(message.cohort_id, '')
+                })
+
+        return {
+            'round': round_num,
+            'agents': agents_data,
+            'perceptions': perceptions_data,
+            'actions': actions_data,
+            'observations': observations_data,
+            'reflections': reflections_data,
+            'groupchat': groupchat_data,
+        }
+
+    def write_round_data(self, round_data: Dict[str, Any]):
+        """Insert rows snapshotted by `prepare_round_data`, raising on failure."""
+        try:
+            agent_id_map = self.insert_agents(round_data['agents'])
+            if round_data['perceptions']:
+                self.insert_perceptions(round_data['perceptions'], agent_id_map)
+            if round_data['actions']:
+                self.insert_actions(round_data['actions'], agent_id_map)
+            if round_data['observations']:
+                self.insert_observations(round_data['observations'], agent_id_map)
+            if round_data['reflections']:
+                self.insert_reflections(round_data['reflections'], agent_id_map)
+            if round_data['groupchat']:
+                self.insert_groupchat_messages(round_data['groupchat'], round_data['round'], agent_id_map)
+        except Exception:
             self.conn.rollback()
-            logging.error(f"Error inserting data for round {round_num}: {str(e)}")
-            logging.exception("Exception details:")
+            raise
 
     def check_tables_exist(self):
         cursor = self.conn.cursor()
@@ -3,11 +3,12 @@
 import asyncio
 import logging
 import warnings
-from typing import List, Dict, Type
+from typing import List, Dict, Optional, Type
 
 from market_agents.orchestrators.base_orchestrator import BaseEnvironmentOrchestrator
 from market_agents.orchestrators.config import OrchestratorConfig
 from market_agents.orchestrators.insert_simulation_data import SimulationDataInserter
+from market_agents.orchestrators.persistence import SimulationPersistenceService
 from market_agents.orchestrators.logger_utils import (
     orchestration_logger,
     log_round,
@@ -16,7 +17,9 @@ from market_agents.orchestrators.logger_utils import (
     log_completion,
     log_environment_setup,
 )
+from market_agents.inference.http_client import PooledHTTPClient
 from market_agents.inference.parallel_inference import ParallelAIUtilities, RequestLimits
+from market_agents.inference.response_cache import ResponseCache
 from market_agents.memory.setup_db import DatabaseConnection
 from market_agents.memory.embedding import MemoryEmbedder
 from market_agents.memory.config import MarketMemoryConfig, load_config_from_yaml
@@ -38,7 +41,8 @@ class MetaOrchestrator:
         config: OrchestratorConfig,
         agents,
         orchestrator_registry: Dict[str, Type[BaseEnvironmentOrchestrator]],
-        logger: logging.Logger = None
+        logger: logging.Logger = None,
+        http_client: Optional[PooledHTTPClient] = None
     ):
         self.config = config
         self.agents = agents
@@ -50,9 +54,12 @@ class MetaOrchestrator:
         # If you want to keep references to memory/DB for logging, do so:
         self.memory_config = self._initialize_memory_config()
         self.db_conn = self._initialize_database()
-        self.embedder = MemoryEmbedder(config=self.memory_config)
+        # one connection pool for inference, embeddings and group chat, closed with ai_utils
+        self.http_client = http_client or PooledHTTPClient()
+        self.embedder = MemoryEmbedder(config=self.memory_config, http_client=self.http_client)
         self.ai_utils = self._initialize_ai_utils()
         self.data_inserter = self._initialize_data_inserter()
+        self.persistence = SimulationPersistenceService.shared(self.data_inserter, max_queue_size=config.persistence_queue_size)
 
         self.environment_orchestrators: Dict[str, BaseEnvironmentOrchestrator] = {}
 
@@ -72,7 +79,9 @@ class MetaOrchestrator:
         anthropic_request_limits = RequestLimits(max_requests_per_minute=20000, max_tokens_per_minute=2000000)
         return ParallelAIUtilities(
             oai_request_limits=oai_request_limits,
-            anthropic_request_limits=anthropic_request_limits
+            anthropic_request_limits=anthropic_request_limits,
+            http_client=self.http_client,
+            response_cache=ResponseCache(self.config.response_cache) if self.config.response_cache else None
         )
 
     def _initialize_data_inserter(self) -> SimulationDataInserter:
@@ -84,7 +93,13 @@ class MetaOrchestrator:
             "host": db_config.db_host,
             "port": db_config.db_port
         }
-        return SimulationDataInserter(db_params)
+        return SimulationDataInserter(
+            db_params,
+            request_storage=db_config.request_storage,
+            partition_by=db_config.partition_by,
+            partition_size=db_config.partition_size,
+            partition_interval=db_config.partition_interval
+        )
 
     def _initialize_environment_orchestrators(self):
         for env_name in self.environment_order:
@@ -104,6 +119,7 @@ class MetaOrchestrator:
                 "agents": self.agents,
                 "ai_utils": self.ai_utils,
                 "data_inserter": self.data_inserter,
+                "persistence": self.persistence,
                 "logger": self.logger
             }
 
@@ -154,4 +170,10 @@ class MetaOrchestrator:
             await self.run_simulation()
             log_completion(self.logger, "Simulation completed successfully")
         finally:
+            for orchestrator in self.environment_orchestrators.values():
+                await orchestrator.close()
+            # write whatever is still queued before the connections go away
+            await self.persistence.aclose()
+            await self.embedder.aclose()
+            await self.ai_utils.close()
             self.db_conn.close()
\ No newline at end of file
@@ -0,0 +1,187 @@
+import asyncio
+import atexit
+import logging
+import queue
+import threading
+import time
+import weakref
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List
+
+from market_agents.orchestrators.insert_simulation_data import SimulationDataInserter
+
+
+class SimulationPersistenceService:
+    """
+    Writes simulation results to Postgres from a dedicated worker thread.
+
+    Orchestrators snapshot what a round produced on the event loop (building plain rows is
+    CPU only) and enqueue the write; the worker runs queued writes one at a time, in order,
+    on the inserter's connection. Every submission returns a `concurrent.futures.Future`
+    that resolves once its rows are committed, or carries the exception if the write
+    failed, so callers that need durability can wait for it while the round loop goes on.
+
+    The queue holds at most `max_queue_size` writes. When it is full, `asubmit` waits off
+    the event loop for a free slot, so a database that falls behind slows the simulation
+    down instead of growing memory without bound; `stats()` reports how often and how long
+    that happened. `flush()` waits for everything submitted so far and `close()` flushes
+    and stops the worker. Services still open at interpreter exit are closed then.
+    """
+
+    _instances: "weakref.WeakKeyDictionary[SimulationDataInserter, SimulationPersistenceService]" = weakref.WeakKeyDictionary()
+    _instances_lock = threading.Lock()
+
+    def __init__(self, data_inserter: SimulationDataInserter, max_queue_size: int = 100):
+        self.data_inserter = data_inserter
+        self.max_queue_size = max_queue_size
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.blocked_submits = 0
+        self.blocked_seconds = 0.0
+        self.write_seconds = 0.0
+        self.max_queue_depth = 0
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue_size)
+        self._lock = threading.Lock()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="simulation-persistence", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    @classmethod
+    def shared(cls, data_inserter: SimulationDataInserter, max_queue_size: int = 100) -> "SimulationPersistenceService":
+        """The service writing through an inserter, created on first use; one worker per connection."""
+        with cls._instances_lock:
+            service = cls._instances.get(data_inserter)
+            if service is None or service._closed:
+                service = cls(data_inserter, max_queue_size=max_queue_size)
+                cls._instances[data_inserter] = service
+            return service
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        """Queue `fn(*args, **kwargs)` for the worker, blocking while the queue is full."""
+        job = self._make_job(fn, args, kwargs)
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            start = time.perf_counter()
+            self._queue.put(job)
+            self._record_blocked(time.perf_counter() - start)
+        self._record_depth()
+        return job[3]
+
+    async def asubmit(self, fn: Callable, *args, **kwargs) -> Future:
+        """Like `submit`, but waits for a free slot without blocking the event loop."""
+        job = self._make_job(fn, args, kwargs)
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            start = time.perf_counter()
+            await asyncio.to_thread(self._queue.put, job)
+            self._record_blocked(time.perf_counter() - start)
+        self._record_depth()
+        return job[3]
+
+    async def submit_round_data(
+        self,
+        round_num: int,
+        agents: List[Any],
+        environment: Any,
+        config: Any,
+        tracker: Any,
+        environment_name: str = 'auction'
+    ) -> Future:
+        """Snapshot a round now and write it in the background, see `SimulationDataInserter.insert_round_data`."""
+        round_data = self.data_inserter.prepare_round_data(round_num, agents, environment, config, tracker, environment_name)
+        return await self.asubmit(self.data_inserter.write_round_data, round_data)
+
+    async def submit_ai_requests(self, ai_requests) -> Future:
+        """Write completed AI requests in the background, see `SimulationDataInserter.insert_ai_requests`."""
+        return await self.asubmit(self.data_inserter.write_ai_requests, list(ai_requests))
+
+    def flush(self, timeout: float = None) -> None:
+        """Wait until everything submitted so far has been written."""
+        if self._closed:
+            return
+        self.submit(_noop).result(timeout)
+
+    async def aflush(self) -> None:
+        if self._closed:
+            return
+        await asyncio.wrap_future(await self.asubmit(_noop))
+
+    def close(self, timeout: float = None) -> None:
+        """Flush pending writes and stop the worker."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._queue.put(None)
+        self._thread.join(timeout)
+        atexit.unregister(self.close)
+        logging.info(f"Closed simulation persistence, stats: {self.stats()}")
+
+    async def aclose(self) -> None:
+        await asyncio.to_thread(self.close)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "queue_depth": self._queue.qsize(),
+            "max_queue_depth": self.max_queue_depth,
+            "blocked_submits": self.blocked_submits,
+            "blocked_seconds": self.blocked_seconds,
+            "avg_write_seconds": self.write_seconds / (self.completed + self.failed) if self.completed + self.failed else 0.0,
+        }
+
+    def _make_job(self, fn: Callable, args, kwargs):
+        if self._closed:
+            raise RuntimeError("SimulationPersistenceService is closed")
+        if fn is not _noop:
+            with self._lock:
+                self.submitted += 1
+        return fn, args, kwargs, Future()
+
+    def _record_blocked(self, seconds: float) -> None:
+        with self._lock:
+            self.blocked_submits += 1
+            self.blocked_seconds += seconds
+        logging.warning(f"Persistence queue full, waited {seconds:.3f}s for the database")
+
+    def _record_depth(self) -> None:
+        depth = self._queue.qsize()
+        with self._lock:
+            self.max_queue_depth = max(self.max_queue_depth, depth)
+
+    def _run(self) -> None:
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            fn, args, kwargs, future = job
+            if not future.set_running_or_notify_cancel():
+                continue
+            if fn is _noop:
+                # flush marker, everything queued before it has been written
+                future.set_result(None)
+                continue
+            start = time.perf_counter()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                logging.error(f"Error persisting simulation data in {getattr(fn, '__name__', fn)}: {e}")
+                with self._lock:
+                    self.failed += 1
+                    self.write_seconds += time.perf_counter() - start
+                future.set_exception(e)
+            else:
+                with self._lock:
+                    self.completed += 1
+                    self.write_seconds += time.perf_counter() - start
+                future.set_result(result)
+
+
+def _noop():
+    return None
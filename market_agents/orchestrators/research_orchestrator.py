@@ -15,6 +15,7 @@ from market_agents.orchestrators.config import OrchestratorConfig, ResearchConfi
 from market_agents.agents.market_agent import MarketAgent
 from market_agents.inference.parallel_inference import ParallelAIUtilities
 from market_agents.orchestrators.insert_simulation_data import SimulationDataInserter
+from market_agents.orchestrators.persistence import SimulationPersistenceService
 from market_agents.orchestrators.agent_cognitive import AgentCognitiveProcessor
 from market_agents.environments.environment import MultiAgentEnvironment, EnvironmentStep
 from market_agents.environments.mechanisms.research import (
@@ -42,6 +43,7 @@ class ResearchOrchestrator(BaseEnvironmentOrchestrator):
         data_inserter: SimulationDataInserter,
         orchestrator_config: OrchestratorConfig,
         logger=None,
+        persistence: SimulationPersistenceService = None,
         **kwargs
     ):
         super().__init__(
@@ -50,6 +52,7 @@ class ResearchOrchestrator(BaseEnvironmentOrchestrator):
             agents=agents,
             ai_utils=ai_utils,
             data_inserter=data_inserter,
+            persistence=persistence,
             logger=logger,
             environment_name=config.name
         )
@@ -76,7 +79,8 @@ class ResearchOrchestrator(BaseEnvironmentOrchestrator):
             ai_utils=self.ai_utils,
             data_inserter=self.data_inserter,
             logger=self.logger,
-            tool_mode=self.orchestrator_config.tool_mode
+            tool_mode=self.orchestrator_config.tool_mode,
+            persistence=self.persistence
         )
 
         self.logger.info(f"Initialized ResearchOrchestrator for environment: {self.config.name}")
@@ -254,7 +258,7 @@ class ResearchOrchestrator(BaseEnvironmentOrchestrator):
         self.logger.info(f"Processing results for round {round_num}...")
 
         # Insert environment step data
-        self.data_inserter.insert_round_data(
+        await self.persistence.submit_round_data(
             round_num=round_num,
             agents=self.agents,
             environment=self.environment,
@@ -262,7 +266,7 @@ class ResearchOrchestrator(BaseEnvironmentOrchestrator):
             tracker=None,
             environment_name=self.config.name
         )
-        self.logger.info(f"Results for round {round_num} saved.")
+        self.logger.info(f"Results for round {round_num} queued for saving.")
 
     def process_environment_state(self, env_state):
         """
@@ -1,8 +1,304 @@
+import argparse
 import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Union
+
 import psycopg2
 import psycopg2.extras
 from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
 
+PARTITION_OPTIONS = ("none", "round", "created_at")
+
+# tables that can be partitioned, by the column list after the `id SERIAL` key
+ORCHESTRATOR_TABLE_COLUMNS: Dict[str, str] = {
+    "perceptions": """
+        memory_id UUID,
+        agent_id UUID REFERENCES agents(id),
+        environment_name VARCHAR(50),
+        round INTEGER,
+        observation JSONB,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    """,
+    "actions": """
+        memory_id UUID,
+        agent_id UUID REFERENCES agents(id),
+        environment_name VARCHAR(50),
+        round INTEGER,
+        action JSONB,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    """,
+    "observations": """
+        agent_id UUID REFERENCES agents(id),
+        environment_name VARCHAR(50),
+        round INTEGER,
+        observation JSONB,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    """,
+    "reflections": """
+        memory_id UUID,
+        agent_id UUID REFERENCES agents(id),
+        environment_name VARCHAR(50),
+        round INTEGER,
+        reflection TEXT,
+        self_reward FLOAT,
+        environment_reward FLOAT,
+        total_reward FLOAT,
+        strategy_update TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    """,
+    "groupchat": """
+        message_id UUID,
+        agent_id UUID REFERENCES agents(id),
+        round INTEGER,
+        sub_round INTEGER,
+        cohort_id VARCHAR(50),
+        content TEXT,
+        timestamp TIMESTAMP,
+        topic TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    """,
+    "requests": """
+        prompt_context_id UUID,
+        start_time TIMESTAMP,
+        end_time TIMESTAMP,
+        total_time FLOAT,
+        model VARCHAR(255),
+        max_tokens INTEGER,
+        temperature FLOAT,
+        messages JSONB,
+        system TEXT,
+        tools JSONB,
+        tool_choice JSONB,
+        raw_response JSONB,
+        completion_tokens INTEGER,
+        prompt_tokens INTEGER,
+        total_tokens INTEGER,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    """,
+}
+
+# (table, name suffix, index method, columns); created if the table exists
+ORCHESTRATOR_INDEXES = [
+    ("agents", "role", "btree", "role"),
+    ("perceptions", "agent_round", "btree", "agent_id, round"),
+    ("perceptions", "env_round", "btree", "environment_name, round"),
+    ("perceptions", "created_at", "btree", "created_at"),
+    ("perceptions", "observation", "gin", "observation jsonb_path_ops"),
+    ("actions", "agent_round", "btree", "agent_id, round"),
+    ("actions", "env_round", "btree", "environment_name, round"),
+    ("actions", "created_at", "btree", "created_at"),
+    ("actions", "action", "gin", "action jsonb_path_ops"),
+    ("observations", "agent_round", "btree", "agent_id, round"),
+    ("observations", "env_round", "btree", "environment_name, round"),
+    ("observations", "created_at", "btree", "created_at"),
+    ("observations", "observation", "gin", "observation jsonb_path_ops"),
+    ("reflections", "agent_round", "btree", "agent_id, round"),
+    ("reflections", "env_round", "btree", "environment_name, round"),
+    ("reflections", "created_at", "btree", "created_at"),
+    ("groupchat", "agent_round", "btree", "agent_id, round"),
+    ("groupchat", "cohort_round", "btree", "cohort_id, round, sub_round"),
+    ("groupchat", "created_at", "btree", "created_at"),
+    ("requests", "prompt_context", "btree", "prompt_context_id"),
+    ("requests", "model", "btree", "model"),
+    ("requests", "created_at", "btree", "created_at"),
+    ("request_refs", "prompt_context", "btree", "prompt_context_id"),
+    ("request_refs", "created_at", "btree", "created_at"),
+]
+
+
+def _partition_key(table: str, partition_by: str) -> Optional[str]:
+    """Partition column of a table under a partitioning option, None if it stays a plain table."""
+    if partition_by == "round" and table != "requests":
+        return "round"
+    if partition_by == "created_at":
+        return "created_at"
+    return None
+
+
+def create_orchestrator_table(cursor, table: str, columns: str, partition_key: Optional[str] = None, name: Optional[str] = None):
+    """Create a table from ORCHESTRATOR_TABLE_COLUMNS, as a range partitioned table with a default partition if `partition_key` is set."""
+    name = name or table
+    if partition_key is None:
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {name} (
+                id SERIAL PRIMARY KEY,
+                {columns}
+            );
+        """)
+        return
+    # the primary key of a partitioned table has to include the partition key
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {name} (
+            id SERIAL,
+            {columns},
+            PRIMARY KEY (id, {partition_key})
+        ) PARTITION BY RANGE ({partition_key});
+    """)
+    cursor.execute(f"CREATE TABLE IF NOT EXISTS {name}_default PARTITION OF {name} DEFAULT;")
+
+
+def create_orchestrator_indexes(cursor):
+    """Create the secondary indexes of ORCHESTRATOR_INDEXES on the tables that exist."""
+    cursor.execute("SELECT tablename FROM pg_tables WHERE schemaname = current_schema();")
+    tables = {row[0] for row in cursor.fetchall()}
+    for table, suffix, method, columns in ORCHESTRATOR_INDEXES:
+        if table in tables:
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS {table}_{suffix}_idx ON {table} USING {method} ({columns});")
+
+
+def partition_bounds(partition_by: str, value: Union[int, datetime], partition_size: int = 10, partition_interval: str = "day"):
+    """Lower and upper bound of the partition holding `value`, plus the partition name suffix."""
+    if partition_by == "round":
+        lower = (value // partition_size) * partition_size
+        return lower, lower + partition_size, f"r{lower}"
+    if partition_interval == "day":
+        lower = datetime(value.year, value.month, value.day)
+        upper = lower + timedelta(days=1)
+    elif partition_interval == "week":
+        lower = datetime(value.year, value.month, value.day) - timedelta(days=value.weekday())
+        upper = lower + timedelta(days=7)
+    elif partition_interval == "month":
+        lower = datetime(value.year, value.month, 1)
+        upper = datetime(value.year + value.month // 12, value.month % 12 + 1, 1)
+    else:
+        raise ValueError(f"Unknown partition interval: {partition_interval}")
+    return lower, upper, f"p{lower:%Y%m%d}"
+
+
+def ensure_partition(cursor, table: str, partition_by: str, value: Union[int, datetime],
+                     partition_size: int = 10, partition_interval: str = "day") -> str:
+    """Create the partition of `table` covering `value` if it does not exist, returning its name."""
+    lower, upper, suffix = partition_bounds(partition_by, value, partition_size, partition_interval)
+    name = f"{table}_{suffix}"
+    cursor.execute(
+        f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table} FOR VALUES FROM (%s) TO (%s);",
+        (lower, upper)
+    )
+    return name
+
+
+def partitioned_tables(cursor) -> Dict[str, str]:
+    """Partitioned orchestrator tables and their partition column."""
+    cursor.execute("""
+        SELECT c.relname, a.attname
+        FROM pg_partitioned_table p
+        JOIN pg_class c ON c.oid = p.partrelid
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        JOIN pg_attribute a ON a.attrelid = p.partrelid AND a.attnum = p.partattrs[0]
+        WHERE n.nspname = current_schema();
+    """)
+    return {table: column for table, column in cursor.fetchall() if table in ORCHESTRATOR_TABLE_COLUMNS}
+
+
+def migrate_orchestrator_tables(db_params, partition_by: str = "none", partition_size: int = 10, partition_interval: str = "day"):
+    """
+    Bring an existing orchestrator database up to the current schema.
+
+    Creates missing tables and secondary indexes, and with `partition_by` converts plain
+    tables into partitioned ones: each table is renamed, recreated partitioned with
+    partitions covering its rows, refilled with INSERT ... SELECT and dropped, one table
+    per transaction. Tables that are already partitioned are left alone.
+    """
+    setup_orchestrator_tables(db_params)
+    conn = psycopg2.connect(**db_params)
+    cursor = conn.cursor()
+    try:
+        already_partitioned = partitioned_tables(cursor)
+        for table, columns in ORCHESTRATOR_TABLE_COLUMNS.items():
+            partition_key = _partition_key(table, partition_by)
+            if partition_key is None:
+                continue
+            if table in already_partitioned:
+                if already_partitioned[table] != partition_key:
+                    logging.warning(f"{table} is partitioned by {already_partitioned[table]}, not {partition_key}; leaving it")
+                continue
+            _partition_existing_table(cursor, table, columns, partition_key, partition_size, partition_interval)
+            conn.commit()
+            logging.info(f"Partitioned {table} by {partition_key}")
+        create_orchestrator_indexes(cursor)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def _partition_existing_table(cursor, table: str, columns: str, partition_key: str, partition_size: int, partition_interval: str):
+    legacy = f"{table}_unpartitioned"
+    cursor.execute(f"ALTER TABLE {table} RENAME TO {legacy};")
+    # index names are schema-wide, move the old ones out of the way of the new table's
+    cursor.execute("SELECT indexname FROM pg_indexes WHERE schemaname = current_schema() AND tablename = %s;", (legacy,))
+    for (index_name,) in cursor.fetchall():
+        cursor.execute(f"ALTER INDEX {index_name} RENAME TO {index_name}_unpartitioned;")
+
+    create_orchestrator_table(cursor, table, columns, partition_key)
+    partition_by = "round" if partition_key == "round" else "created_at"
+    # one value per partition, not per distinct round or timestamp
+    if partition_by == "round":
+        bucket, params = f"floor({partition_key}::numeric / %s)::bigint * %s", (partition_size, partition_size)
+    else:
+        bucket, params = f"date_trunc(%s, {partition_key})", (partition_interval,)
+    cursor.execute(f"SELECT DISTINCT {bucket} FROM {legacy} WHERE {partition_key} IS NOT NULL;", params)
+    for (value,) in cursor.fetchall():
+        ensure_partition(cursor, table, partition_by, value, partition_size, partition_interval)
+
+    cursor.execute("""
+        SELECT column_name FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = %s ORDER BY ordinal_position;
+    """, (legacy,))
+    column_list = ", ".join(row[0] for row in cursor.fetchall())
+    cursor.execute(f"INSERT INTO {table} ({column_list}) SELECT {column_list} FROM {legacy};")
+    cursor.execute(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), COALESCE((SELECT MAX(id) FROM {table}), 0) + 1, false);")
+    cursor.execute(f"DROP TABLE {legacy};")
+
+
+def drop_partitions_before(db_params, before: Union[int, datetime], detach_only: bool = False) -> List[str]:
+    """
+    Drop (or only detach) the partitions of every partitioned orchestrator table that lie
+    entirely before `before`, a round for round partitioning or a timestamp for created_at.
+    """
+    conn = psycopg2.connect(**db_params)
+    cursor = conn.cursor()
+    removed = []
+    try:
+        for table, column in partitioned_tables(cursor).items():
+            if isinstance(before, datetime) != (column == "created_at"):
+                continue
+            cursor.execute("""
+                SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+                FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+                WHERE i.inhparent = %s::regclass;
+            """, (table,))
+            for partition, bound in cursor.fetchall():
+                upper = _partition_upper_bound(bound, column)
+                if upper is None or upper > before:
+                    continue
+                cursor.execute(f"ALTER TABLE {table} DETACH PARTITION {partition};")
+                if not detach_only:
+                    cursor.execute(f"DROP TABLE {partition};")
+                removed.append(partition)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+    return removed
+
+
+def _partition_upper_bound(bound: str, column: str):
+    # e.g. FOR VALUES FROM (10) TO (20) / FROM ('2024-01-01 00:00:00') TO ('2024-01-02 00:00:00')
+    if " TO (" not in bound:
+        return None
+    upper = bound.rsplit(" TO (", 1)[1].rstrip(")").strip("'")
+    if column == "created_at":
+        return datetime.fromisoformat(upper)
+    return int(upper)
+
+
 def create_database(db_params):
     """Create the database if it doesn't exist"""
     # Connect to PostgreSQL server
@@ -28,8 +324,17 @@ def create_database(db_params):
     cursor.close()
     conn.close()
 
-def setup_orchestrator_tables(db_params):
-    """Create all necessary tables for the orchestrator with proper schemas"""
+def setup_orchestrator_tables(db_params, request_storage: str = "inline", partition_by: str = "none"):
+    """
+    Create all necessary tables for the orchestrator with proper schemas.
+
+    With `partition_by="round"` the round-keyed tables are range partitioned by round, with
+    `partition_by="created_at"` they and `requests` are partitioned by creation time; see
+    `ensure_partition`. Existing tables are left as they are, use `migrate_orchestrator_tables`
+    to convert them.
+    """
+    if partition_by not in PARTITION_OPTIONS:
+        raise ValueError(f"Unknown partitioning: {partition_by}")
     conn = psycopg2.connect(**db_params)
     cursor = conn.cursor()
     
@@ -60,102 +365,16 @@ def setup_orchestrator_tables(db_params):
             );
         """)
 
-        # Create perceptions table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS perceptions (
-                id SERIAL PRIMARY KEY,
-                memory_id UUID,
-                agent_id UUID REFERENCES agents(id),
-                environment_name VARCHAR(50),
-                round INTEGER,
-                observation JSONB,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            );
-        """)
-
-        # Create actions table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS actions (
-                id SERIAL PRIMARY KEY,
-                memory_id UUID,
-                agent_id UUID REFERENCES agents(id),
-                environment_name VARCHAR(50),
-                round INTEGER,
-                action JSONB,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            );
-        """)
+        # Round-keyed tables and requests, optionally range partitioned
+        for table, columns in ORCHESTRATOR_TABLE_COLUMNS.items():
+            create_orchestrator_table(cursor, table, columns, _partition_key(table, partition_by))
 
-        # Create observations table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS observations (
-                id SERIAL PRIMARY KEY,
-                agent_id UUID REFERENCES agents(id),
-                environment_name VARCHAR(50),
-                round INTEGER,
-                observation JSONB,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            );
-        """)
+        if request_storage == "deduplicated":
+            setup_request_blob_tables(cursor)
+        elif request_storage != "inline":
+            raise ValueError(f"Unknown request storage: {request_storage}")
 
-        # Create reflections table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS reflections (
-                id SERIAL PRIMARY KEY,
-                memory_id UUID,
-                agent_id UUID REFERENCES agents(id),
-                environment_name VARCHAR(50),
-                round INTEGER,
-                reflection TEXT,
-                self_reward FLOAT,
-                environment_reward FLOAT,
-                total_reward FLOAT,
-                strategy_update TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            );
-        """)
-
-        # Create groupchat table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS groupchat (
-                id SERIAL PRIMARY KEY,
-                message_id UUID,
-                agent_id UUID REFERENCES agents(id),
-                round INTEGER,
-                sub_round INTEGER,
-                cohort_id VARCHAR(50),
-                content TEXT,
-                timestamp TIMESTAMP,
-                topic TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            );
-        """)
-
-        # Create requests table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS requests (
-                id SERIAL PRIMARY KEY,
-                prompt_context_id UUID,
-                start_time TIMESTAMP,
-                end_time TIMESTAMP,
-                total_time FLOAT,
-                model VARCHAR(255),
-                max_tokens INTEGER,
-                temperature FLOAT,
-                messages JSONB,
-                system TEXT,
-                tools JSONB,
-                tool_choice JSONB,
-                raw_response JSONB,
-                completion_tokens INTEGER,
-                prompt_tokens INTEGER,
-                total_tokens INTEGER,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            );
-        """)
-
-        conn.commit()
-        print("Successfully created all tables.")
+        create_orchestrator_indexes(cursor)
 
         conn.commit()
         print("Successfully created all tables.")
@@ -168,6 +387,85 @@ def setup_orchestrator_tables(db_params):
         cursor.close()
         conn.close()
 
+def setup_request_blob_tables(cursor):
+    """
+    Tables for the deduplicated request storage.
+
+    Message, system prompt, tool and response payloads go to `request_blobs` once per
+    distinct content, keyed by the sha256 of their canonical JSON, and `request_refs` rows
+    keep only the hashes plus timing and token metrics. Blob values are compressed by
+    TOAST from 256 bytes on, with lz4 when the server supports it. The
+    `requests_deduplicated` view has the same columns as `requests`.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS request_blobs (
+            hash BYTEA PRIMARY KEY,
+            data JSONB NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+    cursor.execute("ALTER TABLE request_blobs SET (toast_tuple_target = 256);")
+    cursor.execute("SAVEPOINT request_blobs_lz4;")
+    try:
+        cursor.execute("ALTER TABLE request_blobs ALTER COLUMN data SET COMPRESSION lz4;")
+    except psycopg2.Error:
+        # servers built without lz4 keep the default pglz compression
+        cursor.execute("ROLLBACK TO SAVEPOINT request_blobs_lz4;")
+    cursor.execute("RELEASE SAVEPOINT request_blobs_lz4;")
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS request_refs (
+            id SERIAL PRIMARY KEY,
+            prompt_context_id UUID,
+            start_time TIMESTAMP,
+            end_time TIMESTAMP,
+            total_time FLOAT,
+            model VARCHAR(255),
+            max_tokens INTEGER,
+            temperature FLOAT,
+            message_hashes BYTEA[],
+            system_hash BYTEA,
+            tools_hash BYTEA,
+            tool_choice_hash BYTEA,
+            raw_response_hash BYTEA,
+            completion_tokens INTEGER,
+            prompt_tokens INTEGER,
+            total_tokens INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+
+    cursor.execute("""
+        CREATE OR REPLACE VIEW requests_deduplicated AS
+        SELECT
+            r.id,
+            r.prompt_context_id,
+            r.start_time,
+            r.end_time,
+            r.total_time,
+            r.model,
+            r.max_tokens,
+            r.temperature,
+            COALESCE((
+                SELECT jsonb_agg(b.data ORDER BY m.ord)
+                FROM unnest(r.message_hashes) WITH ORDINALITY AS m(hash, ord)
+                JOIN request_blobs b ON b.hash = m.hash
+            ), '[]'::jsonb) AS messages,
+            s.data #>> '{}' AS system,
+            t.data AS tools,
+            c.data AS tool_choice,
+            rr.data AS raw_response,
+            r.completion_tokens,
+            r.prompt_tokens,
+            r.total_tokens,
+            r.created_at
+        FROM request_refs r
+        LEFT JOIN request_blobs s ON s.hash = r.system_hash
+        LEFT JOIN request_blobs t ON t.hash = r.tools_hash
+        LEFT JOIN request_blobs c ON c.hash = r.tool_choice_hash
+        LEFT JOIN request_blobs rr ON rr.hash = r.raw_response_hash;
+    """)
+
 def check_tables_exist(self):
     cursor = self.conn.cursor()
     tables = [
@@ -205,7 +503,9 @@ def drop_all_tables(db_params):
             groupchat,
             agent_memories,
             agents,
-            requests
+            requests,
+            request_refs,
+            request_blobs
         CASCADE
         """)
         conn.commit()
@@ -218,21 +518,40 @@ def drop_all_tables(db_params):
         cursor.close()
         conn.close()
 
-if __name__ == "__main__":
-    # Example usage
+def main():
+    parser = argparse.ArgumentParser(description="Create or migrate the orchestrator database")
+    parser.add_argument("--dbname", default="market_agents")
+    parser.add_argument("--user", default="postgres")
+    parser.add_argument("--password", default="password")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", default="5433")
+    parser.add_argument("--drop", action="store_true", help="Drop all existing tables first")
+    parser.add_argument("--migrate", action="store_true", help="Add indexes and convert existing tables to --partition-by")
+    parser.add_argument("--partition-by", choices=PARTITION_OPTIONS, default="none")
+    parser.add_argument("--partition-size", type=int, default=10, help="Rounds per partition when partitioning by round")
+    parser.add_argument("--partition-interval", choices=["day", "week", "month"], default="day")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
     db_params = {
-        'dbname': 'market_agents',
-        'user': 'postgres',
-        'password': 'password',
-        'host': 'localhost',
-        'port': '5433'
+        'dbname': args.dbname,
+        'user': args.user,
+        'password': args.password,
+        'host': args.host,
+        'port': args.port
     }
-    
+
     # Create database if it doesn't exist
     create_database(db_params)
-    
+
     # Optional: Drop all existing tables
-    drop_all_tables(db_params)
-    
-    # Create new tables
-    setup_orchestrator_tables(db_params)
\ No newline at end of file
+    if args.drop:
+        drop_all_tables(db_params)
+
+    if args.migrate:
+        migrate_orchestrator_tables(db_params, args.partition_by, args.partition_size, args.partition_interval)
+    else:
+        setup_orchestrator_tables(db_params, partition_by=args.partition_by)
+
+if __name__ == "__main__":
+    main()
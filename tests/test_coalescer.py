@@ -0,0 +1,48 @@
+import asyncio
+from types import SimpleNamespace
+
+import market_agents.agents.tool_caller  # noqa: F401, resolves the message_models import cycle
+from market_agents.inference.coalescer import RequestCoalescer
+
+class RecordingAIUtils:
+    def __init__(self):
+        self.calls = []
+
+    async def run_parallel_ai_completion(self, prompts, update_history=True, record_requests=True):
+        self.calls.append(len(prompts))
+        return [SimpleNamespace(source_id=prompt.id) for prompt in prompts]
+
+    async def update_prompt_history(self, prompts, outputs):
+        return prompts
+
+def test_each_caller_gets_its_own_requests():
+    """Concurrent cohorts share one dispatch but only see their own requests"""
+    ai_utils = RecordingAIUtils()
+    coalescer = RequestCoalescer(ai_utils, window_seconds=0.01)
+
+    async def cohort(name, size):
+        prompts = [SimpleNamespace(id=f"{name}-{i}") for i in range(size)]
+        outputs = await coalescer.run_parallel_ai_completion(prompts, update_history=False)
+        return [output.source_id for output in outputs], [request.source_id for request in coalescer.get_all_requests()]
+
+    async def run():
+        return await asyncio.gather(cohort("a", 2), cohort("b", 3))
+
+    (a_outputs, a_requests), (b_outputs, b_requests) = asyncio.run(run())
+    assert ai_utils.calls == [5]
+    assert a_outputs == a_requests == ["a-0", "a-1"]
+    assert b_outputs == b_requests == ["b-0", "b-1", "b-2"]
+
+def test_close_waits_for_dispatches_in_flight():
+    ai_utils = RecordingAIUtils()
+    coalescer = RequestCoalescer(ai_utils, window_seconds=10)
+
+    async def run():
+        caller = asyncio.create_task(coalescer.run_parallel_ai_completion([SimpleNamespace(id="a-0")], update_history=False))
+        await asyncio.sleep(0)
+        await coalescer.close()
+        assert not coalescer._tasks
+        return await caller
+
+    outputs = asyncio.run(run())
+    assert [output.source_id for output in outputs] == ["a-0"]
@@ -0,0 +1,26 @@
+from market_agents.memory.embedding_cache import EmbeddingCache
+
+def test_lru_evicts_least_recently_used():
+    cache = EmbeddingCache(max_entries=2)
+    keys = [EmbeddingCache.make_key("model", text) for text in ("a", "b", "c")]
+    cache.put_many({keys[0]: [0.5], keys[1]: [1.5]})
+    cache.get_many([keys[0]])
+    cache.put_many({keys[2]: [2.5]})
+    assert set(cache.get_many(keys)) == {keys[0], keys[2]}
+
+def test_disk_tier_survives_restart(tmp_path):
+    """Entries written to the SQLite store are found by a fresh cache and counted as disk hits"""
+    path = str(tmp_path / "embeddings.sqlite")
+    key = EmbeddingCache.make_key("model", "hello")
+    cache = EmbeddingCache(max_entries=10, cache_path=path)
+    stored = cache.put_many({key: [0.25, -1.0]})
+    cache.close()
+
+    reopened = EmbeddingCache(max_entries=10, cache_path=path)
+    assert reopened.get_many([key, "missing"]) == {key: stored[key]}
+    stats = reopened.stats()
+    assert (stats["disk_hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 0.5)
+    reopened.close()
+
+def test_key_depends_on_model():
+    assert EmbeddingCache.make_key("a", "text") != EmbeddingCache.make_key("b", "text")
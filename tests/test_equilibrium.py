@@ -0,0 +1,23 @@
+import numpy as np
+
+from market_agents.economics.equilibrium import batch_equilibria, pad_curves, sweep_zi_markets
+
+def test_batch_matches_hand_computed_market():
+    result = batch_equilibria(np.array([[10.0, 8.0, 6.0, 4.0]]), np.array([[3.0, 5.0, 7.0, 9.0]]))
+    assert result["quantity"][0] == 2
+    assert result["price"][0] == 6.5
+    assert result["buyer_surplus"][0] == (10 - 6.5) + (8 - 6.5)
+    assert result["seller_surplus"][0] == (6.5 - 3) + (6.5 - 5)
+
+def test_padded_markets_are_solved_independently():
+    demand = pad_curves([np.array([4.0, 10.0, 8.0]), np.array([1.0]), np.array([])])
+    supply = pad_curves([np.array([5.0, 3.0]), np.array([2.0, 0.5]), np.array([1.0])])
+    result = batch_equilibria(demand, supply)
+    assert result["quantity"].tolist() == [2, 1, 0]
+    assert result["price"].tolist() == [6.5, 0.75, 0.0]
+    assert result["total_surplus"][2] == 0.0
+
+def test_sweep_zi_markets_returns_one_result_per_market():
+    result = sweep_zi_markets([100.0, 50.0], [80.0, 90.0], [3, 5], [4, 2], num_units=5, noise_factor=0.1, seed=0)
+    assert result["quantity"].shape == (2,)
+    assert result["quantity"][0] > 0 and result["quantity"][1] == 0
@@ -0,0 +1,40 @@
+import asyncio
+from types import SimpleNamespace
+
+from market_agents.memory.memory_writer import MemoryWriter
+
+def test_failed_flush_requeues_items_for_other_contributors():
+    """A cohort whose flush fails raises, and another cohort's flush writes everyone's items"""
+    writer = MemoryWriter()
+    written = []
+    attempts = []
+
+    async def no_embeddings(memories, episodes):
+        pass
+
+    def write_batch(memories, episodes):
+        attempts.append(len(memories))
+        if len(attempts) == 1:
+            raise ConnectionError("database down")
+        written.extend(memory for _, memory in memories)
+
+    writer._embed_missing = no_embeddings
+    writer._write_batch = write_batch
+    store = SimpleNamespace(items_cache=[])
+
+    async def cohort(name, delay):
+        await writer.add_memory(store, name)
+        await asyncio.sleep(delay)
+        try:
+            await writer.flush()
+        except ConnectionError:
+            return "failed"
+        return "ok"
+
+    async def run():
+        return await asyncio.gather(cohort("a", 0), cohort("b", 0.01))
+
+    assert asyncio.run(run()) == ["failed", "ok"]
+    assert attempts == [2, 2]
+    assert written == ["a", "b"] and store.items_cache == ["a", "b"]
+    assert writer.pending == 0
@@ -0,0 +1,53 @@
+import asyncio
+import threading
+
+import pytest
+
+from market_agents.orchestrators.persistence import SimulationPersistenceService
+
+class RecordingInserter:
+    def __init__(self):
+        self.rounds = []
+
+    def write_round_data(self, round_data):
+        self.rounds.append(round_data)
+
+def test_writes_in_order_and_acknowledges():
+    inserter = RecordingInserter()
+    service = SimulationPersistenceService(inserter)
+    futures = [service.submit(inserter.write_round_data, {"round": i}) for i in range(5)]
+    service.flush(timeout=5)
+    assert all(future.done() for future in futures)
+    assert [data["round"] for data in inserter.rounds] == list(range(5))
+    service.close()
+    assert service.stats()["completed"] == 5
+
+def test_failed_write_is_reported_on_its_future():
+    service = SimulationPersistenceService(RecordingInserter())
+    def fail():
+        raise ValueError("boom")
+    future = service.submit(fail)
+    with pytest.raises(ValueError):
+        future.result(timeout=5)
+    service.close()
+    assert service.stats()["failed"] == 1
+
+def test_full_queue_applies_backpressure_without_blocking_the_loop():
+    """With the worker stuck, asubmit waits for a slot while other tasks keep running"""
+    service = SimulationPersistenceService(RecordingInserter(), max_queue_size=1)
+    release = threading.Event()
+
+    async def run():
+        service.submit(release.wait)
+        await asyncio.sleep(0.05)
+        service.submit(lambda: None)
+        waiting = asyncio.create_task(service.asubmit(lambda: None))
+        await asyncio.sleep(0.05)
+        assert not waiting.done()
+        release.set()
+        await asyncio.wrap_future(await waiting)
+
+    asyncio.run(run())
+    service.close()
+    stats = service.stats()
+    assert stats["blocked_submits"] == 1 and stats["completed"] == 3
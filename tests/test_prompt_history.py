@@ -0,0 +1,63 @@
+import pytest
+
+import market_agents.agents.tool_caller  # noqa: F401, resolves the message_models import cycle
+from market_agents.inference import message_models
+from market_agents.inference.message_models import LLMConfig, LLMPromptContext
+
+@pytest.fixture(autouse=True)
+def word_tokens(monkeypatch):
+    """Count one token per word and record every encoded text"""
+    encoded = []
+    def count(text, encoding_name="cl100k_base"):
+        encoded.append(text)
+        return len(text.split())
+    monkeypatch.setattr(message_models, "count_tokens", count)
+    return encoded
+
+def make_context(turns=0, system_string=None, **config):
+    history = []
+    for turn in range(turns):
+        history.append({"role": "user", "content": f"question {turn}"})
+        history.append({"role": "assistant", "content": f"answer {turn}"})
+    return LLMPromptContext(id="agent", system_string=system_string, new_message="next question", history=history, llm_config=LLMConfig(client="openai", **config))
+
+def test_appended_messages_are_counted_incrementally(word_tokens):
+    context = make_context(turns=2)
+    assert context.history_token_count == 4 * (4 + 2)
+    word_tokens.clear()
+    context.history.append({"role": "user", "content": "one more question"})
+    assert context.history_token_count == 4 * (4 + 2) + 4 + 3
+    assert word_tokens == ["one more question"]
+
+def test_replaced_or_truncated_history_is_recounted(word_tokens):
+    context = make_context(turns=2)
+    assert context.history_token_count == 24
+    del context.history[:2]
+    assert context.history_token_count == 12
+    context.history = [{"role": "user", "content": "a b c"}]
+    assert context.history_token_count == 7
+    context.history[-1] = {"role": "user", "content": "a"}
+    assert context.history_token_count == 5
+
+def test_prompt_token_estimate():
+    context = make_context(turns=1, system_string="be brief")
+    # history + system message + new message + reply primer
+    assert context.prompt_token_estimate == 2 * (4 + 2) + (4 + 2) + (4 + 2) + 2
+    context.use_history = False
+    assert context.prompt_token_estimate == (4 + 2) + (4 + 2) + 2
+
+def test_sliding_window_evicts_whole_turns_down_to_retain_ratio():
+    context = make_context(turns=5, history_policy="sliding_window", max_history_turns=4, history_retain_ratio=0.5)
+    evicted = context.trim_history()
+    assert [message["content"] for message in evicted] == ["question 0", "answer 0", "question 1", "answer 1", "question 2", "answer 2"]
+    assert len(context.history) == 2 * 2 and context.history[0]["role"] == "user"
+    assert context.trim_history() == []
+
+def test_token_budget_evicts_whole_turns_down_to_retain_ratio():
+    # every turn costs 12 tokens, so 5 turns exceed the budget and 2 turns remain under half of it
+    context = make_context(turns=5, history_policy="token_budget", max_history_tokens=50, history_retain_ratio=0.5)
+    evicted = context.trim_history()
+    assert len(evicted) == 2 * 3
+    assert context.history[0] == {"role": "user", "content": "question 3"}
+    assert context.history_token_count == 2 * 12
+    assert context.trim_history() == []
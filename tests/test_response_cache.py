@@ -0,0 +1,52 @@
+import pytest
+from market_agents.inference.response_cache import ResponseCache, ResponseCacheConfig
+
+REQUEST = {
+    "model": "gpt-4o-mini",
+    "messages": [{"role": "user", "content": "hello"}],
+    "max_tokens": 50,
+    "temperature": 0,
+}
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ResponseCache(ResponseCacheConfig(cache_path=str(tmp_path / "responses.sqlite")))
+    yield cache
+    cache.close()
+
+def test_round_trip_and_counters(cache):
+    """A stored response is returned for the same request and counted as a hit"""
+    key = cache.make_key("openai", REQUEST)
+    assert cache.get(key) is None
+    cache.put(key, {"id": "chatcmpl-1"})
+    assert cache.get(key) == {"id": "chatcmpl-1"}
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+
+def test_batch_lookup_and_store(cache):
+    """get_many returns only the hits of a batch and counts every lookup"""
+    cache.put_many({"key-1": {"id": 1}, "key-2": {"id": 2}})
+    assert cache.get_many(["key-1", "key-3", "key-2"]) == {"key-1": {"id": 1}, "key-2": {"id": 2}}
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (2, 1, 2)
+
+def test_key_depends_on_request_content(cache):
+    """Keys ignore dict ordering but change with the prompt or the client"""
+    reordered = dict(reversed(list(REQUEST.items())))
+    changed = {**REQUEST, "messages": [{"role": "user", "content": "bye"}]}
+    assert cache.make_key("openai", REQUEST) == cache.make_key("openai", reordered)
+    assert cache.make_key("openai", REQUEST) != cache.make_key("openai", changed)
+    assert cache.make_key("openai", REQUEST) != cache.make_key("vllm", REQUEST)
+
+def test_only_deterministic_requests_are_cacheable(cache):
+    assert cache.is_cacheable(REQUEST)
+    assert not cache.is_cacheable({**REQUEST, "temperature": 0.7})
+
+def test_eviction_keeps_most_recent_entries(tmp_path):
+    cache = ResponseCache(ResponseCacheConfig(cache_path=str(tmp_path / "responses.sqlite"), max_entries=2))
+    for i in range(3):
+        cache.put(f"key-{i}", {"id": i})
+    cache.evict()
+    assert cache.get("key-0") is None
+    assert cache.get("key-2") == {"id": 2}
+    cache.close()
@@ -82,5 +82,57 @@ def test_memory_clearing(db_connection):
     except Exception as e:
         pytest.fail(f"Memory clearing operations failed: {e}")
 
+def test_shared_memory_tables(db_config):
+    """Test the shared, agent_id partitioned memory layout"""
+    db_config.table_layout = "shared"
+    db_connection = DatabaseConnection(db_config)
+    test_agent_id = "shared_market_agent_123"
+    try:
+        db_connection.create_agent_cognitive_memory_table(test_agent_id)
+        db_connection.create_agent_episodic_memory_table(test_agent_id)
+        assert db_connection.cognitive_table(test_agent_id) == "agent_cognitive_memory"
+        assert db_connection.episodic_table(test_agent_id) == "agent_episodic_memory"
+
+        db_connection.cursor.execute("""
+            SELECT COUNT(*) FROM pg_inherits
+            WHERE inhparent = 'agent_cognitive_memory'::regclass;
+        """)
+        assert db_connection.cursor.fetchone()[0] == db_config.table_partitions
+
+        db_connection.clear_agent_cognitive_memory(test_agent_id)
+        db_connection.clear_agent_episodic_memory(test_agent_id)
+    except Exception as e:
+        pytest.fail(f"Shared memory table operations failed: {e}")
+    finally:
+        db_connection.close()
+
+def test_vector_index_built_after_threshold(db_config):
+    """Vector indexes follow index_method and are only built once enough rows exist"""
+    db_config.index_method = "hnsw"
+    db_config.index_min_rows = 2
+    db_connection = DatabaseConnection(db_config)
+    test_agent_id = "index_market_agent_123"
+    table = db_connection.cognitive_table(test_agent_id)
+    try:
+        db_connection.create_agent_cognitive_memory_table(test_agent_id)
+        db_connection.clear_agent_cognitive_memory(test_agent_id)
+        with db_connection.transaction() as cur:
+            cur.execute(f"DROP INDEX IF EXISTS {db_connection.index_manager.index_name(table)}")
+
+        def index_defs():
+            with db_connection.transaction() as cur:
+                cur.execute("SELECT indexdef FROM pg_indexes WHERE indexname = %s", (db_connection.index_manager.index_name(table),))
+                return [row[0] for row in cur.fetchall()]
+
+        embedding = [0.1] * db_config.vector_dim
+        for expected in (0, 1):
+            with db_connection.transaction() as cur:
+                cur.execute(f"INSERT INTO {table} (memory_id, content, embedding) VALUES (gen_random_uuid(), 'x', %s::vector)", (embedding,))
+            db_connection.index_manager.note_rows(table, 1)
+            assert len(index_defs()) == expected
+        assert "USING hnsw" in index_defs()[0]
+    finally:
+        db_connection.close()
+
 if __name__ == "__main__":
     pytest.main([__file__])
\ No newline at end of file
@@ -0,0 +1,33 @@
+import pytest
+
+from market_agents.inference import oai_parallel
+from market_agents.inference.oai_parallel import num_tokens_consumed_from_request
+
+@pytest.fixture(autouse=True)
+def word_tokens(monkeypatch):
+    """Count one token per word so the tests don't need to download an encoding"""
+    monkeypatch.setattr(oai_parallel, "count_tokens", lambda text, encoding_name="cl100k_base": len(text.split()))
+
+def test_chat_completions():
+    request = {"messages": [{"role": "user", "content": "hello there"}, {"role": "user", "name": "bob", "content": "hi"}], "max_tokens": 10}
+    # 4 per message + role and content words, -1 for the name, 2 for the reply primer
+    expected = (4 + 1 + 2) + (4 + 1 + 1 + 1 - 1) + 2 + 10
+    assert num_tokens_consumed_from_request(request, "chat/completions", "cl100k_base") == expected
+
+def test_completions():
+    assert num_tokens_consumed_from_request({"prompt": "one two", "max_tokens": 5}, "completions", "cl100k_base") == 2 + 5
+    assert num_tokens_consumed_from_request({"prompt": ["one", "two three"], "max_tokens": 5}, "completions", "cl100k_base") == 3 + 2 * 5
+
+def test_embeddings():
+    assert num_tokens_consumed_from_request({"input": "some text"}, "embeddings", "cl100k_base") == 2
+    assert num_tokens_consumed_from_request({"input": ["a", "b c"]}, "embeddings", "cl100k_base") == 3
+
+def test_anthropic_messages():
+    request = {
+        "messages": [
+            {"role": "user", "content": "plain words"},
+            {"role": "user", "content": [{"type": "text", "text": "block"}]},
+        ],
+        "max_tokens": 7,
+    }
+    assert num_tokens_consumed_from_request(request, "messages", "cl100k_base") == 2 + 1 + 7